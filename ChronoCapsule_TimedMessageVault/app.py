@@ -1,10 +1,17 @@
 import streamlit as st
-import pandas as pd
-from supabase import create_client
 from datetime import datetime, timedelta
-import smtplib
-from email.mime.text import MIMEText
 import warnings
+from service.smtp_pool import SMTPPool
+from service.email_templates import render_capsule
+from model.user import User
+from model.capsule import Capsule
+from repository.user_repository import UserRepository
+from repository.cached_user_repository import CachedUserRepository
+from repository.capsule_repository import CapsuleRepository
+from repository.cached_capsule_repository import CachedCapsuleRepository
+from repository.message_store import MAX_ATTACHMENT_BYTES
+from repository.client_factory import get_client
+from controller.dashboard_controller import ist_day_bounds, capsule_frame, capsule_cards
 
 warnings.filterwarnings("ignore")
 
@@ -14,22 +21,40 @@ st.set_page_config(page_title="ChronoCapsule", page_icon="⏳", layout="wide")
 # ------------------- SUPABASE CLIENT -------------------
 supabase_url = st.secrets["supabase"]["url"]
 supabase_key = st.secrets["supabase"]["key"]
-supabase = create_client(supabase_url, supabase_key)
 
-# ------------------- EMAIL FUNCTION -------------------
-def send_email(recipient, subject, message):
-    try:
-        sender_email = st.secrets["email"]["address"]
-        sender_password = st.secrets["email"]["password"]
+@st.cache_resource
+def get_supabase():
+    # One client and one pooled keep-alive HTTP session per server process,
+    # reused by every rerun and every session.
+    return get_client(supabase_url, supabase_key)
+
+supabase = get_supabase()
+
+@st.cache_resource
+def get_user_repository():
+    # Survives reruns and is shared by all sessions, so widget interactions
+    # don't re-query the user list; adding a user invalidates it.
+    return CachedUserRepository(UserRepository(supabase_url, supabase_key, client=supabase))
 
-        msg = MIMEText(message, "html")
-        msg["Subject"] = subject
-        msg["From"] = sender_email
-        msg["To"] = recipient
+@st.cache_resource
+def get_capsule_repository():
+    # List pages are cached for a few seconds (CAPSULE_CACHE_TTL) and shared:
+    # viewers of the same page at the same time trigger one query.
+    return CachedCapsuleRepository(CapsuleRepository(supabase_url, supabase_key, client=supabase))
+
+user_repo = get_user_repository()
+capsule_repo = get_capsule_repository()
+
+# ------------------- EMAIL FUNCTION -------------------
+@st.cache_resource
+def get_smtp_pool():
+    # One pool per server process, shared by every session and rerun.
+    return SMTPPool(st.secrets["email"]["address"], st.secrets["email"]["password"])
 
-        with smtplib.SMTP_SSL("smtp.gmail.com", 465) as server:
-            server.login(sender_email, sender_password)
-            server.send_message(msg)
+def send_email(recipient, title, message):
+    try:
+        pool = get_smtp_pool()
+        pool.send_rendered(render_capsule(pool.address, recipient, title, message))
         return True
     except Exception as e:
         st.error(f"❌ Failed to send email: {e}")
@@ -94,7 +119,7 @@ st.session_state.menu = menu
 if menu == "Create Capsule":
     st.subheader("📝 Create Capsule")
     try:
-        users = supabase.table("users").select("*").execute().data
+        users = user_repo.find_all()
     except:
         users = []
 
@@ -102,14 +127,15 @@ if menu == "Create Capsule":
         st.warning("⚠️ No users found! Enter email manually.")
         recipient_email = st.text_input("Recipient Email")
     else:
-        user_map = {u['name']: u for u in users}
+        user_map = {u.name: u for u in users}
         selected_name = st.selectbox("Select User (optional)", ["-- None --"] + list(user_map.keys()))
         recipient_email = st.text_input("Or enter a custom email")
         if selected_name != "-- None --" and not recipient_email:
-            recipient_email = user_map[selected_name]['email']
+            recipient_email = user_map[selected_name].email
 
     title = st.text_input("Capsule Title")
     message = st.text_area("Capsule Message (HTML supported)")
+    uploads = st.file_uploader("Attachments (optional)", accept_multiple_files=True) or []
     selected_date = st.date_input("Select Date", datetime.now().date())
     selected_time = st.time_input("Select Time", datetime.now().time())
     local_dt = datetime.combine(selected_date, selected_time)
@@ -119,15 +145,13 @@ if menu == "Create Capsule":
     if st.button("Create Capsule ✅"):
         if not recipient_email or not title or not message:
             st.error("Fill all fields!")
+        elif any(f.size > MAX_ATTACHMENT_BYTES for f in uploads):
+            st.error(f"Attachments are limited to {MAX_ATTACHMENT_BYTES // (1024 * 1024)} MB each.")
         else:
             try:
-                supabase.table("capsules").insert({
-                    "title": title,
-                    "message": message,
-                    "recipient_email": recipient_email,
-                    "scheduled_time": scheduled_utc.isoformat(),
-                    "is_delivered": False
-                }).execute()
+                # The body and attachments are stored compressed, apart from the capsule row.
+                capsule_repo.save(Capsule(None, title, message, None, scheduled_utc, recipient_email=recipient_email),
+                                  [(f.name, f.type, f) for f in uploads])
                 st.success("🎉 Capsule scheduled!")
             except Exception as e:
                 st.error(f"Error: {e}")
@@ -136,45 +160,39 @@ if menu == "Create Capsule":
 # Inside View Capsules page
 elif menu == "View Capsules":
     st.subheader("📦 View Capsules")
-    filter_status = st.radio("Filter By", ["All", "Pending", "Delivered"], horizontal=True)
+    filter_status = st.radio("Filter By", ["All", "Pending", "Delivered", "Archived"], horizontal=True)
+    col_from, col_to, col_size, col_page = st.columns(4)
+    date_from = col_from.date_input("Scheduled from (IST)", value=None)
+    date_to = col_to.date_input("Scheduled to (IST)", value=None)
+    page_size = col_size.selectbox("Per page", [12, 30, 60], index=1)
+    page = int(col_page.number_input("Page", min_value=1, value=1, step=1))
+
+    # Status, date range and paging all run in the database; only the
+    # visible page is fetched and rendered. Capsules delivered before the
+    # retention window are only read from the archive when asked for.
+    start, end = ist_day_bounds(date_from, date_to)
     try:
-        data = supabase.table("capsules").select("*").execute().data
+        if filter_status == "Archived":
+            data, total = capsule_repo.find_archived_page(start, end, page - 1, page_size)
+        else:
+            data, total = capsule_repo.find_page(filter_status, start, end, page - 1, page_size)
     except:
-        data = []
+        data, total = [], 0
 
     if data:
-        df = pd.DataFrame(data)
-        df["scheduled_time"] = pd.to_datetime(df["scheduled_time"], utc=True, errors="coerce")
-        df["scheduled_ist"] = df["scheduled_time"].apply(lambda x: x + timedelta(hours=5, minutes=30) if pd.notnull(x) else None)
-
-        if filter_status == "Pending":
-            df = df[df["is_delivered"] == False]
-        elif filter_status == "Delivered":
-            df = df[df["is_delivered"] == True]
+        offset = (page - 1) * page_size
+        st.caption(f"Showing {offset + 1}–{offset + len(data)} of {total} capsules "
+                   f"(page {page} of {-(-total // page_size)})")
 
-        if df.empty:
-            st.info("No capsules found.")
-        else:
-            colors = ["#D6EAF8","#D5F5E3","#FCF3CF","#FADBD8","#E8DAEF","#F5EEF8"]  # Classic soft colors
-
-            num_cols = 3
-            for i in range(0, len(df), num_cols):
-                cols = st.columns(num_cols, gap="medium")
-                for j, (_, row) in enumerate(df.iloc[i:i+num_cols].iterrows()):
-                    scheduled_str = row["scheduled_ist"].strftime('%Y-%m-%d %H:%M') if pd.notnull(row["scheduled_ist"]) else "N/A"
-                    color = colors[(i+j) % len(colors)]
-                    with cols[j]:
-                        st.markdown(f"""
-                            <div class="capsule-card" style="background: {color};">
-                                <div class="capsule-title">🎯 {row['title']}</div>
-                                <div class="capsule-message">{row['message']}</div>
-                                <div class="capsule-message">
-                                    <b>Recipient:</b> {row['recipient_email']}<br>
-                                    <b>Scheduled (IST):</b> {scheduled_str}<br>
-                                    <b>Status:</b> {"<span class='status-delivered'>✅ Delivered</span>" if row['is_delivered'] else "<span class='status-pending'>⌛ Pending</span>"}
-                                </div>
-                            </div>
-                        """, unsafe_allow_html=True)
+        cards = capsule_cards(capsule_frame(data), offset)
+        num_cols = 3
+        for i in range(0, len(cards), num_cols):
+            cols = st.columns(num_cols, gap="medium")
+            for j, card in enumerate(cards[i:i+num_cols]):
+                with cols[j]:
+                    st.markdown(card, unsafe_allow_html=True)
+    elif total:
+        st.info(f"Only {-(-total // page_size)} page(s) of capsules match.")
     else:
         st.info("No capsules found.")
 
@@ -187,7 +205,7 @@ elif menu == "Manage Users":
     if st.button("Add User ➕"):
         if name and email:
             try:
-                supabase.table("users").insert({"name": name, "email": email}).execute()
+                user_repo.save(User(None, name, email))
                 st.success("✅ User added!")
             except Exception as e:
                 st.error(f"Error: {e}")
@@ -195,7 +213,7 @@ elif menu == "Manage Users":
             st.error("Enter Name and Email!")
 
     try:
-        users = supabase.table("users").select("*").execute().data
+        users = user_repo.find_all()
     except:
         users = []
 
@@ -211,8 +229,8 @@ elif menu == "Manage Users":
                 with cols[j]:
                     st.markdown(f"""
                         <div class="user-card" style="background: {color};">
-                            <div class="user-name">👤 {u['name']}</div>
-                            <div class="user-info"><b>Email:</b> {u['email']}</div>
+                            <div class="user-name">👤 {u.name}</div>
+                            <div class="user-info"><b>Email:</b> {u.email}</div>
                         </div>
                     """, unsafe_allow_html=True)
     else:
@@ -0,0 +1,61 @@
+# archive_capsules.py
+"""
+Move delivered capsules older than the retention window out of the
+``capsules`` table into the archive (CAPSULE_ARCHIVE: table or files), in
+batches. Run it daily; the delivery path only ever scans what is left.
+
+    python archive_capsules.py
+    python archive_capsules.py --retention-days 90 --batch-size 5000
+    python archive_capsules.py --show 1234      # look up an archived capsule
+"""
+import argparse
+import os
+import sys
+from datetime import timedelta
+from repository.capsule_repository import CapsuleRepository
+from repository.client_factory import storage_backend
+from service.archiver import archiver_from_env
+
+SUPABASE_URL = os.getenv("SUPABASE_URL")
+SUPABASE_KEY = os.getenv("SUPABASE_KEY")
+
+
+def show(repo, capsule_id):
+    capsule = repo.find_archived(capsule_id)
+    if capsule is None:
+        print(f"❌ Capsule {capsule_id} is not in the archive.")
+        return 1
+    print(f"🗄️ {capsule.title} -> {capsule.recipient_email or 'creator'} "
+          f"(scheduled {capsule.scheduled_time.isoformat()})")
+    print(capsule.message or "")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Archive delivered capsules past the retention window.")
+    parser.add_argument("--retention-days", type=float, help="default: ARCHIVE_RETENTION_DAYS or 30")
+    parser.add_argument("--batch-size", type=int, help="default: ARCHIVE_BATCH_SIZE or 1000")
+    parser.add_argument("--max-batches", type=int, help="stop after this many batches")
+    parser.add_argument("--show", type=int, metavar="ID", help="print an archived capsule instead")
+    args = parser.parse_args()
+
+    if storage_backend() == "supabase" and (not SUPABASE_URL or not SUPABASE_KEY):
+        print("❌ Error: Missing environment variables. Please set SUPABASE_URL, SUPABASE_KEY.")
+        sys.exit(1)
+
+    repo = CapsuleRepository(SUPABASE_URL, SUPABASE_KEY)
+    if args.show is not None:
+        sys.exit(show(repo, args.show))
+
+    archiver = archiver_from_env(repo)
+    if args.retention_days is not None:
+        archiver.retention = timedelta(days=args.retention_days)
+    if args.batch_size is not None:
+        archiver.batch_size = args.batch_size
+    report = archiver.run(max_batches=args.max_batches)
+    print(f"🗄️ Archived {report.archived} capsule(s) delivered before {report.cutoff:%Y-%m-%d %H:%M} UTC "
+          f"in {report.batches} batch(es), {report.seconds:.1f}s.")
+
+
+if __name__ == "__main__":
+    main()
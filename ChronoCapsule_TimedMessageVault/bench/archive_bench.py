@@ -0,0 +1,156 @@
+# bench/archive_bench.py
+"""
+Hot-path cost against delivered history, with and without archiving. For
+every history size a vault is built in a SQLite file with the same hot
+set -- ``--pending`` undelivered capsules (``--due`` of them due now) and
+``--recent`` deliveries inside the retention window -- plus ``size``
+deliveries older than the window, laid out two ways:
+
+    unarchived   the history still sits in ``capsules``
+    archived     it sits in ``capsules_archive``; ``capsules`` is the hot set
+
+and the scanner's and dashboard's queries are timed on each (median of
+``--repeats``, warm cache):
+
+    due scan     CapsuleRepository.iter_due over the due backlog
+    claim        claim_due, 100 capsules per call
+    pending      "View Capsules" page 1, Pending (with the exact count)
+    all          page 1, All
+    delivered    page 1, Delivered
+    archived     page 1 of the archive (on demand; archived layout only)
+    lookup       find_archived for one old capsule (archived layout only)
+
+Rows go in with one INSERT ... SELECT each, so 10M is minutes, not hours;
+the archiver itself is timed separately on ``--archive-rows`` rows.
+
+    python -m bench.archive_bench --sizes 10000 100000 1000000 10000000
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+from repository.capsule_archive import TableCapsuleArchive
+from repository.capsule_repository import CapsuleRepository
+from repository.sqlite_client import create_client
+from service.archiver import Archiver
+
+RETENTION = timedelta(days=30)
+# ISO strings in the client's normalised form: UTC, microseconds, explicit offset.
+_STAMP = "strftime('%Y-%m-%dT%H:%M:%S', :now, {offset}) || '.000000+00:00'"
+_ROWS = "WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < :count) "
+
+
+def _stamp(offset):
+    return _STAMP.format(offset=offset)
+
+
+def _insert(client, table, count, now, **columns):
+    """``count`` rows into ``table``; ``columns`` maps names to SQL over the row number ``i``."""
+    columns = dict({
+        "title": "'Capsule ' || i",
+        "preview": "'a short preview of capsule ' || i",
+        "creator_id": "i % 1000",
+        "recipient_email": "'friend' || (i % 5000) || '@gmail.com'",
+    }, **columns)
+    client.conn.execute(f"{_ROWS}INSERT INTO {table} ({', '.join(columns)}) SELECT {', '.join(columns.values())} FROM n",
+                        {"count": count, "now": now.strftime("%Y-%m-%d %H:%M:%S")})
+
+
+def build(path, size, archived, args, now):
+    client = create_client(path)
+    # The hot set: due now, future, and deliveries inside the window.
+    _insert(client, "capsules", args.due, now, scheduled_time=_stamp("'-' || (i % 3600) || ' seconds'"))
+    _insert(client, "capsules", args.pending - args.due, now, scheduled_time=_stamp("'+' || (1 + i % 365) || ' days'"))
+    _insert(client, "capsules", args.recent, now, is_delivered="1", status="'delivered'",
+            scheduled_time=_stamp("'-' || (i % 29) || ' days', '-1 hour'"),
+            delivered_at=_stamp("'-' || (i % 29) || ' days'"))
+    # History: delivered 31 days to 10 years ago, ids after the hot set's.
+    history = {"id": f"i + {history_offset(args)}",
+               "scheduled_time": _stamp("'-' || (31 + i % 3650) || ' days', '-' || (i * 37 % 86400) || ' seconds'"),
+               "delivered_at": _stamp("'-' || (31 + i % 3650) || ' days'")}
+    if archived:
+        _insert(client, "capsules_archive", size, now, archived_at=_stamp("'-1 day'"), **history)
+    else:
+        _insert(client, "capsules", size, now, is_delivered="1", status="'delivered'", **history)
+    client.prune_changes(0)
+    client.conn.execute("ANALYZE")
+    return client
+
+
+def history_offset(args):
+    return args.pending + args.recent
+
+
+def timed(fn, repeats):
+    samples = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def measure(client, archived, args, now):
+    repo = CapsuleRepository(None, None, client=client, archive=TableCapsuleArchive(client))
+    lookup_id = history_offset(args) + 7
+    result = {
+        "due scan": timed(lambda: sum(1 for _ in repo.iter_due(now)), args.repeats),
+        "claim": timed(lambda: repo.claim_due("bench", now, 100), args.repeats),
+        "pending": timed(lambda: repo.find_page("Pending"), args.repeats),
+        "all": timed(lambda: repo.find_page("All"), args.repeats),
+        "delivered": timed(lambda: repo.find_page("Delivered"), args.repeats),
+    }
+    if archived:
+        result["archived"] = timed(lambda: repo.find_archived_page(), args.repeats)
+        result["lookup"] = timed(lambda: repo.find_archived(lookup_id), args.repeats)
+    return result
+
+
+def archiver_throughput(directory, rows, args, now):
+    path = os.path.join(directory, "archiver.db")
+    client = build(path, rows, False, args, now)
+    repo = CapsuleRepository(None, None, client=client, archive=TableCapsuleArchive(client))
+    report = Archiver(repo, RETENTION).run(now=now)
+    hot = client.conn.execute("SELECT COUNT(*) FROM capsules").fetchone()[0]
+    client.close()
+    os.remove(path)
+    return report, hot
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000, 1000000])
+    parser.add_argument("--pending", type=int, default=10000)
+    parser.add_argument("--due", type=int, default=1000)
+    parser.add_argument("--recent", type=int, default=10000)
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--archive-rows", type=int, default=100000)
+    parser.add_argument("--dir", help="where the SQLite files go (default: a temporary directory)")
+    args = parser.parse_args()
+
+    now = datetime.now(timezone.utc).replace(microsecond=0)
+    columns = ["due scan", "claim", "pending", "all", "delivered", "archived", "lookup"]
+    print(f"{'history':>9} {'layout':>10} {'seed s':>7} " + " ".join(f"{c:>9}" for c in columns) + "   (ms)")
+    with tempfile.TemporaryDirectory(dir=args.dir) as directory:
+        for size in args.sizes:
+            for archived in (False, True):
+                path = os.path.join(directory, f"vault-{size}-{int(archived)}.db")
+                start = time.perf_counter()
+                client = build(path, size, archived, args, now)
+                seeded = time.perf_counter() - start
+                result = measure(client, archived, args, now)
+                client.close()
+                os.remove(path)
+                cells = " ".join(f"{result[c]:>9.2f}" if c in result else f"{'-':>9}" for c in columns)
+                print(f"{size:>9} {'archived' if archived else 'unarchived':>10} {seeded:>7.1f} {cells}", flush=True)
+
+        report, hot = archiver_throughput(directory, args.archive_rows, args, now)
+    print(f"\n🗄️ Archiver: {report.archived} capsules in {report.batches} batches, {report.seconds:.1f}s "
+          f"({report.archived / max(report.seconds, 1e-9):.0f}/s); {hot} left in capsules")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+# bench/change_feed_bench.py
+"""
+How late a capsule created by another process (app.py, say) for "a few
+seconds from now" goes out, and how many rows the scheduler reads to get
+there, with and without the change feed.
+
+A SQLite vault is seeded with ``--backlog`` capsules scheduled days ahead.
+A writer process then inserts ``--capsules`` capsules, each due 1-5 s after
+it is created, while a CapsuleScheduler delivers them:
+
+    poll   no feed; the window (``--refresh`` seconds) is re-read on expiry,
+           which is how the daemon found other processes' capsules before
+    feed   repository.change_feed tails the change log, the heap is updated
+           as rows commit and the window only reads what enters it
+
+    python -m bench.change_feed_bench --capsules 200 --refresh 10
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import statistics
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+from repository.capsule_repository import CapsuleRepository
+from repository.change_feed import SQLiteChangeFeed
+from repository.sqlite_client import create_client
+from service.scheduler import CapsuleScheduler
+
+
+class CountingRepository(CapsuleRepository):
+    """Counts the rows the scheduler loads from the database."""
+
+    rows_read = 0
+    full_reloads = 0
+
+    def iter_due(self, now, page_size=500):
+        self.full_reloads += 1
+        for capsule in super().iter_due(now, page_size):
+            self.rows_read += 1
+            yield capsule
+
+    def iter_entering(self, after, until, page_size=500):
+        for capsule in super().iter_entering(after, until, page_size):
+            self.rows_read += 1
+            yield capsule
+
+
+def seed(path, backlog):
+    client = create_client(path)
+    far = datetime.now(timezone.utc) + timedelta(days=3)
+    rows = [{"title": f"Later {i}", "message": "see you", "creator_id": None,
+             "recipient_email": f"later{i}@example.com",
+             "scheduled_time": (far + timedelta(seconds=i)).isoformat(), "is_delivered": False}
+            for i in range(backlog)]
+    for start in range(0, len(rows), 5000):
+        client.table("capsules").insert(rows[start:start + 5000]).execute()
+    client.close()
+
+
+def writer(path, count, interval, seed_value):
+    # Runs in its own process, like the Streamlit app.
+    rng = random.Random(seed_value)
+    client = create_client(path)
+    for i in range(count):
+        due = datetime.now(timezone.utc) + timedelta(seconds=rng.uniform(1, 5))
+        client.table("capsules").insert({
+            "title": f"Soon {i}", "message": "hello", "creator_id": None,
+            "recipient_email": f"soon{i}@example.com", "scheduled_time": due.isoformat(),
+            "is_delivered": False}).execute()
+        time.sleep(interval)
+    client.close()
+
+
+def run(mode, args):
+    path = os.path.join(tempfile.mkdtemp(), "vault.db")
+    seed(path, args.backlog)
+    client = create_client(path)
+    repo = CountingRepository(None, None, client=client)
+    lags = []
+    done = threading.Event()
+
+    def deliver(capsules):
+        now = datetime.now(timezone.utc)
+        soon = [c for c in capsules if c.title.startswith("Soon")]
+        lags.extend((now - c.scheduled_time).total_seconds() for c in soon)
+        repo.mark_delivered_many([c.id for c in capsules])
+        if len(lags) >= args.capsules:
+            done.set()
+
+    scheduler = CapsuleScheduler(repo, deliver, lookahead=timedelta(seconds=args.refresh))
+    feed = None
+    if mode == "feed":
+        feed = SQLiteChangeFeed(client, scheduler.apply_change, scheduler.reconcile, scheduler.feed_lost,
+                                poll_seconds=args.poll)
+    scheduler.start()
+    if feed is not None:
+        feed.start()
+
+    proc = multiprocessing.Process(target=writer, args=(path, args.capsules, args.interval, args.seed))
+    start = time.perf_counter()
+    proc.start()
+    proc.join()
+    done.wait(timeout=args.interval * args.capsules + args.refresh + 30)
+    elapsed = time.perf_counter() - start
+
+    if feed is not None:
+        feed.stop()
+    scheduler.stop()
+    client.close()
+    lags.sort()
+    return {
+        "mode": mode,
+        "delivered": len(lags),
+        "lag_p50": round(statistics.median(lags), 3) if lags else None,
+        "lag_p99": round(lags[int(len(lags) * 0.99) - 1], 3) if lags else None,
+        "lag_max": round(lags[-1], 3) if lags else None,
+        "rows_read": repo.rows_read,
+        "full_reloads": repo.full_reloads,
+        "feed_changes": scheduler.changes,
+        "seconds": round(elapsed, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--capsules", type=int, default=200)
+    parser.add_argument("--backlog", type=int, default=50000)
+    parser.add_argument("--interval", type=float, default=0.05, help="seconds between writer inserts")
+    parser.add_argument("--refresh", type=float, default=10, help="scheduler window / reload period")
+    parser.add_argument("--poll", type=float, default=0.1, help="change log poll period (feed mode)")
+    parser.add_argument("--seed", type=int, default=18)
+    parser.add_argument("--modes", nargs="+", default=["poll", "feed"], choices=["poll", "feed"])
+    args = parser.parse_args()
+
+    results = [run(mode, args) for mode in args.modes]
+    print(f"{'mode':>5} {'sent':>5} {'lag p50 s':>10} {'p99 s':>7} {'max s':>7} {'rows read':>10} "
+          f"{'reloads':>8} {'changes':>8}")
+    for r in results:
+        print(f"{r['mode']:>5} {r['delivered']:>5} {r['lag_p50']:>10} {r['lag_p99']:>7} {r['lag_max']:>7} "
+              f"{r['rows_read']:>10} {r['full_reloads']:>8} {r['feed_changes']:>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+# bench/daemon_bench.py
+"""
+Cold start vs. warm tick for send_capsules.py.
+
+cold: a fresh interpreter imports send_capsules and its dependencies,
+      opens new SMTP sessions and delivers one tick's capsules -- what
+      every cron run pays, before counting pip install.
+warm: the same tick inside an already-running process that reuses its
+      client and SMTP pool -- what the daemon pays.
+
+Capsules live in the SQLite stand-in; SMTP is the fake server with a
+simulated TLS handshake.
+
+    python -m bench.daemon_bench --ticks 5 --capsules-per-tick 20
+"""
+import argparse
+import contextlib
+import io
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+from bench.fake_smtp import FakeSMTPServer
+from repository.sqlite_client import create_client
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def seed(db_path, count):
+    due = (datetime.now(timezone.utc) - timedelta(seconds=1)).isoformat()
+    create_client(db_path).table("capsules").insert([{
+        "title": f"Tick capsule {i}",
+        "message": "See you in the future",
+        "recipient_email": f"user{i}@example.com",
+        "scheduled_time": due,
+        "is_delivered": False,
+    } for i in range(count)]).execute()
+
+
+def tick(db_path, pool=None):
+    import send_capsules
+    from repository.capsule_repository import CapsuleRepository
+    from service.smtp_pool import pool_from_env
+
+    repo = CapsuleRepository(None, None, client=create_client(db_path))
+    if pool is None:
+        with pool_from_env() as fresh:
+            return send_capsules.run_once(fresh, repo)
+    return send_capsules.run_once(pool, repo)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--ticks", type=int, default=5)
+    parser.add_argument("--capsules-per-tick", type=int, default=20)
+    parser.add_argument("--handshake-ms", type=float, default=80.0)
+    parser.add_argument("--cold-tick", metavar="DB", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.cold_tick:
+        tick(args.cold_tick)
+        return
+
+    workdir = tempfile.mkdtemp()
+    db_path = os.path.join(workdir, "vault.db")
+    create_client(db_path)
+
+    with FakeSMTPServer(connect_delay=args.handshake_ms / 1000) as server:
+        os.environ.update({
+            "SUPABASE_URL": "http://127.0.0.1:9", "SUPABASE_KEY": "bench",
+            "EMAIL_ADDRESS": "bench@example.com", "EMAIL_PASSWORD": "secret",
+            "SMTP_HOST": "127.0.0.1", "SMTP_PORT": str(server.port), "SMTP_USE_SSL": "0",
+            "DELIVERY_JOURNAL": os.path.join(workdir, "journal.log"),
+        })
+
+        cold = []
+        for _ in range(args.ticks):
+            seed(db_path, args.capsules_per_tick)
+            start = time.perf_counter()
+            subprocess.run([sys.executable, "-m", "bench.daemon_bench", "--cold-tick", db_path],
+                           cwd=PROJECT_DIR, check=True, stdout=subprocess.DEVNULL)
+            cold.append(time.perf_counter() - start)
+
+        from service.smtp_pool import pool_from_env
+        warm = []
+        with contextlib.redirect_stdout(io.StringIO()), pool_from_env() as pool:
+            tick(db_path, pool)  # the daemon's first tick warms everything up
+            for _ in range(args.ticks):
+                seed(db_path, args.capsules_per_tick)
+                start = time.perf_counter()
+                tick(db_path, pool)
+                warm.append(time.perf_counter() - start)
+
+    print(f"{'mode':>6} {'median s':>9} {'min s':>8} {'max s':>8}")
+    for label, samples in (("cold", cold), ("warm", warm)):
+        print(f"{label:>6} {statistics.median(samples):>9.3f} {min(samples):>8.3f} {max(samples):>8.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+# bench/dashboard_bench.py
+"""
+Render cost of the "View Capsules" page: the old load-everything path
+(select("*") -> DataFrame -> .apply -> iterrows cards) against the paged
+path (find_page -> vectorised frame -> cards for one page), at several
+vault sizes, on the SQLite stand-in.
+
+    python -m bench.dashboard_bench --sizes 1000 10000 100000
+"""
+import argparse
+import time
+import tracemalloc
+from datetime import datetime, timedelta, timezone
+
+import pandas as pd
+
+from repository.sqlite_client import create_client
+from controller.dashboard_controller import CARD_COLORS, capsule_cards, capsule_frame
+from repository.capsule_repository import CapsuleRepository
+
+
+def seed(client, count):
+    base = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    for start in range(0, count, 5000):
+        client.table("capsules").insert([{
+            "title": f"Capsule {i}",
+            "message": f"<p>Message body number {i}</p>" * 4,
+            "recipient_email": f"user{i % 997}@example.com",
+            "scheduled_time": (base + timedelta(minutes=37 * i)).isoformat(),
+            "is_delivered": i % 3 == 0,
+        } for i in range(start, min(count, start + 5000))]).execute()
+
+
+def legacy_render(client, filter_status="Pending"):
+    # The pre-pagination code path, with st.markdown replaced by a list append.
+    data = client.table("capsules").select("*").execute().data
+    df = pd.DataFrame(data)
+    df["scheduled_time"] = pd.to_datetime(df["scheduled_time"], utc=True, errors="coerce")
+    df["scheduled_ist"] = df["scheduled_time"].apply(
+        lambda x: x + timedelta(hours=5, minutes=30) if pd.notnull(x) else None)
+    if filter_status == "Pending":
+        df = df[df["is_delivered"] == False]
+    cards = []
+    for i in range(0, len(df), 3):
+        for j, (_, row) in enumerate(df.iloc[i:i + 3].iterrows()):
+            scheduled_str = row["scheduled_ist"].strftime('%Y-%m-%d %H:%M') if pd.notnull(row["scheduled_ist"]) else "N/A"
+            color = CARD_COLORS[(i + j) % len(CARD_COLORS)]
+            cards.append(f"<div style='background: {color};'>{row['title']}{row['message']}"
+                         f"{row['recipient_email']}{scheduled_str}</div>")
+    return len(cards)
+
+
+def paged_render(repo, filter_status="Pending", page_size=30):
+    data, total = repo.find_page(filter_status, page=0, page_size=page_size)
+    return len(capsule_cards(capsule_frame(data)))
+
+
+def measure(fn):
+    start = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()
+    fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    args = parser.parse_args()
+
+    print(f"{'capsules':>9} {'path':>7} {'seconds':>9} {'peak MiB':>9}")
+    for size in args.sizes:
+        client = create_client()
+        seed(client, size)
+        repo = CapsuleRepository(None, None, client=client)
+        for label, fn in (("legacy", lambda: legacy_render(client)), ("paged", lambda: paged_render(repo))):
+            elapsed, peak = measure(fn)
+            print(f"{size:>9} {label:>7} {elapsed:>9.3f} {peak / 2**20:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+# bench/dashboard_load_bench.py
+"""
+50 concurrent dashboard users against a local stand-in for PostgREST that
+answers every query after ``--latency`` seconds (the round trip to a
+hosted Supabase) and counts requests and TCP connections. Each user
+re-runs the Streamlit script ``--reruns`` times with a random think time
+in between; a rerun is the View Capsules page (one of a few popular
+filter/page combinations) or, one time in four, the Create Capsule form
+with its user list. Modes:
+
+    per-rerun client   create_client() on every rerun, as app.py once did
+    shared client      one client and pooled HTTP session for the process
+    single-flight      shared client; concurrent identical reads coalesce
+                       (TTL of a few milliseconds, so only overlap counts)
+    cached             shared client, single-flight and the app's TTLs
+
+    python -m bench.dashboard_load_bench --users 50 --reruns 20
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import threading
+import time
+import warnings
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+from controller.dashboard_controller import capsule_cards, capsule_frame
+from repository.cached_capsule_repository import CachedCapsuleRepository
+from repository.cached_user_repository import CachedUserRepository
+from repository.capsule_repository import CapsuleRepository
+from repository.user_repository import UserRepository
+
+# (status, page) a viewer lands on, most popular first.
+VIEWS = [("All", 0), ("Pending", 0), ("Delivered", 0), ("All", 1), ("Pending", 1), ("All", 2)]
+VIEW_WEIGHTS = [40, 25, 15, 10, 6, 4]
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+
+    def do_GET(self):
+        time.sleep(self.server.latency)
+        table = urlparse(self.path).path.rsplit("/", 1)[-1]
+        body = self.server.payloads.get(table, b"[]")
+        with self.server.lock:
+            self.server.requests += 1
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        if "count=exact" in self.headers.get("Prefer", ""):
+            self.send_header("Content-Range", f"0-29/{self.server.total}")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class FakePostgREST(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, latency, users=200, total=5000):
+        super().__init__(("127.0.0.1", 0), _Handler)
+        self.latency = latency
+        self.total = total
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.connections = 0
+        now = datetime.now(timezone.utc)
+        self.payloads = {
+            "users": json.dumps([{"id": i, "name": f"User {i}", "email": f"user{i}@example.com"}
+                                 for i in range(1, users + 1)]).encode(),
+            "capsules": json.dumps([{
+                "id": i, "title": f"Capsule {i}", "preview": "remember the summer we promised " * 3,
+                "recipient_email": f"friend{i}@gmail.com", "is_delivered": i % 3 == 0, "attachment_count": int(i % 4 == 0),
+                "scheduled_time": (now + timedelta(hours=i)).isoformat(),
+            } for i in range(30)]).encode(),
+        }
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def __enter__(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown()
+        self.server_close()
+
+
+def repositories(mode, url, key):
+    """``() -> (user_repo, capsule_repo)`` as one rerun of app.py sees them in ``mode``."""
+    if mode == "per-rerun client":
+        from supabase import create_client
+
+        def fresh():
+            client = create_client(url, key)
+            return UserRepository(url, key, client=client), CapsuleRepository(url, key, client=client)
+        return fresh
+
+    from repository.client_factory import get_client
+
+    client = get_client(url, key)
+    users, capsules = UserRepository(url, key, client=client), CapsuleRepository(url, key, client=client)
+    if mode == "single-flight":
+        users, capsules = CachedUserRepository(users, ttl=0.001), CachedCapsuleRepository(capsules, ttl=0.001)
+    elif mode == "cached":
+        users, capsules = CachedUserRepository(users), CachedCapsuleRepository(capsules)
+    return lambda: (users, capsules)
+
+
+def user_session(rerun_repos, reruns, think, seed, latencies, start):
+    rng = random.Random(seed)
+    start.wait()
+    for _ in range(reruns):
+        began = time.perf_counter()
+        users, capsules = rerun_repos()
+        if rng.random() < 0.25:
+            users.find_all()
+        else:
+            status, page = rng.choices(VIEWS, weights=VIEW_WEIGHTS)[0]
+            data, _ = capsules.find_page(status, page=page)
+            capsule_cards(capsule_frame(data), page * 30)
+        latencies.append(time.perf_counter() - began)
+        time.sleep(rng.expovariate(1 / think) if think else 0)
+
+
+def run(mode, args):
+    with FakePostgREST(args.latency) as server:
+        rerun_repos = repositories(mode, server.url, "bench")
+        latencies, start = [], threading.Event()
+        threads = [threading.Thread(target=user_session,
+                                    args=(rerun_repos, args.reruns, args.think, i, latencies, start))
+                   for i in range(args.users)]
+        for t in threads:
+            t.start()
+        began = time.perf_counter()
+        start.set()
+        for t in threads:
+            t.join()
+        elapsed = time.perf_counter() - began
+        latencies.sort()
+        return {
+            "reruns/s": len(latencies) / elapsed,
+            "p50 ms": statistics.median(latencies) * 1000,
+            "p99 ms": latencies[int(len(latencies) * 0.99) - 1] * 1000,
+            "requests": server.requests,
+            "connections": server.connections,
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--reruns", type=int, default=20, help="per user")
+    parser.add_argument("--latency", type=float, default=0.03, help="seconds per backend round trip")
+    parser.add_argument("--think", type=float, default=0.2, help="mean seconds between a user's reruns")
+    parser.add_argument("--modes", nargs="+",
+                        default=["per-rerun client", "shared client", "single-flight", "cached"])
+    args = parser.parse_args()
+
+    os.environ["STORAGE_BACKEND"] = "supabase"
+    warnings.filterwarnings("ignore", category=DeprecationWarning)  # supabase-py's own, as in app.py
+    print(f"{args.users} users x {args.reruns} reruns, {args.latency * 1000:.0f} ms per backend call")
+    print(f"{'mode':>18} {'reruns/s':>9} {'p50 ms':>8} {'p99 ms':>8} {'requests':>9} {'connections':>12}")
+    for mode in args.modes:
+        r = run(mode, args)
+        print(f"{mode:>18} {r['reruns/s']:>9.1f} {r['p50 ms']:>8.1f} {r['p99 ms']:>8.1f} "
+              f"{r['requests']:>9} {r['connections']:>12}", flush=True)
+
+
+if __name__ == "__main__":
+    main()
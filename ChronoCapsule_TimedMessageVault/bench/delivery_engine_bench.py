@@ -0,0 +1,85 @@
+# bench/delivery_engine_bench.py
+"""
+Capsules/second through CapsuleService.deliver_capsules at different worker
+counts, against a fake SMTP server and a fake repository whose update()
+sleeps like a Supabase HTTP round-trip.
+
+    python -m bench.delivery_engine_bench --capsules 400 --workers 1 2 4 8
+"""
+import argparse
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+from bench.fake_smtp import FakeSMTPServer
+from model.capsule import Capsule
+from service.capsule_service import CapsuleService
+from service.smtp_pool import SMTPPool
+
+DOMAINS = ["gmail.com", "yahoo.com", "outlook.com", "example.org"]
+
+
+class FakeCapsuleRepository:
+    def __init__(self, count, ack_latency):
+        self.ack_latency = ack_latency
+        due = datetime.now(timezone.utc) - timedelta(minutes=1)
+        self.capsules = [
+            Capsule(i, f"Capsule {i}", f"Happy new year #{i}", None, due,
+                    recipient_email=f"user{i}@{DOMAINS[i % len(DOMAINS)]}")
+            for i in range(count)
+        ]
+        self.updates = 0
+
+    def iter_claimed(self, worker_id, now):
+        # Single worker, so every due capsule is trivially ours.
+        return (c for c in self.capsules if not c.is_delivered and c.scheduled_time <= now)
+
+    def mark_delivered_many(self, ids):
+        time.sleep(self.ack_latency)
+        self.updates += len(ids)
+
+    # Bodies are in memory here; nothing to fetch from a message store.
+    def message_body(self, capsule):
+        return capsule.message
+
+    def message_attachments(self, capsule):
+        return ()
+
+
+def run(server, capsules, workers, ack_latency, per_domain):
+    os.environ["DELIVERY_WORKERS"] = str(workers)
+    os.environ["DELIVERY_PER_DOMAIN"] = str(per_domain)
+    repo = FakeCapsuleRepository(capsules, ack_latency)
+    with SMTPPool("bench@example.com", "secret", host="127.0.0.1", port=server.port,
+                  use_ssl=False, size=max(1, min(workers, per_domain * len(DOMAINS)))) as pool:
+        service = CapsuleService(repo, None, pool)
+        start = time.perf_counter()
+        service.deliver_capsules()
+        elapsed = time.perf_counter() - start
+    return repo.updates, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--capsules", type=int, default=400)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--per-domain", type=int, default=2)
+    parser.add_argument("--send-ms", type=float, default=5.0)
+    parser.add_argument("--ack-ms", type=float, default=20.0)
+    args = parser.parse_args()
+
+    results = []
+    os.environ["DELIVERY_JOURNAL"] = os.path.join(tempfile.mkdtemp(), "journal.log")
+    with FakeSMTPServer(send_delay=args.send_ms / 1000) as server:
+        for workers in args.workers:
+            delivered, elapsed = run(server, args.capsules, workers, args.ack_ms / 1000, args.per_domain)
+            results.append((workers, delivered, elapsed))
+
+    print(f"\n{'workers':>8} {'delivered':>10} {'seconds':>9} {'capsules/s':>11}")
+    for workers, delivered, elapsed in results:
+        print(f"{workers:>8} {delivered:>10} {elapsed:>9.3f} {delivered / elapsed:>11.1f}")
+
+
+if __name__ == "__main__":
+    main()
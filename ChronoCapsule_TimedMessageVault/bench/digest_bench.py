@@ -0,0 +1,130 @@
+# bench/digest_bench.py
+"""
+Connections, messages and run time of one delivery run through
+CapsuleService.deliver_capsules on a skewed synthetic due set: recipient
+domains and recipients are both Zipf-distributed, so one big provider
+carries most of the traffic and a few addresses get many capsules.
+
+Compares sending capsule by capsule with merging each recipient's
+capsules into digests (DELIVERY_DIGEST=1). The fake SMTP server sleeps
+``connect_delay`` per session and ``send_delay`` per message and, like
+Gmail, only accepts ``--session-limit`` messages per session, so fewer
+messages also means fewer connections.
+
+    python -m bench.digest_bench --capsules 5000 --workers 8
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+from bench.fake_smtp import FakeSMTPServer
+from model.capsule import Capsule
+from service.capsule_service import CapsuleService
+from service.smtp_pool import SMTPPool
+
+MODES = {
+    "per-capsule": {"DELIVERY_DIGEST": "0"},
+    "digest": {"DELIVERY_DIGEST": "1"},
+}
+
+
+def zipf_weights(n, s):
+    return [1 / (rank ** s) for rank in range(1, n + 1)]
+
+
+def skewed_capsules(count, domains, recipients, skew, seed):
+    rng = random.Random(seed)
+    domain_names = ["gmail.com", "yahoo.com", "outlook.com"] + [f"corp{i}.example" for i in range(domains - 3)]
+    domain_picks = rng.choices(domain_names, zipf_weights(len(domain_names), skew), k=count)
+    recipient_picks = rng.choices(range(recipients), zipf_weights(recipients, skew), k=count)
+    due = datetime.now(timezone.utc) - timedelta(minutes=1)
+    return [
+        (i, f"user{r}@{d}") for i, (d, r) in enumerate(zip(domain_picks, recipient_picks))
+    ], due
+
+
+class FakeCapsuleRepository:
+    def __init__(self, rows, due):
+        self.capsules = [
+            Capsule(i, f"Capsule {i}", f"Hello from the past #{i}", None, due, recipient_email=recipient)
+            for i, recipient in rows
+        ]
+        self.updates = 0
+
+    def iter_claimed(self, worker_id, now):
+        return iter(self.capsules)
+
+    def mark_delivered_many(self, ids):
+        self.updates += len(ids)
+
+    # Bodies are in memory here; nothing to fetch from a message store.
+    def message_body(self, capsule):
+        return capsule.message
+
+    def message_attachments(self, capsule):
+        return ()
+
+
+def run(mode, rows, due, args):
+    os.environ.update(MODES[mode])
+    os.environ["DELIVERY_WORKERS"] = str(args.workers)
+    os.environ["DELIVERY_PER_DOMAIN"] = str(args.per_domain)
+    os.environ["DELIVERY_PLAN_WINDOW"] = str(args.window)
+    repo = FakeCapsuleRepository(rows, due)
+    with FakeSMTPServer(connect_delay=args.connect_delay, send_delay=args.send_delay,
+                        drop_after=args.session_limit) as server:
+        with SMTPPool("bench@example.com", "secret", host="127.0.0.1", port=server.port, use_ssl=False,
+                      size=args.workers, max_messages=args.session_limit) as pool:
+            service = CapsuleService(repo, None, pool)
+            start = time.perf_counter()
+            service.deliver_capsules()
+            elapsed = time.perf_counter() - start
+        return {
+            "mode": mode,
+            "acked": repo.updates,
+            "messages": server.messages,
+            "connections": server.connections,
+            "seconds": round(elapsed, 3),
+            "capsules_per_second": round(repo.updates / elapsed, 1),
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--capsules", type=int, default=5000)
+    parser.add_argument("--domains", type=int, default=40)
+    parser.add_argument("--recipients", type=int, default=1000)
+    parser.add_argument("--skew", type=float, default=1.2, help="Zipf exponent for domains and recipients")
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--per-domain", type=int, default=2)
+    parser.add_argument("--window", type=int, default=500)
+    parser.add_argument("--connect-delay", type=float, default=0.05)
+    parser.add_argument("--send-delay", type=float, default=0.002)
+    parser.add_argument("--session-limit", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=17)
+    parser.add_argument("--modes", nargs="+", default=list(MODES), choices=list(MODES))
+    args = parser.parse_args()
+    os.environ["DELIVERY_JOURNAL"] = os.path.join(tempfile.mkdtemp(), "journal.log")
+
+    rows, due = skewed_capsules(args.capsules, args.domains, args.recipients, args.skew, args.seed)
+    top = max(sum(1 for _, r in rows if r.endswith("@gmail.com")), 1)
+    print(f"{args.capsules} capsules, {top / len(rows):.0%} to gmail.com, "
+          f"{len({r for _, r in rows})} distinct recipients")
+
+    results = [run(mode, rows, due, args) for mode in args.modes]
+    print(f"{'mode':>16} {'messages':>9} {'connections':>12} {'seconds':>8} {'capsules/s':>11}")
+    for r in results:
+        print(f"{r['mode']:>16} {r['messages']:>9} {r['connections']:>12} {r['seconds']:>8} "
+              f"{r['capsules_per_second']:>11}")
+    baseline = results[0]
+    for r in results[1:]:
+        print(f"📊 {r['mode']} vs {baseline['mode']}: "
+              f"{baseline['connections'] / max(r['connections'], 1):.1f}x fewer connections, "
+              f"{baseline['seconds'] / r['seconds']:.2f}x faster")
+
+
+if __name__ == "__main__":
+    main()
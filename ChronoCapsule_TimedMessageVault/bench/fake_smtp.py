@@ -0,0 +1,115 @@
+# bench/fake_smtp.py
+"""
+Minimal local SMTP stand-in for benchmarks, in the spirit of the old
+``smtpd.DebuggingServer``: accepts EHLO/AUTH/MAIL/RCPT/DATA, throws the
+messages away and counts what it saw.
+
+``connect_delay`` is slept once per new session to stand in for the TCP +
+TLS handshake and login of a real provider. ``drop_after`` makes the server
+answer 421 and hang up after that many messages on one session, which is
+what Gmail does when it throttles an account. ``rcpt_replies`` maps an
+address substring to the reply RCPT TO gets for matching recipients, e.g.
+``{"nobody@": "550 5.1.1 No such user"}``.
+"""
+import socketserver
+import threading
+import time
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def reply(self, line):
+        self.wfile.write(line.encode() + b"\r\n")
+
+    def handle(self):
+        server = self.server
+        with server.lock:
+            server.connections += 1
+        if server.connect_delay:
+            time.sleep(server.connect_delay)
+        self.reply("220 localhost fake ESMTP")
+        in_session = 0
+
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            cmd = line.decode(errors="replace").strip()
+            verb = cmd.split(" ", 1)[0].upper()
+
+            if verb == "EHLO":
+                self.wfile.write(b"250-localhost\r\n250-AUTH PLAIN LOGIN\r\n250 8BITMIME\r\n")
+            elif verb == "HELO":
+                self.reply("250 localhost")
+            elif verb == "AUTH":
+                with server.lock:
+                    server.logins += 1
+                self.reply("235 2.7.0 Authentication successful")
+            elif verb == "MAIL":
+                if server.drop_after and in_session >= server.drop_after:
+                    self.reply("421 4.7.0 Try again later, closing connection")
+                    return
+                self.reply("250 OK")
+            elif verb == "RCPT":
+                with server.lock:
+                    server.rcpts += 1
+                reply = next((r for key, r in server.rcpt_replies.items() if key in cmd), "250 OK")
+                self.reply(reply)
+            elif verb in ("RSET", "NOOP"):
+                self.reply("250 OK")
+            elif verb == "DATA":
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+                size = 0
+                while True:
+                    data = self.rfile.readline()
+                    if not data or data == b".\r\n":
+                        break
+                    size += len(data)
+                if server.send_delay:
+                    time.sleep(server.send_delay)
+                in_session += 1
+                with server.lock:
+                    server.messages += 1
+                    server.bytes += size
+                self.reply("250 OK queued")
+            elif verb == "QUIT":
+                self.reply("221 Bye")
+                return
+            else:
+                self.reply("502 Command not implemented")
+
+
+class FakeSMTPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, host="127.0.0.1", port=0, connect_delay=0.0, send_delay=0.0, drop_after=0,
+                 rcpt_replies=None):
+        super().__init__((host, port), _Handler)
+        self.connect_delay = connect_delay
+        self.send_delay = send_delay
+        self.drop_after = drop_after
+        self.rcpt_replies = rcpt_replies or {}
+        self.lock = threading.Lock()
+        self.connections = 0
+        self.logins = 0
+        self.messages = 0
+        self.rcpts = 0
+        self.bytes = 0
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
@@ -0,0 +1,106 @@
+# bench/lease_bench.py
+"""
+Throughput of N delivery workers splitting one due set through the lease
+protocol, against the SQLite stand-in and the fake SMTP server. Also checks
+that every capsule was emailed exactly once.
+
+    python -m bench.lease_bench --capsules 2000 --workers 1 2 4 8
+"""
+import argparse
+import os
+import tempfile
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+
+from bench.fake_smtp import FakeSMTPServer
+from repository.sqlite_client import create_client
+from repository.capsule_repository import CapsuleRepository
+from service.capsule_service import CapsuleService
+from service.smtp_pool import SMTPPool
+
+
+class CountingMailer:
+    """Wraps a pool and records how many times each recipient was emailed."""
+
+    def __init__(self, pool, sends):
+        self.pool = pool
+        self.sends = sends
+        self.lock = threading.Lock()
+
+    @property
+    def address(self):
+        return self.pool.address
+
+    def send_rendered(self, email):
+        self.pool.send_rendered(email)
+        with self.lock:
+            self.sends[email.recipient] += 1
+
+    def stats(self):
+        return self.pool.stats()
+
+
+def seed(path, count):
+    client = create_client(path)
+    due = datetime.now(timezone.utc) - timedelta(minutes=1)
+    rows = [{
+        "title": f"Capsule {i}",
+        "message": f"Body {i}",
+        "recipient_email": f"user{i}@example.com",
+        "scheduled_time": due.isoformat(),
+        "is_delivered": False,
+    } for i in range(count)]
+    for start in range(0, count, 500):
+        client.table("capsules").insert(rows[start:start + 500]).execute()
+
+
+def run(workers, capsules, smtp_port, workdir):
+    path = os.path.join(workdir, f"vault-{workers}.db")
+    seed(path, capsules)
+    sends = Counter()
+    pool = SMTPPool("bench@example.com", "secret", host="127.0.0.1", port=smtp_port,
+                    use_ssl=False, size=workers)
+
+    def worker(n):
+        repo = CapsuleRepository(None, None, client=create_client(path))
+        service = CapsuleService(repo, None, CountingMailer(pool, sends), worker_id=f"worker-{n}",
+                                 journal_path=os.path.join(workdir, f"journal-{workers}-{n}.log"))
+        service.deliver_capsules()
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(workers)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+    pool.close()
+
+    undelivered = create_client(path).table("capsules").select("id", count="exact") \
+        .eq("is_delivered", False).execute().count
+    duplicates = sum(n - 1 for n in sends.values() if n > 1)
+    return sum(sends.values()), duplicates, undelivered, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--capsules", type=int, default=2000)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--send-ms", type=float, default=5.0)
+    args = parser.parse_args()
+
+    os.environ.setdefault("DELIVERY_WORKERS", "4")
+    results = []
+    with tempfile.TemporaryDirectory() as workdir, FakeSMTPServer(send_delay=args.send_ms / 1000) as server:
+        for workers in args.workers:
+            results.append((workers, *run(workers, args.capsules, server.port, workdir)))
+
+    print(f"\n{'workers':>8} {'sent':>7} {'dupes':>6} {'left':>6} {'seconds':>9} {'capsules/s':>11}")
+    for workers, sent, duplicates, undelivered, elapsed in results:
+        print(f"{workers:>8} {sent:>7} {duplicates:>6} {undelivered:>6} {elapsed:>9.3f} {sent / elapsed:>11.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+# bench/loadgen.py
+"""
+Synthetic vault for the benchmarks: ``users`` users and ``capsules``
+capsules with the shape a real ChronoCapsule vault has.
+
+- Schedules cluster the way people pick times: about half land exactly on
+  a round hour, a good share on the half hour, a spike at midnight IST on
+  New Year's Day, the rest anywhere. Future capsules thin out with
+  distance (most are for the coming weeks, a tail runs years out).
+- ``delivered`` of them are history (past, is_delivered), ``due`` of them
+  are the backlog a delivery run finds: scheduled in the last hour, most of
+  them on the top-of-the-hour spike.
+- Creators and recipient domains are Zipf-distributed (a few heavy users,
+  gmail.com first); a share of capsules has no recipient_email and falls
+  back to the creator's address.
+- Message bodies are log-normal in length, some of them HTML. They go to
+  the message store (repository/message_store.py) with a preview on the
+  capsule row, or inline in ``capsules.message`` with ``inline=True``.
+
+Seeds any client with the supabase-py query builder subset, normally the
+SQLite stand-in:
+
+    python -m bench.loadgen --users 1000 --capsules 100000 --path vault.db
+"""
+import argparse
+import itertools
+import math
+import random
+from datetime import datetime, timedelta, timezone
+
+from repository.message_store import message_preview, message_store_from_env
+
+IST_OFFSET = timedelta(hours=5, minutes=30)
+DOMAINS = ["gmail.com", "yahoo.com", "outlook.com", "icloud.com", "proton.me", "hotmail.com"] + \
+    [f"corp{i}.example" for i in range(40)]
+WORDS = ("remember the summer we promised to open this together when everything changed "
+         "happy birthday new year future self hope you kept going proud of you").split()
+INSERT_BATCH = 5000
+
+
+def _zipf_cum_weights(n, s=1.1):
+    # Cumulative, so each draw is a bisect rather than a pass over all n.
+    return list(itertools.accumulate(1 / (rank ** s) for rank in range(1, n + 1)))
+
+
+class VaultShape:
+    """Random draws for one synthetic vault; deterministic for a given seed."""
+
+    def __init__(self, users, seed=19, now=None, no_recipient=0.05, html=0.3):
+        self.rng = random.Random(seed)
+        self.now = now or datetime.now(timezone.utc)
+        self.users = users
+        self.no_recipient = no_recipient
+        self.html = html
+        self._user_ids = range(1, users + 1)
+        self._user_weights = _zipf_cum_weights(users)
+        self._domain_weights = _zipf_cum_weights(len(DOMAINS), 1.3)
+        self.top_of_hour = self.now.replace(minute=0, second=0, microsecond=0)
+
+    def _clock(self, day):
+        """A time on ``day`` (UTC date at 00:00), clustered the way people schedule."""
+        r = self.rng.random()
+        hour = int(self.rng.triangular(0, 24, 13)) % 24  # daytime-heavy, in IST
+        if r < 0.5:
+            local = timedelta(hours=hour)
+        elif r < 0.7:
+            local = timedelta(hours=hour, minutes=30)
+        elif r < 0.75:
+            local = timedelta(hours=9)  # "first thing in the morning"
+        else:
+            local = timedelta(seconds=self.rng.randrange(86400))
+        return day + local - IST_OFFSET
+
+    def future_time(self):
+        if self.rng.random() < 0.02:
+            new_year = datetime(self.now.year + 1, 1, 1, tzinfo=timezone.utc) - IST_OFFSET
+            return new_year
+        days = min(3650, int(self.rng.expovariate(1 / 45)) + 1)
+        day = (self.now + timedelta(days=days)).replace(hour=0, minute=0, second=0, microsecond=0)
+        return self._clock(day)
+
+    def past_time(self):
+        days = int(self.rng.expovariate(1 / 120)) + 1
+        day = (self.now - timedelta(days=days)).replace(hour=0, minute=0, second=0, microsecond=0)
+        return min(self._clock(day), self.now - timedelta(hours=1))
+
+    def due_time(self):
+        # The delivery backlog: a spike on the last round hour, the rest
+        # spread over the hour before it.
+        if self.rng.random() < 0.6:
+            return self.top_of_hour
+        return self.top_of_hour - timedelta(seconds=self.rng.randrange(3600))
+
+    def message(self, i):
+        length = max(1, int(self.rng.lognormvariate(math.log(40), 0.8)))
+        text = " ".join(self.rng.choice(WORDS) for _ in range(length))
+        if self.rng.random() < self.html:
+            return f"<p>{text}</p><p>-- capsule {i}</p>"
+        return f"{text}\n-- capsule {i}"
+
+    def recipient(self):
+        if self.rng.random() < self.no_recipient:
+            return None
+        domain = self.rng.choices(DOMAINS, cum_weights=self._domain_weights)[0]
+        return f"friend{self.rng.randrange(self.users * 5)}@{domain}"
+
+    def creator(self):
+        return self.rng.choices(self._user_ids, cum_weights=self._user_weights)[0]
+
+
+def user_rows(count):
+    return [{"name": f"User {i}", "email": f"user{i}@{DOMAINS[i % len(DOMAINS)]}"} for i in range(1, count + 1)]
+
+
+def capsule_rows(shape, count, due=0.05, delivered=0.3):
+    """Yield capsule rows; roughly ``due`` and ``delivered`` of them (fractions) are due / history."""
+    for i in range(count):
+        kind = shape.rng.random()
+        if kind < due:
+            scheduled, is_delivered = shape.due_time(), False
+        elif kind < due + delivered:
+            scheduled, is_delivered = shape.past_time(), True
+        else:
+            scheduled, is_delivered = shape.future_time(), False
+        yield {
+            "title": f"Capsule {i}",
+            "message": shape.message(i),
+            "creator_id": shape.creator(),
+            "recipient_email": shape.recipient(),
+            "scheduled_time": scheduled.isoformat(),
+            "is_delivered": is_delivered,
+        }
+
+
+def _insert_capsules(client, batch, messages):
+    if messages is None:
+        client.table("capsules").insert(batch).execute()
+        return
+    bodies = [row.pop("message") for row in batch]
+    for row, body in zip(batch, bodies):
+        row["preview"] = message_preview(body)
+    ids = [row["id"] for row in client.table("capsules").insert(batch).execute().data]
+    messages.put_many(zip(ids, bodies))
+
+
+def seed(client, users, capsules, due=0.05, delivered=0.3, seed_value=19, now=None, inline=False):
+    """Insert a synthetic vault in batches; returns the VaultShape used."""
+    shape = VaultShape(users, seed_value, now)
+    messages = None if inline else message_store_from_env(client)
+    rows = user_rows(users)
+    for start in range(0, len(rows), INSERT_BATCH):
+        client.table("users").insert(rows[start:start + INSERT_BATCH]).execute()
+    batch = []
+    for row in capsule_rows(shape, capsules, due, delivered):
+        batch.append(row)
+        if len(batch) == INSERT_BATCH:
+            _insert_capsules(client, batch, messages)
+            batch = []
+    if batch:
+        _insert_capsules(client, batch, messages)
+    return shape
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--path", default="vault.db", help="SQLite file to create or extend")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--capsules", type=int, default=100000)
+    parser.add_argument("--due", type=float, default=0.05, help="fraction due now")
+    parser.add_argument("--delivered", type=float, default=0.3, help="fraction already delivered")
+    parser.add_argument("--seed", type=int, default=19)
+    args = parser.parse_args()
+
+    from repository.sqlite_client import create_client
+
+    client = create_client(args.path)
+    seed(client, args.users, args.capsules, args.due, args.delivered, args.seed)
+    counts = client.conn.execute(
+        "SELECT SUM(is_delivered), SUM(NOT is_delivered AND scheduled_time <= ?), COUNT(*) FROM capsules",
+        (datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%f+00:00"),)).fetchone()
+    client.close()
+    print(f"✅ Seeded {args.path}: {args.users} users, {counts[2]} capsules "
+          f"({counts[0]} delivered, {counts[1]} due now)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+# bench/message_store_bench.py
+"""
+Message bodies inline in ``capsules.message`` against the message store
+(repository/message_store.py): the same bench.loadgen vault seeded both
+ways into the SQLite stand-in, then
+
+    due scan    CapsuleRepository.find_due over the whole due backlog
+    list page   one "View Capsules" page, old columns (message) vs new (preview)
+    claim       leasing the due backlog (RETURNING * carries the row)
+    db size     page_count * page_size after the seed
+    send peak   tracemalloc peak for sending one ~5 MB HTML capsule to
+                bench.fake_smtp: render_capsule + sendmail vs streamed
+
+    python -m bench.message_store_bench --capsules 100000
+"""
+import argparse
+import random
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+from bench.fake_smtp import FakeSMTPServer
+from bench.loadgen import WORDS, seed
+from model.capsule import Capsule
+from repository.capsule_repository import LIST_COLUMNS, CapsuleRepository
+from repository.sqlite_client import create_client
+from service.email_templates import render_capsule, stream_capsule
+from service.smtp_pool import SMTPPool
+
+INLINE_LIST_COLUMNS = "id,title,message,recipient_email,scheduled_time,is_delivered"
+SENDER = "bench@example.com"
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return (time.perf_counter() - start) * 1000, result
+
+
+def db_bytes(client):
+    pages = client.conn.execute("PRAGMA page_count").fetchone()[0]
+    return pages * client.conn.execute("PRAGMA page_size").fetchone()[0]
+
+
+def stored_bytes(client):
+    raw, stored = client.conn.execute(
+        "SELECT COALESCE(SUM(size), 0), COALESCE(SUM(LENGTH(data)), 0) FROM capsule_messages").fetchone()
+    return raw, stored
+
+
+def layout(capsules, inline, now):
+    client = create_client()
+    seed(client, max(10, capsules // 100), capsules, now=now, inline=inline)
+    repo = CapsuleRepository(None, None, client=client)
+    columns = INLINE_LIST_COLUMNS if inline else LIST_COLUMNS
+    result = {"db MiB": db_bytes(client) / 2**20}
+    result["due scan ms"], _ = timed(lambda: list(repo.iter_due(now)))
+    result["list page ms"], _ = timed(lambda: client.table("capsules").select(columns)
+                                      .order("scheduled_time", desc=True).limit(30).execute())
+    ids = [c.id for c in repo.iter_due(now)]
+    result["claim ms"], claimed = timed(lambda: repo.claim(ids, "bench", now))
+    result["claimed"] = len(claimed)
+    if not inline:
+        raw, stored = stored_bytes(client)
+        result["ratio"] = raw / stored if stored else 0
+    client.close()
+    return result
+
+
+def large_html(size, rng):
+    paragraphs, total = [], 0
+    while total < size:
+        paragraph = "<p>" + " ".join(rng.choice(WORDS) for _ in range(60)) + "</p>\n"
+        paragraphs.append(paragraph)
+        total += len(paragraph)
+    return "".join(paragraphs)
+
+
+def send_peak(server, make_email):
+    with SMTPPool(SENDER, "secret", host="127.0.0.1", port=server.port, use_ssl=False, size=1) as pool:
+        pool.send_rendered(make_email(None))  # connect and log in outside the measurement
+        tracemalloc.start()
+        elapsed, _ = timed(lambda: pool.send_rendered(make_email(pool)))
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--capsules", type=int, default=100000)
+    parser.add_argument("--message-mib", type=float, default=5.0, help="size of the single large send")
+    args = parser.parse_args()
+
+    now = datetime.now(timezone.utc)
+    results = {label: layout(args.capsules, label == "inline", now) for label in ("inline", "store")}
+    keys = ["db MiB", "due scan ms", "list page ms", "claim ms", "claimed"]
+    print(f"{args.capsules} capsules")
+    print(f"{'':>14} " + " ".join(f"{label:>10}" for label in results))
+    for key in keys:
+        print(f"{key:>14} " + " ".join(f"{r[key]:>10.1f}" for r in results.values()))
+    print(f"{'compression':>14} {results['store']['ratio']:>21.2f}x")
+
+    # One large HTML capsule, sent whole vs streamed from the store.
+    client = create_client()
+    repo = CapsuleRepository(None, None, client=client)
+    body = large_html(int(args.message_mib * 2**20), random.Random(20))
+    capsule = Capsule(None, "Big", body, None, now, recipient_email="big@example.com")
+    repo.save(capsule)
+    capsule_id = capsule.id
+    loaded = {"message": body}
+    del body, capsule
+
+    def whole(_pool):
+        # The old path: the body as a str, rendered in full, then sendmail.
+        return render_capsule(SENDER, "big@example.com", "Big", loaded["message"])
+
+    def streamed(_pool):
+        return stream_capsule(SENDER, "big@example.com", "Big", repo.messages.body(capsule_id))
+
+    with FakeSMTPServer() as server:
+        loaded_ms, _ = timed(lambda: repo.load_message(capsule_id))
+        whole_ms, whole_peak = send_peak(server, whole)
+        streamed_ms, streamed_peak = send_peak(server, streamed)
+    client.close()
+    print(f"\n{args.message_mib:.0f} MiB HTML send   {'ms':>8} {'peak MiB':>9}")
+    print(f"{'render+sendmail':>18} {whole_ms:>8.1f} {whole_peak / 2**20:>9.1f}")
+    print(f"{'streamed':>18} {streamed_ms:>8.1f} {streamed_peak / 2**20:>9.1f}")
+    print(f"(loading the stored body as one str: {loaded_ms:.1f} ms)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+# bench/model_bench.py
+"""
+Memory and construction time of the Capsule/User models: the old
+dict-backed classes (timestamp parsed and converted to local time for
+every row, message always loaded) against the slotted ones (row mapped as-is, timestamp parsed on
+first use, message left out of scheduling reads).
+
+Rows are generated as the JSON decoder would hand them over. "+parse"
+adds reading every scheduled_time (what the scheduler heap does); memory
+is what is still allocated after that, once the rows are dropped and only
+the models are held.
+
+    python -m bench.model_bench --sizes 10000 100000 500000
+"""
+import argparse
+import gc
+import time
+import tracemalloc
+from datetime import datetime, timedelta, timezone
+
+from model.capsule import Capsule
+from model.user import User
+
+
+class LegacyCapsule:
+    def __init__(self, id, title, message, creator_id, scheduled_time, is_delivered=False, recipient_email=None):
+        self.id = id
+        self.title = title
+        self.message = message
+        self.creator_id = creator_id
+        self.scheduled_time = scheduled_time
+        self.is_delivered = is_delivered
+        self.recipient_email = recipient_email
+
+
+class LegacyUser:
+    def __init__(self, id, name, email):
+        self.id = id
+        self.name = name
+        self.email = email
+
+
+def legacy_capsule(c):
+    # CapsuleRepository._to_capsule before the slotted model.
+    local_time = datetime.fromisoformat(c["scheduled_time"]).astimezone()
+    return LegacyCapsule(c["id"], c["title"], c["message"], c["creator_id"], local_time,
+                         c["is_delivered"], c.get("recipient_email"))
+
+
+def capsule_rows(count, with_message=True):
+    base = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    rows = []
+    for i in range(count):
+        row = {
+            "id": i,
+            "title": f"Capsule {i}",
+            "creator_id": i % 1000,
+            "recipient_email": f"user{i % 5000}@example.com",
+            "scheduled_time": (base + timedelta(seconds=17 * i)).isoformat(),
+            "is_delivered": False,
+        }
+        if with_message:
+            row["message"] = f"Dear future me, this is capsule number {i}. " * 8
+        rows.append(row)
+    return rows
+
+
+def user_rows(count):
+    return [{"id": i, "name": f"User {i}", "email": f"user{i}@example.com"} for i in range(count)]
+
+
+def measure(make_rows, build, touch=None):
+    """(construct seconds, construct + touch seconds, bytes retained by the models)"""
+    rows = make_rows()
+    gc.collect()
+    start = time.perf_counter()
+    models = [build(row) for row in rows]
+    built = time.perf_counter() - start
+    if touch:
+        for model in models:
+            touch(model)
+    touched = time.perf_counter() - start
+    del rows, models
+
+    # Memory in a separate pass: tracemalloc would skew the timings.
+    gc.collect()
+    tracemalloc.start()
+    rows = make_rows()
+    models = [build(row) for row in rows]
+    if touch:
+        for model in models:
+            touch(model)
+    del rows
+    gc.collect()
+    retained, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return built, touched, retained
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 500_000])
+    args = parser.parse_args()
+
+    def touch(capsule):
+        return capsule.scheduled_time.timestamp()  # what the scheduler heap needs
+
+    cases = [
+        ("capsule legacy", lambda n: capsule_rows(n), legacy_capsule, touch),
+        ("capsule slotted", lambda n: capsule_rows(n), Capsule.from_row, touch),
+        ("capsule slotted, due columns", lambda n: capsule_rows(n, with_message=False),
+         Capsule.from_row, touch),
+        ("user legacy", user_rows, lambda u: LegacyUser(u["id"], u["name"], u["email"]), None),
+        ("user slotted", user_rows, lambda u: User(u["id"], u["name"], u["email"]), None),
+    ]
+
+    print(f"{'rows':>8} {'model':<29} {'build ms':>9} {'+parse ms':>10} {'MiB':>8} {'B/row':>7}")
+    for size in args.sizes:
+        for label, make_rows, build, touch_fn in cases:
+            built, touched, retained = measure(lambda: make_rows(size), build, touch_fn)
+            print(f"{size:>8} {label:<29} {built * 1000:>9.1f} {touched * 1000:>10.1f} "
+                  f"{retained / 2 ** 20:>8.1f} {retained / size:>7.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+# bench/render_bench.py
+"""
+Messages rendered per second: building a MIMEMultipart/MIMEText from
+scratch for every capsule (what send_email used to do, including the
+flattening smtplib.send_message does before sending) against the cached,
+compiled template from service.email_templates.
+
+    python -m bench.render_bench --messages 20000
+"""
+import argparse
+import time
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+
+from service.email_templates import alternatives, get_template
+
+SENDER = "vault@example.com"
+
+
+def legacy(recipient, title, body):
+    msg = MIMEMultipart("alternative")
+    msg["From"] = SENDER
+    msg["To"] = recipient
+    msg["Subject"] = f"ChronoCapsule: {title}"
+    html_body, text_body = alternatives(body)
+    msg.attach(MIMEText(text_body, "plain"))
+    msg.attach(MIMEText(html_body, "html"))
+    return msg.as_bytes()
+
+
+def templated(recipient, title, body):
+    return get_template().render(SENDER, recipient, title, body).data
+
+
+def measure(render, messages, body):
+    start = time.perf_counter()
+    size = 0
+    for i in range(messages):
+        size += len(render(f"user{i}@example.com", f"Capsule {i}", body))
+    elapsed = time.perf_counter() - start
+    return messages / elapsed, size / messages
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--messages", type=int, default=20_000)
+    args = parser.parse_args()
+
+    bodies = {
+        "plain": "Dear future me,\nI hope the plan worked out.\n" * 10,
+        "html": "<p>Dear <b>future</b> me,</p><p>I hope the plan worked out.</p>" * 10,
+        "unicode": "Querido yo del futuro, ¿funcionó el plan? ⏳🎉\n" * 10,
+    }
+    print(f"{'body':<8} {'renderer':<10} {'msgs/s':>10} {'bytes/msg':>10}")
+    for name, body in bodies.items():
+        for label, render in (("legacy", legacy), ("template", templated)):
+            rate, size = measure(render, args.messages, body)
+            print(f"{name:<8} {label:<10} {rate:>10.0f} {size:>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+# bench/retry_bench.py
+"""
+What failing capsules cost the delivery runs: cron-style passes every
+``--tick`` seconds over a vault where some recipients bounce permanently
+(550) and some are throttled (451) for the first half of the run.
+
+  every-run  the old behaviour: any failure is retried on the next pass,
+             forever (emulated with zero backoff, no attempt limit and
+             every error treated as transient)
+  backoff    jittered exponential backoff from --base seconds, transient /
+             permanent classification and dead-lettering
+
+Reports RCPT attempts the SMTP server saw for bad and throttled
+addresses, and where the capsules ended up.
+
+    python -m bench.retry_bench --capsules 200 --ticks 30 --tick 0.2
+"""
+import argparse
+import contextlib
+import io
+import os
+import tempfile
+import time
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+
+from bench.fake_smtp import FakeSMTPServer
+from repository.capsule_repository import CapsuleRepository
+from repository.sqlite_client import create_client
+
+
+def recipient(i, bad, throttled):
+    if i % 100 < bad:
+        return f"nobody{i}@example.com"
+    if i % 100 < bad + throttled:
+        return f"busy{i}@example.com"
+    return f"user{i}@example.com"
+
+
+def scenario(policy_env, classify, args, workdir):
+    import send_capsules
+    from service import retry_queue
+    from service.smtp_pool import pool_from_env
+
+    os.environ.update(policy_env)
+    retry_queue.is_permanent = classify
+    client = create_client(os.path.join(workdir, f"{policy_env['RETRY_BASE_SECONDS']}.db"))
+    repo = CapsuleRepository(None, None, client=client)
+    due = (datetime.now(timezone.utc) - timedelta(seconds=1)).isoformat()
+    client.table("capsules").insert([{
+        "title": f"Capsule {i}", "message": "Hello from the past",
+        "recipient_email": recipient(i, args.bad, args.throttled),
+        "scheduled_time": due, "is_delivered": False,
+    } for i in range(args.capsules)]).execute()
+
+    replies = {"nobody": "550 5.1.1 No such user", "busy": "451 4.7.1 Try again later"}
+    with FakeSMTPServer(rcpt_replies=replies) as server:
+        os.environ["SMTP_PORT"] = str(server.port)
+        with pool_from_env() as pool, contextlib.redirect_stdout(io.StringIO()):
+            for tick in range(args.ticks):
+                if tick == args.ticks // 2:
+                    replies.pop("busy")  # the provider stops throttling
+                started = time.monotonic()
+                send_capsules.run_once(pool, repo)
+                time.sleep(max(0.0, args.tick - (time.monotonic() - started)))
+        rcpts = server.rcpts
+
+    statuses = Counter(r["status"] for r in client.table("capsules").select("status").execute().data)
+    return rcpts, statuses
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--capsules", type=int, default=200)
+    parser.add_argument("--bad", type=int, default=10, help="percent of permanently invalid recipients")
+    parser.add_argument("--throttled", type=int, default=10, help="percent of throttled recipients")
+    parser.add_argument("--ticks", type=int, default=30)
+    parser.add_argument("--tick", type=float, default=0.2, help="seconds between passes")
+    parser.add_argument("--base", type=float, default=0.2, help="backoff base seconds")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    os.environ.update({
+        "SUPABASE_URL": "http://127.0.0.1:9", "SUPABASE_KEY": "bench",
+        "EMAIL_ADDRESS": "bench@example.com", "EMAIL_PASSWORD": "secret",
+        "SMTP_HOST": "127.0.0.1", "SMTP_USE_SSL": "0",
+        "DELIVERY_JOURNAL": os.path.join(workdir, "journal.log"),
+    })
+    from service.retry_queue import is_permanent
+    scenarios = {
+        "every-run": ({"RETRY_BASE_SECONDS": "0", "RETRY_MAX_ATTEMPTS": "1000000000"}, lambda error: False),
+        "backoff": ({"RETRY_BASE_SECONDS": str(args.base), "RETRY_MAX_ATTEMPTS": "8"}, is_permanent),
+    }
+    useful = args.capsules * (100 - args.bad) // 100
+    print(f"{'policy':<10} {'rcpt attempts':>14} {'wasted':>7} {'delivered':>10} {'retry':>6} {'dead':>5}")
+    for name, (env, classify) in scenarios.items():
+        rcpts, statuses = scenario(env, classify, args, workdir)
+        print(f"{name:<10} {rcpts:>14} {rcpts - useful:>7} {statuses['delivered']:>10} "
+              f"{statuses['retry']:>6} {statuses['dead']:>5}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+# bench/smtp_pool_bench.py
+"""
+Per-message SMTP sessions vs. the shared SMTPPool, against a local fake server.
+
+    python -m bench.smtp_pool_bench --messages 500 --handshake-ms 40
+"""
+import argparse
+import smtplib
+import time
+from concurrent.futures import ThreadPoolExecutor
+from email.mime.text import MIMEText
+
+from bench.fake_smtp import FakeSMTPServer
+from service.email_templates import render_capsule
+from service.smtp_pool import SMTPPool
+
+SENDER = "bench@example.com"
+
+
+def make_message(i):
+    msg = MIMEText(f"Capsule body #{i}", "plain")
+    msg["From"] = SENDER
+    msg["To"] = f"user{i}@example.com"
+    msg["Subject"] = f"ChronoCapsule: bench {i}"
+    return msg
+
+
+def run_per_message(port, messages):
+    # What send_capsules.send_email used to do: connect + login per email.
+    for i in range(messages):
+        with smtplib.SMTP("127.0.0.1", port) as server:
+            server.login(SENDER, "secret")
+            server.send_message(make_message(i))
+
+
+def run_pooled(port, messages, size):
+    with SMTPPool(SENDER, "secret", host="127.0.0.1", port=port, use_ssl=False, size=size) as pool:
+        with ThreadPoolExecutor(max_workers=size) as executor:
+            list(executor.map(lambda i: pool.send_rendered(
+                render_capsule(SENDER, f"user{i}@example.com", f"bench {i}", f"Capsule body #{i}")), range(messages)))
+        return pool.stats()
+
+
+def measure(label, fn, server):
+    before = (server.connections, server.messages)
+    start = time.perf_counter()
+    extra = fn()
+    elapsed = time.perf_counter() - start
+    sent = server.messages - before[1]
+    print(f"{label:<22} {sent:>6} msgs  {elapsed:8.3f}s  {sent / elapsed:9.1f} msg/s  "
+          f"{server.connections - before[0]:>5} connections")
+    if extra:
+        print(f"{'':<22} pool stats: {extra}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--messages", type=int, default=300)
+    parser.add_argument("--handshake-ms", type=float, default=30.0,
+                        help="simulated TLS handshake + login cost per session")
+    parser.add_argument("--pool-size", type=int, default=2)
+    parser.add_argument("--drop-after", type=int, default=0,
+                        help="server answers 421 after N messages per session")
+    args = parser.parse_args()
+
+    with FakeSMTPServer(connect_delay=args.handshake_ms / 1000, drop_after=args.drop_after) as server:
+        measure("per-message session", lambda: run_per_message(server.port, args.messages), server)
+        measure(f"pool (size={args.pool_size})",
+                lambda: run_pooled(server.port, args.messages, args.pool_size), server)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+# bench/startup_bench.py
+"""
+Import-time budget for the CLI and worker entry points.
+
+Each entry point is imported in a fresh interpreter under
+``python -X importtime``; the report lists total import time, the slowest
+top-level imports and fails (exit 1) if an entry point goes over its
+budget or pulls in a module it should only load on demand (supabase,
+pandas, streamlit). Run it in CI to catch startup regressions:
+
+    python -m bench.startup_bench
+    python -m bench.startup_bench --runs 10 --budget-scale 1.5
+"""
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# entry point -> import budget in milliseconds (median of --runs)
+BUDGETS_MS = {
+    "deliver_worker": 45,
+    "send_capsules": 45,
+    "import_capsules": 45,
+    "archive_capsules": 45,
+    "dead_letters": 45,
+    "main": 45,
+}
+DEFERRED = ("supabase", "postgrest", "httpx", "pandas", "numpy", "streamlit")
+LINE_RE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+
+def import_profile(module):
+    """
+    [(cumulative_us, depth, name)] for one cold import of ``module``, limited
+    to the entry point's own import tree (interpreter startup and ``site``
+    are excluded). The entry point itself is the last item, at depth 0.
+    """
+    env = dict(os.environ, SUPABASE_URL="http://127.0.0.1:9", SUPABASE_KEY="bench",
+               EMAIL_ADDRESS="bench@example.com", EMAIL_PASSWORD="bench")
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            cwd=PROJECT_DIR, env=env, capture_output=True, text=True, check=True)
+    entries = []
+    for line in result.stderr.splitlines():
+        match = LINE_RE.match(line)
+        if match:
+            entries.append((int(match.group(2)), len(match.group(3)) // 2, match.group(4)))
+    # importtime prints children before their parent, so the entry point's
+    # tree starts right after the previous top-level entry.
+    start = max((i for i, e in enumerate(entries[:-1]) if e[1] == 0), default=-1) + 1
+    return entries[start:]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=5, help="slowest top-level imports to show")
+    parser.add_argument("--budget-scale", type=float, default=1.0,
+                        help="multiply every budget, e.g. on slow CI machines")
+    args = parser.parse_args()
+
+    failures = []
+    for module, budget in BUDGETS_MS.items():
+        totals = []
+        for _ in range(args.runs):
+            entries = import_profile(module)
+            totals.append(entries[-1][0] / 1000)
+        median = statistics.median(totals)
+        limit = budget * args.budget_scale
+        loaded = {name for _, _, name in entries}
+        leaked = sorted(name for name in loaded if name.split(".")[0] in DEFERRED
+                        and "." not in name)
+
+        ok = median <= limit and not leaked
+        print(f"{'✅' if ok else '❌'} {module:<16} {median:7.1f} ms (budget {limit:.0f} ms)")
+        for us, _, name in sorted((e for e in entries if e[1] == 1), reverse=True)[:args.top]:
+            print(f"      {us / 1000:7.1f} ms  {name}")
+        if median > limit:
+            failures.append(f"{module}: {median:.1f} ms > {limit:.0f} ms")
+        if leaked:
+            failures.append(f"{module}: imports {', '.join(leaked)} at startup")
+
+    if failures:
+        print("\n".join(["", "Startup regressions:"] + failures))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
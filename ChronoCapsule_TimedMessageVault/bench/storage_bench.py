@@ -0,0 +1,93 @@
+# bench/storage_bench.py
+"""
+Per-operation latency of the repositories on the SQLite backend, as a
+reproducible offline harness (fixed seed, fresh database per size):
+
+  insert         save_many in one batched transaction vs. one save() per row
+  due page       CapsuleRepository.find_due, first page
+  claim + ack    claim_due of one batch, then mark_delivered_many
+  list page      find_page("Pending") with the exact count
+  user by id     UserRepository.find_by_id (no cache)
+
+It also prints SQLite's plan for the due query, which should search
+capsules_due_idx rather than scan the table.
+
+    python -m bench.storage_bench --sizes 10000 100000
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+from model.capsule import Capsule
+from repository.capsule_repository import CapsuleRepository, new_worker_id
+from repository.sqlite_client import create_client
+from repository.user_repository import UserRepository
+
+
+def capsules(count, rng, now):
+    return [Capsule(None, f"Capsule {i}", f"Message body {i}", rng.randint(1, 1000),
+                    now + timedelta(seconds=rng.randint(-3 * 86400, 30 * 86400)),
+                    recipient_email=f"user{i % 5000}@example.com")
+            for i in range(count)]
+
+
+def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    now = datetime.now(timezone.utc)
+    print(f"{'rows':>8} {'operation':<26} {'median µs':>11}")
+    for size in args.sizes:
+        rng = random.Random(args.seed)
+        client = create_client(os.path.join(tempfile.mkdtemp(), "vault.db"))
+        repo = CapsuleRepository(None, None, client=client)
+        users = UserRepository(None, None, client=client)
+        client.table("users").insert([{"name": f"User {i}", "email": f"user{i}@example.com"}
+                                      for i in range(1000)]).execute()
+
+        rows = capsules(size, rng, now)
+        start = time.perf_counter()
+        repo.save_many(rows)
+        print(f"{size:>8} {'insert, batched (per row)':<26} {(time.perf_counter() - start) / size * 1e6:>11.1f}")
+
+        sample = capsules(min(size, 2000), rng, now)
+        start = time.perf_counter()
+        for capsule in sample:
+            repo.save(capsule)
+        print(f"{size:>8} {'insert, one by one':<26} {(time.perf_counter() - start) / len(sample) * 1e6:>11.1f}")
+
+        results = {
+            "due page (500)": timed(lambda: repo.find_due(now), args.repeat),
+            "list page (30) + count": timed(lambda: repo.find_page("Pending"), max(1, args.repeat // 10)),
+            "user by id": timed(lambda: users.find_by_id(rng.randint(1, 1000)), args.repeat),
+        }
+        worker = new_worker_id()
+        results["claim + ack (100)"] = timed(
+            lambda: repo.mark_delivered_many([c.id for c in repo.claim_due(worker, now)]), 5)
+        for name, micros in results.items():
+            print(f"{size:>8} {name:<26} {micros:>11.1f}")
+
+    plan = client.conn.execute(
+        "EXPLAIN QUERY PLAN SELECT id FROM capsules WHERE is_delivered = 0 AND scheduled_time <= ? "
+        "ORDER BY scheduled_time, id LIMIT 500", [now.isoformat()]).fetchall()
+    print("\ndue query plan: " + "; ".join(row[-1] for row in plan))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,350 @@
+# bench/suite.py
+"""
+End-to-end benchmark suite. For every vault size a synthetic vault is
+seeded with bench.loadgen (clustered schedules, Zipf creators/domains, a
+due backlog on the top-of-the-hour spike) into the SQLite stand-in for
+Supabase, and each scenario runs against a fresh copy of it in its own
+process, with bench.fake_smtp standing in for the mail provider:
+
+    deliver_capsules   CapsuleService.deliver_capsules (main.py's "Deliver")
+    send_capsules      send_capsules.main, the cron entry point, from env
+    dashboard          the Streamlit data paths: user list, "View Capsules"
+                       pages (filters, date range, deep page) and a create
+
+Reported per scenario: throughput, p50/p99 delivery lag (ack time minus
+the later of schedule and run start), peak RSS of the process, and DB
+round trips (``client.requests``). Results go to JSON; ``--compare`` diffs
+against an earlier file and flags regressions beyond ``--tolerance``.
+
+    python -m bench.suite --sizes 1000 10000 100000 --out results.json
+    python -m bench.suite --sizes 1000000 --scenarios deliver_capsules
+    python -m bench.suite --compare results.json --out new.json
+"""
+import argparse
+import contextlib
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import shutil
+import statistics
+import subprocess
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+SIZES = [1000, 10000, 100000]
+OPERATION_BUDGET_MS = 3000
+# metric -> True when higher is better
+COMPARED = {
+    "capsules_per_second": True,
+    "page_views_per_second": True,
+    "lag_p50_s": False,
+    "lag_p99_s": False,
+    "peak_rss_mib": False,
+    "round_trips": False,
+}
+
+
+# ------------------- HELPERS (run in the scenario process) -------------------
+def _due_rows(client):
+    now = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%f+00:00")
+    with client.lock:
+        rows = client.conn.execute(
+            "SELECT id, scheduled_time FROM capsules WHERE is_delivered = 0 AND scheduled_time <= ?",
+            (now,)).fetchall()
+    return {r[0]: datetime.fromisoformat(r[1]).timestamp() for r in rows}
+
+
+def _track_acks(repo):
+    """Record when each capsule id was marked delivered."""
+    acked = {}
+    original = repo.mark_delivered_many
+
+    def mark_delivered_many(ids, *args, **kwargs):
+        ids = list(ids)
+        original(ids, *args, **kwargs)
+        now = time.time()
+        for capsule_id in ids:
+            acked[capsule_id] = now
+
+    repo.mark_delivered_many = mark_delivered_many
+    return acked
+
+
+def _percentile(values, q):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))]
+
+
+def _delivery_result(due, acked, started_wall, elapsed, requests, server):
+    lags = [acked[i] - max(ts, started_wall) for i, ts in due.items() if i in acked]
+    return {
+        "due": len(due),
+        "delivered": len(acked),
+        "failed": len(due) - len(acked),
+        "seconds": round(elapsed, 3),
+        "capsules_per_second": round(len(acked) / elapsed, 1) if elapsed > 0 else 0.0,
+        "lag_p50_s": round(statistics.median(lags), 3) if lags else None,
+        "lag_p99_s": round(_percentile(lags, 0.99), 3) if lags else None,
+        "round_trips": requests,
+        "round_trips_per_capsule": round(requests / max(1, len(acked)), 3),
+        "smtp_connections": server.connections,
+        "smtp_messages": server.messages,
+    }
+
+
+# ------------------- SCENARIOS -------------------
+def scenario_deliver_capsules(path, args):
+    from bench.fake_smtp import FakeSMTPServer
+    from repository.cached_user_repository import CachedUserRepository
+    from repository.capsule_repository import CapsuleRepository
+    from repository.client_factory import get_client
+    from repository.user_repository import UserRepository
+    from service.capsule_service import CapsuleService
+    from service.smtp_pool import SMTPPool
+    from service.user_service import UserService
+
+    client = get_client()
+    capsule_repo = CapsuleRepository(None, None, client=client)
+    users = UserService(CachedUserRepository(UserRepository(None, None, client=client)))
+    due = _due_rows(client)
+    acked = _track_acks(capsule_repo)
+    with FakeSMTPServer(send_delay=args["send_delay"]) as server:
+        with SMTPPool("bench@example.com", "secret", host="127.0.0.1", port=server.port, use_ssl=False,
+                      size=args["workers"]) as pool:
+            service = CapsuleService(capsule_repo, users, pool)
+            client.requests = 0
+            started_wall, start = time.time(), time.perf_counter()
+            service.deliver_capsules()
+            elapsed = time.perf_counter() - start
+        return _delivery_result(due, acked, started_wall, elapsed, client.requests, server)
+
+
+def scenario_send_capsules(path, args):
+    from bench.fake_smtp import FakeSMTPServer
+
+    with FakeSMTPServer(send_delay=args["send_delay"]) as server:
+        os.environ.update({"SMTP_HOST": "127.0.0.1", "SMTP_PORT": str(server.port), "SMTP_USE_SSL": "0",
+                           "SMTP_POOL_SIZE": str(args["workers"]),
+                           "EMAIL_ADDRESS": "bench@example.com", "EMAIL_PASSWORD": "secret"})
+        import send_capsules
+        from repository.client_factory import get_client
+
+        client = get_client()
+        due = _due_rows(client)
+        acked = _track_acks(send_capsules.capsule_repo)
+        client.requests = 0
+        started_wall, start = time.time(), time.perf_counter()
+        send_capsules.main()
+        elapsed = time.perf_counter() - start
+        return _delivery_result(due, acked, started_wall, elapsed, client.requests, server)
+
+
+def scenario_dashboard(path, args):
+    from controller.dashboard_controller import capsule_cards, capsule_frame, ist_day_bounds
+    from model.capsule import Capsule
+    from repository.cached_user_repository import CachedUserRepository
+    from repository.capsule_repository import CapsuleRepository
+    from repository.client_factory import get_client
+    from repository.user_repository import UserRepository
+
+    client = get_client()
+    user_repo = CachedUserRepository(UserRepository(None, None, client=client))
+    capsule_repo = CapsuleRepository(None, None, client=client)
+    today = (datetime.now(timezone.utc) + timedelta(hours=5, minutes=30)).date()
+    week = ist_day_bounds(today, today + timedelta(days=6))
+
+    def view(status="All", bounds=(None, None), page=0, page_size=30):
+        data, total = capsule_repo.find_page(status, bounds[0], bounds[1], page, page_size)
+        capsule_cards(capsule_frame(data), page * page_size)
+        return total
+
+    last_page = max(0, -(-view() // 30) - 1)
+    operations = {
+        "user_list": user_repo.find_all,
+        "view_all": view,
+        "view_pending": lambda: view("Pending"),
+        "view_delivered": lambda: view("Delivered"),
+        "view_next_week": lambda: view("Pending", week),
+        "view_last_page": lambda: view(page=last_page),
+        "create_capsule": lambda: capsule_repo.save(Capsule(
+            None, "Bench", "hello", None, datetime.now(timezone.utc) + timedelta(days=1),
+            recipient_email="bench@example.com")),
+    }
+    result = {"operations": {}}
+    views = 0
+    client.requests = 0
+    started = time.perf_counter()
+    for name, operation in operations.items():
+        timings = []
+        before = client.requests
+        for _ in range(args["repeats"]):
+            start = time.perf_counter()
+            operation()
+            timings.append((time.perf_counter() - start) * 1000)
+            # Slow pages at 1M rows: a few samples are enough.
+            if len(timings) >= 3 and sum(timings) > OPERATION_BUDGET_MS:
+                break
+        views += len(timings)
+        result["operations"][name] = {
+            "runs": len(timings),
+            "p50_ms": round(statistics.median(timings), 3),
+            "max_ms": round(max(timings), 3),
+            "round_trips": round((client.requests - before) / len(timings), 2),
+        }
+    elapsed = time.perf_counter() - started
+    result.update({
+        "seconds": round(elapsed, 3),
+        "page_views_per_second": round(views / elapsed, 1),
+        "round_trips": client.requests,
+    })
+    return result
+
+
+SCENARIOS = {
+    "deliver_capsules": scenario_deliver_capsules,
+    "send_capsules": scenario_send_capsules,
+    "dashboard": scenario_dashboard,
+}
+
+
+def _run_scenario(name, path, args, conn):
+    # Fresh process: nothing cached from other scenarios, own peak RSS.
+    os.environ.update({
+        "STORAGE_BACKEND": "sqlite",
+        "SQLITE_PATH": path,
+        "DELIVERY_JOURNAL": path + ".journal",
+        "DELIVERY_WORKERS": str(args["workers"]),
+        "CHANGE_FEED": "off",
+    })
+    try:
+        with open(path + ".log", "w", encoding="utf-8") as log, contextlib.redirect_stdout(log):
+            result = SCENARIOS[name](path, args)
+        result["peak_rss_mib"] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+        conn.send(result)
+    except Exception as e:
+        conn.send({"error": f"{type(e).__name__}: {e}"})
+
+
+# ------------------- DRIVER -------------------
+def seed_vault(directory, size, args):
+    from bench.loadgen import seed
+    from repository.sqlite_client import create_client
+
+    path = os.path.join(directory, f"vault-{size}.db")
+    if not os.path.exists(path):
+        start = time.perf_counter()
+        client = create_client(path)
+        seed(client, max(10, size // 100), size, args.due, args.delivered, args.seed)
+        client.close()
+        print(f"🌱 Seeded {size} capsules in {time.perf_counter() - start:.1f}s")
+    return path
+
+
+def run_scenario(name, vault, args):
+    path = vault.replace(".db", f"-{name}.db")
+    shutil.copyfile(vault, path)
+    ctx = multiprocessing.get_context("spawn")
+    parent, child = ctx.Pipe(duplex=False)
+    options = {"workers": args.workers, "send_delay": args.send_delay, "repeats": args.repeats}
+    proc = ctx.Process(target=_run_scenario, args=(name, path, options, child))
+    proc.start()
+    result = parent.recv()
+    proc.join()
+    for suffix in ("", "-wal", "-shm", ".journal"):
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(path + suffix)
+    return result
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+def compare(old, new, tolerance):
+    """Print metric changes against an earlier results file; returns the regressions."""
+    previous = {(r["size"], r["scenario"]): r for r in old["results"]}
+    regressions = []
+    print(f"\nvs {old['meta'].get('git') or '?'} ({old['meta']['timestamp']}):")
+    for r in new["results"]:
+        before = previous.get((r["size"], r["scenario"]))
+        if before is None:
+            continue
+        for metric, higher_is_better in COMPARED.items():
+            a, b = before.get(metric), r.get(metric)
+            if not a or b is None:
+                continue
+            change = (b - a) / a
+            worse = change < -tolerance if higher_is_better else change > tolerance
+            mark = "❌" if worse else "  "
+            print(f"{mark} {r['size']:>8} {r['scenario']:<17} {metric:<22} {a:>10} -> {b:<10} {change:+.0%}")
+            if worse:
+                regressions.append((r["size"], r["scenario"], metric))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES)
+    parser.add_argument("--scenarios", nargs="+", default=list(SCENARIOS), choices=list(SCENARIOS))
+    parser.add_argument("--due", type=float, default=0.05, help="fraction of capsules due at run time")
+    parser.add_argument("--delivered", type=float, default=0.3, help="fraction already delivered")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--send-delay", type=float, default=0.0, help="fake SMTP seconds per message")
+    parser.add_argument("--repeats", type=int, default=20, help="runs per dashboard operation")
+    parser.add_argument("--seed", type=int, default=19)
+    parser.add_argument("--data-dir", help="where seeded vaults are kept (reused across runs)")
+    parser.add_argument("--out", help="write results as JSON here")
+    parser.add_argument("--compare", help="earlier results JSON to diff against")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="relative change counted as a regression")
+    args = parser.parse_args()
+
+    directory = args.data_dir or tempfile.mkdtemp(prefix="chronocapsule-bench-")
+    os.makedirs(directory, exist_ok=True)
+    report = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "git": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "args": {k: v for k, v in vars(args).items() if k not in ("out", "compare", "data_dir")},
+        },
+        "results": [],
+    }
+
+    print(f"{'size':>8} {'scenario':<17} {'seconds':>8} {'throughput':>11} {'lag p50':>8} {'lag p99':>8} "
+          f"{'peak MiB':>9} {'round trips':>12}")
+    for size in args.sizes:
+        vault = seed_vault(directory, size, args)
+        for name in args.scenarios:
+            result = {"size": size, "scenario": name, **run_scenario(name, vault, args)}
+            report["results"].append(result)
+            if "error" in result:
+                print(f"{size:>8} {name:<17} ❌ {result['error']}")
+                continue
+            throughput = result.get("capsules_per_second", result.get("page_views_per_second"))
+            print(f"{size:>8} {name:<17} {result['seconds']:>8} {throughput:>11} "
+                  f"{result.get('lag_p50_s', '-')!s:>8} {result.get('lag_p99_s', '-')!s:>8} "
+                  f"{result['peak_rss_mib']:>9} {result['round_trips']:>12}")
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"📊 Results written to {args.out}")
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            regressions = compare(json.load(f), report, args.tolerance)
+        if regressions:
+            raise SystemExit(f"❌ {len(regressions)} regression(s) beyond {args.tolerance:.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+# controller/dashboard_controller.py
+import html
+from datetime import datetime, time, timedelta, timezone
+
+IST_OFFSET = timedelta(hours=5, minutes=30)
+CARD_COLORS = ["#D6EAF8", "#D5F5E3", "#FCF3CF", "#FADBD8", "#E8DAEF", "#F5EEF8"]  # Classic soft colors
+FRAME_COLUMNS = ["id", "title", "preview", "recipient_email", "scheduled_time", "is_delivered", "attachment_count"]
+
+
+def ist_day_bounds(date_from, date_to):
+    """UTC [start, end) covering whole IST days; either side may be None."""
+    start = end = None
+    if date_from:
+        start = datetime.combine(date_from, time.min, timezone.utc) - IST_OFFSET
+    if date_to:
+        end = datetime.combine(date_to + timedelta(days=1), time.min, timezone.utc) - IST_OFFSET
+    return start, end
+
+
+def capsule_frame(rows):
+    """
+    DataFrame for one page of capsule rows, with the IST display time
+    computed for the whole column at once.
+    """
+    import pandas as pd  # deferred: only this page needs it
+
+    df = pd.DataFrame(rows, columns=FRAME_COLUMNS)
+    scheduled = pd.to_datetime(df["scheduled_time"], utc=True, errors="coerce", format="ISO8601")
+    df["scheduled_ist"] = (scheduled + IST_OFFSET).dt.strftime("%Y-%m-%d %H:%M").fillna("N/A")
+    df["attachment_count"] = pd.to_numeric(df["attachment_count"], errors="coerce").fillna(0).astype(int)
+    return df
+
+
+def capsule_cards(df, offset=0):
+    """
+    HTML card per capsule, built column-wise rather than via iterrows().
+    Shows the stored plain-text preview; the full body is never loaded here.
+    """
+    cards = []
+    columns = zip(df["title"], df["preview"], df["recipient_email"], df["scheduled_ist"], df["is_delivered"],
+                  df["attachment_count"])
+    for i, (title, preview, recipient, scheduled_str, delivered, attachments) in enumerate(columns):
+        color = CARD_COLORS[(offset + i) % len(CARD_COLORS)]
+        status = ("<span class='status-delivered'>✅ Delivered</span>" if delivered
+                  else "<span class='status-pending'>⌛ Pending</span>")
+        preview = html.escape(preview) if isinstance(preview, str) else ""
+        if attachments:
+            preview += f" <b>📎 {attachments}</b>"
+        cards.append(f"""
+            <div class="capsule-card" style="background: {color};">
+                <div class="capsule-title">🎯 {title}</div>
+                <div class="capsule-message">{preview}</div>
+                <div class="capsule-message">
+                    <b>Recipient:</b> {recipient}<br>
+                    <b>Scheduled (IST):</b> {scheduled_str}<br>
+                    <b>Status:</b> {status}
+                </div>
+            </div>
+        """)
+    return cards
@@ -0,0 +1,49 @@
+# dead_letters.py
+"""
+List capsules the retry queue gave up on, with their last error, and put
+them back in line once the cause is fixed (e.g. a mistyped address):
+
+    python dead_letters.py                  # most recent dead letters
+    python dead_letters.py --limit 100
+    python dead_letters.py --requeue 12 34  # fresh attempts for these
+"""
+import argparse
+import os
+import sys
+from repository.capsule_repository import CapsuleRepository
+from repository.client_factory import storage_backend
+
+SUPABASE_URL = os.getenv("SUPABASE_URL")
+SUPABASE_KEY = os.getenv("SUPABASE_KEY")
+
+
+def show(repo, limit):
+    rows = repo.find_dead(limit)
+    if not rows:
+        print("✅ No dead-lettered capsules.")
+        return
+    for row in rows:
+        print(f"☠️ {row['id']}: {row['title']} -> {row['recipient_email'] or 'creator'} "
+              f"(scheduled {row['scheduled_time']}, {row['attempts']} attempt(s)): {row['last_error']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="List or requeue dead-lettered capsules.")
+    parser.add_argument("--limit", type=int, default=30, help="dead letters to list (default 30)")
+    parser.add_argument("--requeue", type=int, nargs="+", metavar="ID", help="give these capsules fresh attempts")
+    args = parser.parse_args()
+
+    if storage_backend() == "supabase" and (not SUPABASE_URL or not SUPABASE_KEY):
+        print("❌ Error: Missing environment variables. Please set SUPABASE_URL, SUPABASE_KEY.")
+        sys.exit(1)
+
+    repo = CapsuleRepository(SUPABASE_URL, SUPABASE_KEY)
+    if args.requeue:
+        repo.requeue(args.requeue)
+        print(f"🔁 Requeued {len(args.requeue)} capsule(s); they go out on the next delivery run.")
+        return
+    show(repo, args.limit)
+
+
+if __name__ == "__main__":
+    main()
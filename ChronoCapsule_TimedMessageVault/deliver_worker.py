@@ -1,17 +1,23 @@
 # deliver_worker.py
 import os
 from repository.user_repository import UserRepository
+from repository.cached_user_repository import CachedUserRepository
 from repository.capsule_repository import CapsuleRepository
 from service.user_service import UserService
 from service.capsule_service import CapsuleService
+from service.smtp_pool import pool_from_env
+from service.metrics import profiling
 
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_KEY = os.getenv("SUPABASE_KEY")
 
-user_repo = UserRepository(SUPABASE_URL, SUPABASE_KEY)
+user_repo = CachedUserRepository(UserRepository(SUPABASE_URL, SUPABASE_KEY))
 cap_repo = CapsuleRepository(SUPABASE_URL, SUPABASE_KEY)
 user_service = UserService(user_repo)
-cap_service = CapsuleService(cap_repo, user_service)
+cap_service = CapsuleService(cap_repo, user_service, pool_from_env())
 
 if __name__ == '__main__':
-    cap_service.deliver_capsules()
+    with profiling():
+        cap_service.deliver_capsules()
+    if cap_service.mailer is not None:
+        cap_service.mailer.close()
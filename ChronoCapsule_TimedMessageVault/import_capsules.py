@@ -0,0 +1,47 @@
+# import_capsules.py
+"""
+Bulk-schedule capsules from a CSV (header row) or JSONL file.
+
+Each row needs title, message, recipient_email and scheduled_time (ISO 8601,
+UTC if no offset is given); creator_id is optional.
+
+    python import_capsules.py birthdays.csv
+    python import_capsules.py campaign.jsonl --chunk-size 1000 --concurrency 8
+"""
+import argparse
+import os
+import sys
+from repository.capsule_repository import CapsuleRepository
+from repository.client_factory import storage_backend
+from service.capsule_service import CapsuleService
+from service.bulk_import import read_rows, IMPORT_CHUNK_SIZE, IMPORT_CONCURRENCY
+
+SUPABASE_URL = os.getenv("SUPABASE_URL")
+SUPABASE_KEY = os.getenv("SUPABASE_KEY")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk-schedule capsules from a CSV or JSONL file.")
+    parser.add_argument("path")
+    parser.add_argument("--format", choices=["csv", "jsonl"], help="default: from the file extension")
+    parser.add_argument("--chunk-size", type=int, default=IMPORT_CHUNK_SIZE)
+    parser.add_argument("--concurrency", type=int, default=IMPORT_CONCURRENCY)
+    args = parser.parse_args()
+
+    if storage_backend() == "supabase" and (not SUPABASE_URL or not SUPABASE_KEY):
+        print("❌ Error: Missing environment variables. Please set SUPABASE_URL, SUPABASE_KEY.")
+        sys.exit(1)
+
+    service = CapsuleService(CapsuleRepository(SUPABASE_URL, SUPABASE_KEY), None)
+    report = service.create_many(
+        read_rows(args.path, args.format),
+        chunk_size=args.chunk_size,
+        concurrency=args.concurrency,
+        on_error=lambda line, message: print(f"❌ Line {line}: {message}", file=sys.stderr),
+    )
+    print(f"📦 Imported {report.inserted} capsule(s), {report.failed} row(s) rejected.")
+    sys.exit(1 if report.failed and not report.inserted else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,127 @@
+import re
 from datetime import datetime
 
+_UNLOADED = object()
+_FRACTION = re.compile(r"\.(\d+)")
+_SHORT_OFFSET = re.compile(r"(:\d\d(?:\.\d+)?[+-]\d\d)$")
+
+
+def parse_timestamp(value):
+    """
+    ``datetime.fromisoformat`` for the timestamps Supabase/PostgREST
+    returns, also on Python 3.10, whose parser rejects a ``Z`` suffix, an
+    hours-only offset and fractions of other than 3 or 6 digits.
+    """
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        pass
+    if value[-1:] in ("Z", "z"):
+        value = value[:-1] + "+00:00"
+    value = _SHORT_OFFSET.sub(r"\1:00", value)
+    match = _FRACTION.search(value)
+    if match:
+        value = value[:match.start(1)] + match.group(1)[:6].ljust(6, "0") + value[match.end(1):]
+    return datetime.fromisoformat(value)
+
+
 class Capsule:
-    def __init__(self, id, title, message, creator_id, scheduled_time, is_delivered=False):
+    """
+    A scheduled message. Slotted, so hundreds of thousands can sit in the
+    scheduler without a per-instance __dict__.
+
+    Capsules built with ``from_row`` keep the row's ISO timestamp string
+    and only parse it the first time ``scheduled_time`` is read. The result
+    stays in the row's (UTC) offset: aware datetimes compare and subtract
+    correctly regardless of zone, and UTC shares one tzinfo instead of a
+    new local-time zone object per capsule. Rows fetched without the
+    message column load the body through ``load_message(id)`` on first
+    access, i.e. at send time. ``attachment_count`` says how many stored
+    attachments go out with it.
+
+    ``attempts`` and ``next_attempt_at`` are the retry bookkeeping: a capsule
+    that failed to send is not due again before ``next_attempt_at``.
+    """
+
+    __slots__ = ("id", "title", "creator_id", "is_delivered", "recipient_email", "attempts", "attachment_count",
+                 "_scheduled_time", "_next_attempt_at", "_message", "_load_message")
+
+    def __init__(self, id, title, message, creator_id, scheduled_time, is_delivered=False, recipient_email=None):
         self.id = id
         self.title = title
-        self.message = message
+        self._message = message
         self.creator_id = creator_id
-        self.scheduled_time = scheduled_time
+        self._scheduled_time = scheduled_time
         self.is_delivered = is_delivered
+        self.recipient_email = recipient_email
+        self.attempts = 0
+        self.attachment_count = 0
+        self._next_attempt_at = None
+        self._load_message = None
+
+    @classmethod
+    def from_row(cls, row, load_message=None):
+        """Map a database row without copying or parsing anything yet."""
+        capsule = cls.__new__(cls)
+        capsule.id = row["id"]
+        capsule.title = row.get("title")
+        # NULL once bodies moved to the message store (sql/006), same as not selected.
+        message = row.get("message")
+        capsule._message = _UNLOADED if message is None else message
+        capsule.creator_id = row.get("creator_id")
+        capsule._scheduled_time = row["scheduled_time"]
+        capsule.is_delivered = row.get("is_delivered", False)
+        capsule.recipient_email = row.get("recipient_email")
+        capsule.attempts = row.get("attempts") or 0
+        capsule.attachment_count = row.get("attachment_count") or 0
+        capsule._next_attempt_at = row.get("next_attempt_at")
+        capsule._load_message = load_message
+        return capsule
+
+    @property
+    def scheduled_time(self):
+        value = self._scheduled_time
+        if isinstance(value, str):
+            value = self._scheduled_time = parse_timestamp(value)
+        return value
+
+    @scheduled_time.setter
+    def scheduled_time(self, value):
+        self._scheduled_time = value
+
+    @property
+    def next_attempt_at(self):
+        value = self._next_attempt_at
+        if isinstance(value, str):
+            value = self._next_attempt_at = parse_timestamp(value)
+        return value
+
+    @next_attempt_at.setter
+    def next_attempt_at(self, value):
+        self._next_attempt_at = value
+
+    @property
+    def due_time(self):
+        """When the capsule should next be sent: its schedule, or later while backing off."""
+        retry_at = self.next_attempt_at
+        if retry_at is not None and retry_at > self.scheduled_time:
+            return retry_at
+        return self.scheduled_time
+
+    @property
+    def message(self):
+        if self._message is _UNLOADED:
+            self._message = self._load_message(self.id) if self._load_message else None
+        return self._message
+
+    @message.setter
+    def message(self, value):
+        self._message = value
+
+    @property
+    def message_loaded(self):
+        """True when the body is in memory: set on this capsule, or read inline with a legacy row."""
+        return isinstance(self._message, str)
 
     def mark_delivered(self):
         self.is_delivered = True
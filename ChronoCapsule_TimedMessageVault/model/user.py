@@ -1,4 +1,6 @@
 class User:
+    __slots__ = ("id", "name", "email")
+
     def __init__(self, id, name, email):
         self.id = id
         self.name = name
@@ -0,0 +1,50 @@
+# repository/cached_capsule_repository.py
+import os
+
+from repository.cached_user_repository import TTLCache
+from repository.capsule_repository import LIST_PAGE_SIZE
+
+
+class CachedCapsuleRepository:
+    """
+    Wrapper around CapsuleRepository for the dashboard: list pages
+    (``find_page``, ``find_archived_page``) are served from a short-TTL
+    cache shared by every session, and simultaneous viewers of the same page
+    share one query (``TTLCache.get_or_load``). The TTL bounds how stale a
+    page can be when another process, e.g. a delivery worker, changes
+    capsules; this process's own ``save``/``save_many`` drop the cache at
+    once. Everything else goes straight to the wrapped repository.
+    """
+
+    def __init__(self, repository, ttl=None, maxsize=None):
+        self.repository = repository
+        self.cache = TTLCache(
+            maxsize=maxsize or int(os.getenv("CAPSULE_CACHE_SIZE", "256")),
+            ttl=ttl if ttl is not None else float(os.getenv("CAPSULE_CACHE_TTL", "5")),
+        )
+
+    def __getattr__(self, name):
+        return getattr(self.repository, name)
+
+    def save(self, capsule, attachments=()):
+        self.repository.save(capsule, attachments)
+        self.cache.clear()
+
+    def save_many(self, capsules):
+        self.repository.save_many(capsules)
+        self.cache.clear()
+
+    def find_page(self, status="All", start=None, end=None, page=0, page_size=LIST_PAGE_SIZE):
+        rows, total = self.cache.get_or_load(
+            ("page", status, start, end, page, page_size),
+            lambda: self.repository.find_page(status, start, end, page, page_size))
+        return list(rows), total
+
+    def find_archived_page(self, start=None, end=None, page=0, page_size=LIST_PAGE_SIZE):
+        rows, total = self.cache.get_or_load(
+            ("archived", start, end, page, page_size),
+            lambda: self.repository.find_archived_page(start, end, page, page_size))
+        return list(rows), total
+
+    def stats(self):
+        return self.cache.stats()
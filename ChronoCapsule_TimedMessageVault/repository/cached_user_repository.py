@@ -0,0 +1,161 @@
+# repository/cached_user_repository.py
+import os
+import threading
+import time
+from collections import OrderedDict
+
+_MISSING = object()
+
+
+class _Flight:
+    __slots__ = ("done", "value", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class TTLCache:
+    """
+    Bounded LRU cache whose entries also expire ``ttl`` seconds after they
+    were stored. Thread-safe; keeps hit/miss counters.
+
+    ``get_or_load`` is single-flight: when several threads miss the same key
+    at once, one of them loads it and the others wait for that result, so
+    N concurrent readers cost one backend call.
+    """
+
+    def __init__(self, maxsize=1024, ttl=60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self._flights = {}
+        # Bumped by clear(), so a load that started before it isn't stored after it.
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.coalesced = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self._data.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                del self._data[key]
+            self.misses += 1
+            return _MISSING
+
+    @property
+    def generation(self):
+        """Changes on every clear(); pass the value read before a load to ``set``."""
+        return self._generation
+
+    def set(self, key, value, generation=None):
+        """Store ``value``; with ``generation``, only if no clear() has run since it was read."""
+        with self._lock:
+            if generation is None or generation == self._generation:
+                self._store(key, value)
+
+    def _store(self, key, value):
+        # Caller holds the lock.
+        self._data[key] = (time.monotonic() + self.ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def get_or_load(self, key, load):
+        """The cached value for ``key``, else ``load()``'s, shared with every concurrent caller."""
+        value = self.get(key)
+        if value is not _MISSING:
+            return value
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                return entry[1]  # stored while we were looking
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+                generation = self._generation
+            else:
+                self.coalesced += 1
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+        try:
+            flight.value = load()
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+                if flight.error is None and generation == self._generation:
+                    self._store(key, flight.value)
+            flight.done.set()
+        return flight.value
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._generation += 1
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+                    "coalesced": self.coalesced, "size": len(self._data)}
+
+
+class CachedUserRepository:
+    """
+    Drop-in wrapper around UserRepository that answers repeated lookups
+    from memory.
+
+    ``find_all`` caches the full directory and indexes it by id and email,
+    so later ``find_by_id``/``find_by_email`` calls are served from the
+    index. Any ``save`` drops everything, since a new user changes the list.
+    Concurrent misses share one query (``TTLCache.get_or_load``).
+    """
+
+    def __init__(self, repository, ttl=None, maxsize=None):
+        self.repository = repository
+        self.cache = TTLCache(
+            maxsize=maxsize or int(os.getenv("USER_CACHE_SIZE", "1024")),
+            ttl=ttl if ttl is not None else float(os.getenv("USER_CACHE_TTL", "60")),
+        )
+
+    def save(self, user):
+        self.repository.save(user)
+        self.cache.clear()
+
+    def find_all(self):
+        return list(self.cache.get_or_load("all", self._load_all))
+
+    def _load_all(self):
+        # Read first: a save() during the query must not see its stale index written back.
+        generation = self.cache.generation
+        users = self.repository.find_all()
+        for u in users:
+            self.cache.set(("id", u.id), u, generation)
+            if u.email:
+                self.cache.set(("email", u.email.lower()), u, generation)
+        # get_or_load stores the list after these, so the index entries can't evict it.
+        return users
+
+    def find_by_id(self, user_id):
+        return self.cache.get_or_load(("id", user_id), lambda: self.repository.find_by_id(user_id))
+
+    def find_by_email(self, email):
+        return self.cache.get_or_load(("email", email.lower()), lambda: self.repository.find_by_email(email))
+
+    def stats(self):
+        return self.cache.stats()
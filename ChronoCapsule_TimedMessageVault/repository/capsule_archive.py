@@ -0,0 +1,131 @@
+# repository/capsule_archive.py
+"""
+Cold storage for delivered capsules. Once a delivered capsule is older than
+the retention window (service/archiver.py) its row moves here and out of
+``capsules``, so the due scanner, lease claims and list views only ever
+touch the small hot set: what is pending plus recent history.
+
+Two backends, picked with CAPSULE_ARCHIVE:
+
+    table   ``capsules_archive`` next to ``capsules`` (default), queried
+            like any other table on Supabase or the SQLite stand-in
+    files   gzip'd JSON-lines segments under ARCHIVE_PATH, one per
+            archived batch, off the database entirely
+
+Message bodies and attachments stay in the message store, keyed by capsule
+id, so an archived capsule can still be read and re-sent in full.
+"""
+import gzip
+import json
+import os
+import time
+
+from model.capsule import parse_timestamp
+
+# Everything needed to show or re-send an archived capsule; lease and
+# retry bookkeeping is dropped. ``message`` only holds rows written before
+# bodies moved to the message store.
+ARCHIVE_COLUMNS = "id,title,message,preview,creator_id,recipient_email,scheduled_time,delivered_at,attempts,attachment_count"
+DEFAULT_PATH = "capsule_archive"
+
+
+class TableCapsuleArchive:
+    TABLE = "capsules_archive"
+
+    def __init__(self, client):
+        self.client = client
+
+    def put_many(self, rows, archived_at):
+        """Store archived rows; re-archiving the same ids (a batch retried after a crash) is a no-op."""
+        stamp = archived_at.isoformat()
+        self.client.table(self.TABLE).upsert([dict(row, archived_at=stamp) for row in rows],
+                                             on_conflict="id", ignore_duplicates=True).execute()
+
+    def get(self, capsule_id):
+        rows = self.client.table(self.TABLE).select(ARCHIVE_COLUMNS).eq("id", capsule_id).execute().data
+        return rows[0] if rows else None
+
+    def find_page(self, start=None, end=None, page=0, page_size=30):
+        """One page of archived rows, latest schedule first, and the count of all matches."""
+        query = self.client.table(self.TABLE).select(ARCHIVE_COLUMNS, count="exact")
+        if start is not None:
+            query = query.gte("scheduled_time", start.isoformat())
+        if end is not None:
+            query = query.lt("scheduled_time", end.isoformat())
+        offset = page * page_size
+        data = query.order("scheduled_time", desc=True).order("id", desc=True) \
+            .range(offset, offset + page_size - 1).execute()
+        return data.data, data.count or 0
+
+
+class FileCapsuleArchive:
+    """
+    One gzip'd JSON-lines segment per archived batch,
+    ``<root>/<archived month>/<first id>-<last id>-<ns>.jsonl.gz``, written to
+    a temporary file and renamed into place. Looking a capsule up reads only
+    the segments whose id range covers it; listing reads them all, which is
+    fine for history nobody browses often. The directory is listed on every
+    call, so segments another process archived show up straight away.
+    """
+
+    def __init__(self, root=DEFAULT_PATH):
+        self.root = root
+
+    def put_many(self, rows, archived_at):
+        if not rows:
+            return
+        stamp = archived_at.isoformat()
+        ids = [row["id"] for row in rows]
+        directory = os.path.join(self.root, archived_at.strftime("%Y-%m"))
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"{min(ids)}-{max(ids)}-{time.time_ns()}.jsonl.gz")
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with gzip.open(tmp, "wt", encoding="utf-8") as f:
+            for row in rows:
+                f.write(json.dumps(dict(row, archived_at=stamp), default=str) + "\n")
+        os.replace(tmp, path)
+
+    def segments(self):
+        """``(first id, last id, path)`` of every segment."""
+        found = []
+        for directory, _, names in os.walk(self.root):
+            for name in names:
+                if name.endswith(".jsonl.gz"):
+                    first, last, _ = name.split("-", 2)
+                    found.append((int(first), int(last), os.path.join(directory, name)))
+        return found
+
+    @staticmethod
+    def _rows(path):
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            for line in f:
+                yield json.loads(line)
+
+    def get(self, capsule_id):
+        for first, last, path in self.segments():
+            if first <= capsule_id <= last:
+                for row in self._rows(path):
+                    if row["id"] == capsule_id:
+                        return row
+        return None
+
+    def find_page(self, start=None, end=None, page=0, page_size=30):
+        matches = {}
+        for _, _, path in self.segments():
+            for row in self._rows(path):
+                scheduled = parse_timestamp(row["scheduled_time"])
+                if (start is None or scheduled >= start) and (end is None or scheduled < end):
+                    matches[row["id"]] = (scheduled, row)  # a retried batch can leave a row twice
+        ordered = sorted(matches.values(), key=lambda m: (m[0], m[1]["id"]), reverse=True)
+        offset = page * page_size
+        return [row for _, row in ordered[offset:offset + page_size]], len(ordered)
+
+
+def capsule_archive_from_env(client):
+    """Archive configured by CAPSULE_ARCHIVE (table or files) and ARCHIVE_PATH."""
+    kind = os.getenv("CAPSULE_ARCHIVE", "table").lower()
+    if kind == "table":
+        return TableCapsuleArchive(client)
+    if kind == "files":
+        return FileCapsuleArchive(os.getenv("ARCHIVE_PATH", DEFAULT_PATH))
+    raise ValueError(f"Unknown CAPSULE_ARCHIVE {kind!r}; expected table or files")
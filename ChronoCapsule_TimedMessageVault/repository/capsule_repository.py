@@ -1,37 +1,391 @@
 # repository/capsule_repository.py
-from datetime import datetime, timezone
-from supabase import create_client, Client
+import os
+import socket
+from datetime import datetime, timedelta, timezone
 from model.capsule import Capsule
+from repository.capsule_archive import ARCHIVE_COLUMNS, capsule_archive_from_env
+from repository.client_factory import get_client
+from repository.message_store import MessageNotFound, message_preview, message_store_from_env
+
+ACK_CHUNK_SIZE = 200
+ARCHIVE_BATCH_SIZE = 1000
+DUE_PAGE_SIZE = 500
+# Enough to schedule a capsule; the message body is fetched when it is sent.
+DUE_COLUMNS = "id,title,creator_id,recipient_email,scheduled_time,is_delivered,attempts,next_attempt_at,attachment_count"
+# List views never need the lease bookkeeping, and show a preview instead of the body.
+LIST_COLUMNS = "id,title,preview,recipient_email,scheduled_time,is_delivered,attachment_count"
+LIST_PAGE_SIZE = 30
+CLAIM_BATCH_SIZE = 100
+LEASE_SECONDS = 300
+
+
+def new_worker_id():
+    import uuid
+
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+def _archived_row(row):
+    row = dict(row, is_delivered=True)
+    if row.get("message") is None:
+        row.pop("message", None)  # the body is in the message store
+    return row
+
+
+def _utcnow():
+    return datetime.now(timezone.utc)
+
+
+def _claimable(now_iso):
+    # Never claimed, or the last lease / retry backoff has run out.
+    return f'next_attempt_at.is.null,next_attempt_at.lte."{now_iso}"'
+
 
 class CapsuleRepository:
-    def __init__(self, url, key):
-        self.supabase: Client = create_client(url, key)
+    def __init__(self, url, key, client=None, messages=None, archive=None):
+        self._url = url
+        self._key = key
+        self._client = client
+        # Where message bodies and attachments live (repository.message_store).
+        self._messages = messages
+        # Where delivered capsules go after the retention window (repository.capsule_archive).
+        self._archive = archive
+        # One bound method shared by every capsule this repository hands out.
+        self._message_loader = self.load_message
 
-    def save(self, capsule: Capsule):
-        self.supabase.table("capsules").insert({
+    @property
+    def supabase(self):
+        # Resolved on first query, so building a repository costs nothing.
+        if self._client is None:
+            self._client = get_client(self._url, self._key)
+        return self._client
+
+    @property
+    def messages(self):
+        if self._messages is None:
+            self._messages = message_store_from_env(self.supabase)
+        return self._messages
+
+    @property
+    def archive(self):
+        if self._archive is None:
+            self._archive = capsule_archive_from_env(self.supabase)
+        return self._archive
+
+    def save(self, capsule: Capsule, attachments=()):
+        """
+        Insert a capsule, then store its body and ``attachments``
+        (``(filename, content_type, bytes or file object)`` triples).
+        """
+        capsule.attachment_count = len(attachments)
+        data = self.supabase.table("capsules").insert(self._to_row(capsule)).execute()
+        if data.data:
+            capsule.id = data.data[0]["id"]
+        self._store_messages([capsule], attachments)
+
+    def save_many(self, capsules):
+        """Insert capsules with one multi-row INSERT and set their ids; bodies follow in one more."""
+        if not capsules:
+            return
+        data = self.supabase.table("capsules").insert([self._to_row(c) for c in capsules]).execute()
+        for capsule, row in zip(capsules, data.data or []):
+            capsule.id = row["id"]
+        self._store_messages(capsules)
+
+    def _store_messages(self, capsules, attachments=()):
+        try:
+            self.messages.put_many([(c.id, c.message) for c in capsules])
+            for filename, content_type, source in attachments:
+                self.messages.put_attachment(capsules[0].id, filename, content_type, source)
+        except Exception:
+            # A capsule without its body must not go out; take the rows back out.
+            ids = [c.id for c in capsules]
+            self.supabase.table("capsules").delete().in_("id", ids).execute()
+            self.messages.delete(ids)
+            raise
+
+    def _to_row(self, capsule):
+        return {
             
             "title": capsule.title,
-            "message": capsule.message,
+            "preview": message_preview(capsule.message),
             "creator_id": capsule.creator_id,
+            "recipient_email": capsule.recipient_email,
             "scheduled_time": capsule.scheduled_time.isoformat(),
-            "is_delivered": capsule.is_delivered
-        }).execute()
+            "is_delivered": capsule.is_delivered,
+            "attachment_count": capsule.attachment_count
+        }
 
-    def find_all_pending(self):
-        data = self.supabase.table("capsules").select("*").eq("is_delivered", False).execute()
-        capsules = []
-        for c in data.data:
-            
-            utc_time = datetime.fromisoformat(c["scheduled_time"])
-            local_time = utc_time.astimezone() 
-            capsules.append(Capsule(
-                c["id"], c["title"], c["message"], c["creator_id"],
-                local_time,
-                c["is_delivered"]
-            ))
-        return capsules
+    def load_message(self, capsule_id):
+        """Message body of one capsule, for capsules read without it."""
+        try:
+            return self.messages.body(capsule_id).read()
+        except MessageNotFound:
+            # Written before bodies moved out of the capsules table.
+            rows = self.supabase.table("capsules").select("message").eq("id", capsule_id).execute().data
+            return rows[0]["message"] if rows else None
+
+    def message_body(self, capsule):
+        """
+        What to render a capsule's email from: its text when it is in memory,
+        else a handle on the stored body that is fetched when the email is
+        sent (service.email_templates.stream_capsule).
+        """
+        if capsule.message_loaded:
+            return capsule.message
+        return self.messages.body(capsule.id)
+
+    def message_attachments(self, capsule):
+        """The capsule's stored attachments, as a loader to call at send time (or () if it has none)."""
+        if not capsule.attachment_count:
+            return ()
+
+        def load():
+            files = self.messages.attachments(capsule.id)
+            if len(files) < capsule.attachment_count:
+                raise MessageNotFound(f"capsule {capsule.id} has {len(files)} of "
+                                      f"{capsule.attachment_count} attachments stored")
+            return files
+        return load
+
+    def find_due(self, now, limit=DUE_PAGE_SIZE, cursor=None):
+        """
+        One page of undelivered, not dead-lettered capsules scheduled at or
+        before ``now``, ordered by (scheduled_time, id). Rows carry
+        ``next_attempt_at``, so callers can hold back ones still backing off. Returns ``(capsules, next_cursor)``;
+        pass the cursor back to get the following page, it is None after
+        the last one. Keyset paging stays correct while earlier rows are
+        being marked delivered underneath it.
+        """
+        query = self.supabase.table("capsules").select(DUE_COLUMNS) \
+            .eq("is_delivered", False) \
+            .neq("status", "dead") \
+            .lte("scheduled_time", now.isoformat())
+        if cursor is not None:
+            last_time, last_id = cursor
+            query = query.or_(
+                f'scheduled_time.gt."{last_time}",'
+                f'and(scheduled_time.eq."{last_time}",id.gt.{last_id})'
+            )
+        rows = query.order("scheduled_time").order("id").limit(limit).execute().data
+
+        next_cursor = None
+        if len(rows) == limit:
+            next_cursor = (rows[-1]["scheduled_time"], rows[-1]["id"])
+        return [self._to_capsule(c) for c in rows], next_cursor
+
+    def iter_due(self, now, page_size=DUE_PAGE_SIZE):
+        """Stream every due capsule, holding at most one page in memory."""
+        cursor = None
+        while True:
+            capsules, cursor = self.find_due(now, page_size, cursor)
+            yield from capsules
+            if cursor is None:
+                return
+
+    def find_entering(self, after, until, limit=DUE_PAGE_SIZE, cursor=None):
+        """
+        One page of undelivered, not dead-lettered capsules whose schedule or
+        retry time falls in ``(after, until]``: what a look-ahead window
+        gains when it moves forward. Paged by id; returns ``(capsules,
+        next_cursor)`` like ``find_due``.
+        """
+        start, end = after.isoformat(), until.isoformat()
+        query = self.supabase.table("capsules").select(DUE_COLUMNS) \
+            .eq("is_delivered", False) \
+            .neq("status", "dead") \
+            .or_(f'and(scheduled_time.gt."{start}",scheduled_time.lte."{end}"),'
+                 f'and(next_attempt_at.gt."{start}",next_attempt_at.lte."{end}")')
+        if cursor is not None:
+            query = query.gt("id", cursor)
+        rows = query.order("id").limit(limit).execute().data
+        next_cursor = rows[-1]["id"] if len(rows) == limit else None
+        return [self._to_capsule(c) for c in rows], next_cursor
+
+    def iter_entering(self, after, until, page_size=DUE_PAGE_SIZE):
+        """Stream ``find_entering`` page by page."""
+        cursor = None
+        while True:
+            capsules, cursor = self.find_entering(after, until, page_size, cursor)
+            yield from capsules
+            if cursor is None:
+                return
+
+    def find_page(self, status="All", start=None, end=None, page=0, page_size=LIST_PAGE_SIZE):
+        """
+        One page of capsules for list views, latest schedule first, with the
+        status ("All", "Pending", "Delivered") and ``start <= scheduled_time
+        < end`` filters applied in the database. Returns ``(rows, total)``:
+        plain dict rows for tabular display and the count of all matches.
+        Archived capsules are not included; see ``find_archived_page``.
+        """
+        query = self.supabase.table("capsules").select(LIST_COLUMNS, count="exact")
+        if status == "Pending":
+            # Dead letters will not go out; they are listed by dead_letters.py.
+            query = query.eq("is_delivered", False).neq("status", "dead")
+        elif status == "Delivered":
+            query = query.eq("is_delivered", True)
+        if start is not None:
+            query = query.gte("scheduled_time", start.isoformat())
+        if end is not None:
+            query = query.lt("scheduled_time", end.isoformat())
+
+        offset = page * page_size
+        data = query.order("scheduled_time", desc=True).order("id", desc=True) \
+            .range(offset, offset + page_size - 1).execute()
+        return data.data, data.count or 0
+
+    def _to_capsule(self, c):
+        # Timestamp parsing and the message body are deferred until used.
+        return Capsule.from_row(c, self._message_loader)
+
+    def capsule_from_row(self, row):
+        """Capsule for a row that arrived some other way, e.g. from the change feed."""
+        return self._to_capsule(row)
 
     def update(self, capsule: Capsule):
+        values = {"is_delivered": capsule.is_delivered}
+        if capsule.is_delivered:
+            values["delivered_at"] = datetime.now(timezone.utc).isoformat()
+        self.supabase.table("capsules").update(values).eq("id", capsule.id).execute()
+
+    def mark_delivered_many(self, ids, chunk_size=ACK_CHUNK_SIZE):
+        """Mark capsules delivered with one UPDATE ... WHERE id IN (...) per chunk."""
+        ids = list(ids)
+        delivered_at = datetime.now(timezone.utc).isoformat()
+        for start in range(0, len(ids), chunk_size):
+            chunk = ids[start:start + chunk_size]
+            self.supabase.table("capsules").update({
+                "is_delivered": True,
+                "delivered_at": delivered_at,
+                "status": "delivered",
+                "lease_owner": None,
+                "lease_expires_at": None,
+                "next_attempt_at": None
+            }).in_("id", chunk).execute()
+
+    # ------------------- RETRIES -------------------
+    def schedule_retry(self, capsule_id, attempts, next_attempt_at, error):
+        """Release a capsule that failed to send until ``next_attempt_at``."""
+        self.supabase.table("capsules").update({
+            "status": "retry",
+            "attempts": attempts,
+            "next_attempt_at": next_attempt_at.isoformat(),
+            "last_error": error[:500],
+            "lease_owner": None,
+            "lease_expires_at": None
+        }).eq("id", capsule_id).eq("is_delivered", False).execute()
+
+    def dead_letter(self, capsule_id, attempts, error):
+        """Park a capsule that cannot be delivered; no query picks it up again."""
+        self.supabase.table("capsules").update({
+            "status": "dead",
+            "attempts": attempts,
+            "next_attempt_at": None,
+            "last_error": error[:500],
+            "lease_owner": None,
+            "lease_expires_at": None
+        }).eq("id", capsule_id).eq("is_delivered", False).execute()
+
+    def find_dead(self, limit=LIST_PAGE_SIZE):
+        """Dead-lettered capsules with their last error, most recent schedule first."""
+        return self.supabase.table("capsules").select(LIST_COLUMNS + ",attempts,last_error") \
+            .eq("status", "dead").order("scheduled_time", desc=True).limit(limit).execute().data
+
+    def requeue(self, ids):
+        """Give dead-lettered capsules a fresh set of attempts, e.g. after fixing an address."""
         self.supabase.table("capsules").update({
-            "is_delivered": capsule.is_delivered
-        }).eq("id", capsule.id).execute()
+            "status": "pending",
+            "attempts": 0,
+            "next_attempt_at": None,
+            "last_error": None
+        }).in_("id", list(ids)).eq("status", "dead").execute()
+
+    # ------------------- ARCHIVE -------------------
+    def archive_delivered(self, before, limit=ARCHIVE_BATCH_SIZE, chunk_size=ACK_CHUNK_SIZE):
+        """
+        Move up to ``limit`` capsules delivered before ``before``, oldest
+        first, from ``capsules`` to the archive: copy the rows, then delete
+        them. A crash in between leaves a row in both places, and the next
+        run copies it again harmlessly. Returns how many moved.
+        """
+        rows = self.supabase.table("capsules").select(ARCHIVE_COLUMNS) \
+            .eq("is_delivered", True) \
+            .lt("delivered_at", before.isoformat()) \
+            .order("delivered_at").order("id").limit(limit).execute().data
+        if not rows:
+            return 0
+        self.archive.put_many(rows, datetime.now(timezone.utc))
+        ids = [row["id"] for row in rows]
+        for start in range(0, len(ids), chunk_size):
+            self.supabase.table("capsules").delete() \
+                .in_("id", ids[start:start + chunk_size]).eq("is_delivered", True).execute()
+        return len(rows)
+
+    def find_archived(self, capsule_id):
+        """An archived capsule, with its body loaded from the message store on access; None if not archived."""
+        row = self.archive.get(capsule_id)
+        return self._to_capsule(_archived_row(row)) if row else None
+
+    def find_archived_page(self, start=None, end=None, page=0, page_size=LIST_PAGE_SIZE):
+        """``find_page`` for the archive: ``(rows, total)``, latest schedule first."""
+        rows, total = self.archive.find_page(start, end, page, page_size)
+        return [_archived_row(row) for row in rows], total
+
+    # ------------------- LEASES -------------------
+    def claim(self, ids, worker_id, now, lease_seconds=LEASE_SECONDS):
+        """
+        Lease the given capsules to ``worker_id``. The UPDATE re-checks that
+        each row is still undelivered, not dead and neither leased nor
+        backing off, so when several workers race for the same rows each row
+        goes to exactly one of them. The lease runs ``lease_seconds`` from
+        ``now``, so pass the time of the claim, not of some earlier start.
+        It also pushes next_attempt_at to its expiry, which is when the
+        capsule becomes claimable again if this worker dies. Returns the
+        capsules this worker actually got.
+        """
+        if not ids:
+            return []
+        now_iso = now.isoformat()
+        expires = (now + timedelta(seconds=lease_seconds)).isoformat()
+        rows = self.supabase.table("capsules").update({
+            "status": "claimed",
+            "lease_owner": worker_id,
+            "lease_expires_at": expires,
+            "next_attempt_at": expires
+        }).in_("id", list(ids)).eq("is_delivered", False).neq("status", "dead") \
+            .or_(_claimable(now_iso)).execute().data
+        rows.sort(key=lambda c: (c["scheduled_time"], c["id"]))
+        return [self._to_capsule(c) for c in rows]
+
+    def claim_due(self, worker_id, now, limit=CLAIM_BATCH_SIZE, lease_seconds=LEASE_SECONDS):
+        """Claim up to ``limit`` of the earliest due, claimable capsules."""
+        return self.claim(self._claimable_ids(now, limit), worker_id, now, lease_seconds)
+
+    def iter_claimed(self, worker_id, now, batch_size=CLAIM_BATCH_SIZE, lease_seconds=LEASE_SECONDS,
+                     clock=_utcnow):
+        """
+        Stream capsules due at ``now``, claiming them a batch at a time
+        until none are left. Each batch is leased from ``clock()`` when it is
+        claimed, so batches taken late in a long run still hold a full
+        lease. Capsules that fail to send are out of this run: they keep
+        their lease until it expires, or the retry queue pushes them back
+        by their backoff.
+        """
+        while True:
+            candidates = self._claimable_ids(now, batch_size)
+            if not candidates:
+                return
+            # Rows lost to another worker are leased now and drop out of the
+            # next candidate query, so this terminates.
+            yield from self.claim(candidates, worker_id, max(now, clock()), lease_seconds)
+
+    def _claimable_ids(self, now, limit):
+        now_iso = now.isoformat()
+        rows = self.supabase.table("capsules").select("id") \
+            .eq("is_delivered", False) \
+            .neq("status", "dead") \
+            .lte("scheduled_time", now_iso) \
+            .or_(_claimable(now_iso)) \
+            .order("scheduled_time").order("id").limit(limit).execute().data
+        return [c["id"] for c in rows]
@@ -0,0 +1,212 @@
+# repository/change_feed.py
+"""
+Row-change subscriptions on the capsules table, so a delivery worker hears
+about new, rescheduled, claimed and delivered capsules as they commit
+instead of re-reading the due window:
+
+    supabase   Supabase Realtime postgres_changes (needs sql/005)
+    sqlite     the trigger-fed change log of repository.sqlite_client
+
+A feed calls ``on_change(op, row)`` for every change ("INSERT", "UPDATE"
+or "DELETE"; DELETE rows may only carry the id), ``on_subscribed()`` each
+time it (re)subscribes -- whatever happened while it was away was not
+delivered, so the consumer should re-read once -- and ``on_lost()`` when
+the subscription drops. Callbacks run on the feed's own thread.
+"""
+import os
+import threading
+
+from repository.client_factory import get_client, storage_backend
+
+CHANGE_COLUMNS = "id,title,creator_id,recipient_email,scheduled_time,is_delivered,status,attempts,next_attempt_at"
+RETRY_SECONDS = 5
+
+
+class SupabaseChangeFeed:
+    """
+    Supabase Realtime subscription to INSERT/UPDATE/DELETE on ``table``.
+    realtime-py only ships an asyncio client, so it runs on a private event
+    loop in a daemon thread. Reconnects are done here rather than by the
+    library so that every new subscription goes through ``on_subscribed``.
+    """
+
+    def __init__(self, url, key, on_change, on_subscribed, on_lost=None, table="capsules",
+                 retry_seconds=RETRY_SECONDS):
+        self.url = url
+        self.key = key
+        self.on_change = on_change
+        self.on_subscribed = on_subscribed
+        self.on_lost = on_lost
+        self.table = table
+        self.retry_seconds = retry_seconds
+        self.connected = False
+        self._loop = None
+        self._stop = None
+        self._thread = None
+
+    def _handle(self, payload):
+        data = payload["data"]
+        op = data["type"]
+        row = data.get("old_record") if op == "DELETE" else data.get("record")
+        if row:
+            try:
+                self.on_change(op, row)
+            except Exception as e:
+                print(f"❌ Change feed handler failed: {e}")
+
+    async def _main(self):
+        import asyncio
+        from realtime import AsyncRealtimeClient, RealtimeSubscribeStates
+
+        self._loop = asyncio.get_running_loop()
+        self._stop = asyncio.Event()
+        while not self._stop.is_set():
+            broken = asyncio.Event()
+
+            def on_state(state, error):
+                if state == RealtimeSubscribeStates.SUBSCRIBED:
+                    self.connected = True
+                    self.on_subscribed()
+                else:
+                    print(f"❌ Change feed {state}: {error}")
+                    broken.set()
+
+            client = AsyncRealtimeClient(f"{self.url}/realtime/v1", self.key, auto_reconnect=False)
+            try:
+                channel = client.channel(f"chronocapsule:{self.table}")
+                channel.on_postgres_changes("*", self._handle, table=self.table, schema="public")
+                await channel.subscribe(on_state)
+                # The listener task ends when the socket closes.
+                client._listen_task.add_done_callback(lambda task: broken.set())
+                waiters = [asyncio.ensure_future(self._stop.wait()), asyncio.ensure_future(broken.wait())]
+                await asyncio.wait(waiters, return_when=asyncio.FIRST_COMPLETED)
+                for waiter in waiters:
+                    waiter.cancel()
+            except Exception as e:
+                print(f"❌ Change feed connection failed: {e}")
+            finally:
+                if self.connected:
+                    self.connected = False
+                    if self.on_lost is not None:
+                        self.on_lost()
+                try:
+                    await client.close()
+                except Exception:
+                    pass
+            if not self._stop.is_set():
+                try:
+                    await asyncio.wait_for(self._stop.wait(), self.retry_seconds)
+                except asyncio.TimeoutError:
+                    pass
+
+    def _run(self):
+        import asyncio
+
+        asyncio.run(self._main())
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="change-feed", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._loop is not None and self._stop is not None:
+            self._loop.call_soon_threadsafe(self._stop.set)
+        if self._thread is not None:
+            self._thread.join(timeout=10)
+
+
+class SQLiteChangeFeed:
+    """
+    Tails the ``capsule_changes`` log of a repository.sqlite_client database
+    by sequence number: an indexed ``seq > ?`` probe every ``poll_seconds``
+    that returns nothing while the vault is idle. Sees commits from every
+    process sharing the file. If the log was pruned past our position, the
+    missed stretch is treated like a reconnect.
+    """
+
+    def __init__(self, client, on_change, on_subscribed, on_lost=None, poll_seconds=0.1, batch=500,
+                 keep=10000):
+        self.client = client
+        self.on_change = on_change
+        self.on_subscribed = on_subscribed
+        self.on_lost = on_lost
+        self.poll_seconds = poll_seconds
+        self.batch = batch
+        self.keep = keep
+        self.connected = False
+        self._stopping = threading.Event()
+        self._thread = None
+
+    def _subscribe(self):
+        self.seq = self.client.last_change()
+        self.connected = True
+        self.on_subscribed()
+
+    def poll(self):
+        """Deliver every change committed since the last poll; returns how many."""
+        delivered = 0
+        while True:
+            changes = self.client.changes_since(self.seq, CHANGE_COLUMNS, self.batch)
+            if not changes:
+                return delivered
+            if changes[0][0] > self.seq + 1:
+                print("🔁 Change log pruned past this feed; re-reading the window.")
+                self._subscribe()
+                continue
+            for seq, op, row in changes:
+                self.seq = seq
+                try:
+                    self.on_change(op, row)
+                except Exception as e:
+                    print(f"❌ Change feed handler failed: {e}")
+            delivered += len(changes)
+            if len(changes) < self.batch:
+                return delivered
+
+    def _run(self):
+        polls = 0
+        while not self._stopping.is_set():
+            try:
+                if not self.connected:
+                    self._subscribe()
+                self.poll()
+                polls += 1
+                if polls % 1000 == 0:
+                    self.client.prune_changes(self.keep)
+            except Exception as e:
+                print(f"❌ Change feed poll failed: {e}")
+                if self.connected:
+                    self.connected = False
+                    if self.on_lost is not None:
+                        self.on_lost()
+                self._stopping.wait(RETRY_SECONDS)
+                continue
+            self._stopping.wait(self.poll_seconds)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="change-feed", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(timeout=10)
+
+
+def change_feed_from_env(on_change, on_subscribed, on_lost=None, url=None, key=None):
+    """
+    Change feed for the configured STORAGE_BACKEND, or None when the backend
+    has none or CHANGE_FEED=off. SQLite polls every CHANGE_FEED_POLL_SECONDS.
+    """
+    if os.getenv("CHANGE_FEED", "on").lower() in ("0", "off", "false", "no"):
+        return None
+    backend = storage_backend()
+    if backend == "supabase":
+        return SupabaseChangeFeed(url or os.getenv("SUPABASE_URL"), key or os.getenv("SUPABASE_KEY"),
+                                  on_change, on_subscribed, on_lost)
+    if backend == "sqlite":
+        return SQLiteChangeFeed(get_client(url, key), on_change, on_subscribed, on_lost,
+                                poll_seconds=float(os.getenv("CHANGE_FEED_POLL_SECONDS", "0.1")))
+    return None
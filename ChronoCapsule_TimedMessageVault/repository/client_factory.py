@@ -0,0 +1,81 @@
+# repository/client_factory.py
+"""
+Storage backends for the repositories. A backend is any client that
+speaks the supabase-py query builder subset the repositories use
+(``table(name)`` -> select/insert/update/delete, the eq/in_/or_/... filters,
+order/limit/range, ``execute()`` returning ``.data``/``.count``):
+
+    supabase   hosted Postgres over PostgREST (default)
+    sqlite     repository.sqlite_client, a local file (SQLITE_PATH)
+
+STORAGE_BACKEND picks one for every entry point; more can be added with
+``register_backend``.
+
+The Supabase client runs over one pooled HTTP session per process
+(``http_session``): keep-alive connections, HTTP/2 where the server offers
+it, sized by SUPABASE_POOL_SIZE and kept open SUPABASE_KEEPALIVE_SECONDS.
+"""
+import os
+import threading
+
+DEFAULT_SQLITE_PATH = "chronocapsule.db"
+
+_clients = {}
+_lock = threading.Lock()
+
+
+def http_session():
+    """An httpx client whose connection pool every PostgREST request of the process reuses."""
+    import httpx
+
+    size = int(os.getenv("SUPABASE_POOL_SIZE", "20"))
+    return httpx.Client(
+        http2=True,
+        follow_redirects=True,
+        limits=httpx.Limits(max_connections=size, max_keepalive_connections=size,
+                            keepalive_expiry=float(os.getenv("SUPABASE_KEEPALIVE_SECONDS", "60"))),
+        timeout=float(os.getenv("SUPABASE_TIMEOUT", "120")),
+    )
+
+
+def _supabase(url, key):
+    from supabase import ClientOptions, create_client
+    return create_client(url or os.getenv("SUPABASE_URL"), key or os.getenv("SUPABASE_KEY"),
+                         options=ClientOptions(httpx_client=http_session()))
+
+
+def _sqlite(url, key):
+    from repository.sqlite_client import create_client
+    return create_client(os.getenv("SQLITE_PATH", DEFAULT_SQLITE_PATH))
+
+
+BACKENDS = {"supabase": _supabase, "sqlite": _sqlite}
+
+
+def register_backend(name, factory):
+    """Make ``factory(url, key)`` available as STORAGE_BACKEND=name."""
+    BACKENDS[name] = factory
+
+
+def storage_backend():
+    return os.getenv("STORAGE_BACKEND", "supabase").lower()
+
+
+def get_client(url=None, key=None):
+    """
+    Process-wide client for the configured backend (and, for Supabase,
+    ``url``/``key``, default SUPABASE_URL / SUPABASE_KEY), built on first
+    use and shared by every repository.
+
+    The backend's library is imported here rather than at module load, so
+    entry points that never touch the database don't pay for importing it.
+    """
+    backend = storage_backend()
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown STORAGE_BACKEND {backend!r}; expected one of {', '.join(BACKENDS)}")
+    cache_key = (backend, url, key) if backend == "supabase" else (backend, os.getenv("SQLITE_PATH"))
+    with _lock:
+        client = _clients.get(cache_key)
+        if client is None:
+            client = _clients[cache_key] = BACKENDS[backend](url, key)
+        return client
@@ -0,0 +1,223 @@
+# repository/delivery_journal.py
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+
+try:
+    import fcntl
+except ImportError:  # not on Windows; one worker process per journal there
+    fcntl = None
+
+# The app directory: where the journal lives unless STATE_DIR says otherwise.
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+JOURNAL_NAME = "delivery_journal.log"
+
+
+def journal_path():
+    """
+    The configured journal file: DELIVERY_JOURNAL, relative to STATE_DIR
+    (default: the app directory), else ``delivery_journal.log`` there. It
+    never depends on the directory a process was started from, so the cron
+    run, the daemon and the Streamlit app all replay the same journal.
+    """
+    state_dir = os.getenv("STATE_DIR") or APP_DIR
+    os.makedirs(state_dir, exist_ok=True)
+    return os.path.join(state_dir, os.getenv("DELIVERY_JOURNAL") or JOURNAL_NAME)
+
+
+class DeliveryJournal:
+    """
+    Append-only local log of capsules that were emailed but whose
+    "delivered" flag may not have reached the database yet.
+
+    Every successful send is fsync'ed here before it is acknowledged, so a
+    worker that crashes between sending and the bulk update can finish the
+    acknowledgement on restart instead of emailing the capsule again.
+
+    Worker processes on one host may share the file: every read, append
+    and compaction holds an exclusive lock on ``<path>.lock``, and a
+    process whose file another one compacted (replaced) reopens it before
+    writing, so no process appends to a file that is gone.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or journal_path()
+        self._lock = threading.Lock()
+        self._lock_file = open(self.path + ".lock", "a")
+        self._file = None
+        with self._locked():
+            self._current()
+
+    @contextmanager
+    def _locked(self):
+        with self._lock:
+            if fcntl is not None:
+                fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_UN)
+
+    def _current(self):
+        """The open journal file, reopened if another process compacted it; caller holds the lock."""
+        if self._file is not None:
+            try:
+                if os.stat(self.path).st_ino == os.fstat(self._file.fileno()).st_ino:
+                    return self._file
+            except FileNotFoundError:
+                pass
+            self._file.close()
+        self._file = open(self.path, "a", encoding="utf-8")
+        self._terminate_torn_line()
+        return self._file
+
+    def _terminate_torn_line(self):
+        # A crash mid-write can leave a partial last line; start fresh after it.
+        if self._file.tell() == 0:
+            return
+        with open(self.path, "rb") as f:
+            f.seek(-1, os.SEEK_END)
+            if f.read(1) != b"\n":
+                self._file.write("\n")
+                self._file.flush()
+
+    def _append(self, entries):
+        with self._locked():
+            f = self._current()
+            for entry in entries:
+                f.write(json.dumps(entry) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def record_sent(self, capsule_id):
+        self._append([["sent", capsule_id]])
+
+    def record_acked(self, capsule_ids):
+        self._append([["acked", capsule_id] for capsule_id in capsule_ids])
+
+    def unacknowledged(self):
+        """Ids that were sent but never acknowledged, in send order."""
+        with self._locked():
+            return self._unacknowledged()
+
+    def _unacknowledged(self):
+        pending = {}
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    kind, capsule_id = json.loads(line)
+                except ValueError:
+                    continue  # torn last line from a crash mid-write
+                if kind == "sent":
+                    pending[capsule_id] = True
+                else:
+                    pending.pop(capsule_id, None)
+        return list(pending)
+
+    def compact(self):
+        """Rewrite the journal keeping only unacknowledged sends."""
+        with self._locked():
+            pending = self._unacknowledged()
+            self._file.close()
+            tmp = self.path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                for capsule_id in pending:
+                    f.write(json.dumps(["sent", capsule_id]) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, self.path)
+            self._file = open(self.path, "a", encoding="utf-8")
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+            self._lock_file.close()
+
+
+class BatchAcknowledger:
+    """
+    Collects delivered capsule ids and marks them delivered in bulk,
+    flushing when ``batch_size`` ids are buffered or ``interval`` seconds
+    have passed since the oldest one, whichever comes first.
+    """
+
+    def __init__(self, repository, journal, batch_size=200, interval=2.0, metrics=None):
+        self.repository = repository
+        self.journal = journal
+        self.batch_size = batch_size
+        self.interval = interval
+        self.metrics = metrics
+
+        self._buffer = []
+        self._oldest = None
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._closed = threading.Event()
+        self._timer = threading.Thread(target=self._flush_periodically, daemon=True)
+        self._timer.start()
+
+    def recover(self):
+        """
+        Acknowledge sends left over from a previous run. Returns the ids so
+        callers can exclude them from the due set even if the update fails.
+        """
+        pending = self.journal.unacknowledged()
+        if pending:
+            print(f"♻️ Recovering {len(pending)} sent but unacknowledged capsule(s) from the journal.")
+            with self._lock:
+                self._buffer.extend(pending)
+            self.flush()
+        self.journal.compact()
+        return set(pending)
+
+    def add(self, capsule_id):
+        self.journal.record_sent(capsule_id)
+        with self._lock:
+            self._buffer.append(capsule_id)
+            if self._oldest is None:
+                self._oldest = time.monotonic()
+            full = len(self._buffer) >= self.batch_size
+        if full:
+            self.flush()
+
+    def flush(self):
+        with self._flush_lock:
+            with self._lock:
+                ids, self._buffer, self._oldest = self._buffer, [], None
+            if not ids:
+                return
+            try:
+                with self.metrics.time("acknowledge") if self.metrics is not None else nullcontext():
+                    self.repository.mark_delivered_many(ids)
+            except Exception as e:
+                # Keep them buffered (and journaled); the next flush retries.
+                print(f"❌ Failed to acknowledge {len(ids)} capsule(s): {e}")
+                with self._lock:
+                    self._buffer[:0] = ids
+                    self._oldest = self._oldest or time.monotonic()
+                return
+            self.journal.record_acked(ids)
+            print(f"✅ Marked {len(ids)} capsule(s) as delivered.")
+
+    def _flush_periodically(self):
+        while not self._closed.wait(self.interval / 4):
+            with self._lock:
+                due = self._oldest is not None and time.monotonic() - self._oldest >= self.interval
+            if due:
+                self.flush()
+
+    def close(self):
+        self._closed.set()
+        self._timer.join()
+        self.flush()
+        self.journal.compact()
+        self.journal.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
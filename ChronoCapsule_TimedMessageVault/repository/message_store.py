@@ -0,0 +1,455 @@
+# repository/message_store.py
+"""
+Capsule message bodies and file attachments, stored compressed and apart
+from the capsules table, so the due scanner, lease claims and list views
+never carry them (list views read the short ``preview`` column instead).
+A body is read back when its capsule is sent, as decompressed text chunks
+(``MessageBody.text_chunks``) that the email renderer base64-encodes
+straight onto the SMTP connection:
+
+    table   capsule_messages / capsule_attachments through the storage
+            backend's client, Supabase or SQLite (needs sql/006)
+    files   one file per body or attachment under MESSAGE_STORE_PATH,
+            the local stand-in for an object store
+
+MESSAGE_STORE picks one. MESSAGE_CODEC picks the compression for new
+writes: zlib (default) or zstd (needs the zstandard package). Every item
+records its codec, so switching never strands old data.
+
+The table store keeps the compressed bytes base64-encoded, since
+PostgREST speaks JSON, and fetches the bodies of capsules queued for
+sending together: the first one loaded brings the others along in the
+same query, as many as fit in FETCH_BATCH_BYTES. A fetched body is held
+as that base64 text and decoded and decompressed a chunk at a time as it
+is sent. The file store streams from disk, so very large messages are
+better kept there.
+"""
+import base64
+import codecs
+import html
+import io
+import json
+import os
+import re
+import shutil
+import threading
+import time
+import zlib
+from functools import partial
+
+CHUNK_SIZE = 64 * 1024
+PREVIEW_LENGTH = 200
+MAX_ATTACHMENT_BYTES = 10 * 1024 * 1024
+# Bodies fetched per query, and unfetched handles remembered for batching.
+FETCH_BATCH = 100
+# Most (uncompressed) body bytes one batched fetch holds in memory; a
+# larger body is fetched on its own.
+FETCH_BATCH_BYTES = 4 * 1024 * 1024
+QUEUE_LIMIT = 1000
+DEFAULT_PATH = "capsule_messages"
+
+_TAG = re.compile(r"<[^>]+>")
+_SPACE = re.compile(r"\s+")
+_MISSING = object()
+
+
+class MessageNotFound(LookupError):
+    """A body or attachment isn't in the store (yet); sending is retried later."""
+
+
+def message_preview(message, limit=PREVIEW_LENGTH):
+    """Plain-text start of a message body, for list views."""
+    if not message:
+        return ""
+    text = _SPACE.sub(" ", html.unescape(_TAG.sub(" ", message))).strip()
+    if len(text) > limit:
+        text = text[:limit - 1].rstrip() + "…"
+    return text
+
+
+def content_type_of(message):
+    return "text/html" if _TAG.search(message or "") else "text/plain"
+
+
+# ------------------- CODECS -------------------
+def _zstd():
+    try:
+        import zstandard
+    except ImportError:
+        raise RuntimeError("MESSAGE_CODEC=zstd needs the zstandard package (pip install zstandard)") from None
+    return zstandard
+
+
+class _Identity:
+    def compress(self, data):
+        return data
+
+    def flush(self):
+        return b""
+
+
+def _compressor(codec):
+    if codec == "zlib":
+        return zlib.compressobj(6)
+    if codec == "zstd":
+        return _zstd().ZstdCompressor(level=3).compressobj()
+    if codec == "identity":
+        return _Identity()
+    raise ValueError(f"Unknown MESSAGE_CODEC {codec!r}; expected zlib, zstd or identity")
+
+
+def _decompressed(codec, reader, chunk_size=CHUNK_SIZE):
+    """Decompress a binary file object piecewise; no chunk is much over ``chunk_size``."""
+    if codec == "zstd":
+        yield from _zstd().ZstdDecompressor().read_to_iter(reader, read_size=chunk_size, write_size=chunk_size)
+        return
+    if codec == "identity":
+        yield from iter(partial(reader.read, chunk_size), b"")
+        return
+    if codec != "zlib":
+        raise ValueError(f"Unknown message codec {codec!r}")
+    decompressor = zlib.decompressobj()
+    for data in iter(partial(reader.read, chunk_size), b""):
+        while data:
+            out = decompressor.decompress(data, chunk_size)
+            if out:
+                yield out
+            data = decompressor.unconsumed_tail
+    tail = decompressor.flush()
+    if tail:
+        yield tail
+
+
+def _source_chunks(source):
+    """Bytes chunks of a str, bytes or (binary or text) file object."""
+    if isinstance(source, str):
+        yield source.encode("utf-8")
+    elif isinstance(source, (bytes, bytearray, memoryview)):
+        yield bytes(source)
+    else:
+        while True:
+            chunk = source.read(CHUNK_SIZE)
+            if not chunk:
+                return
+            yield chunk.encode("utf-8") if isinstance(chunk, str) else chunk
+
+
+def _pack(codec, chunks, out, limit=None):
+    """Compress ``chunks`` into ``out``; returns the uncompressed size."""
+    compressor = _compressor(codec)
+    size = 0
+    for chunk in chunks:
+        size += len(chunk)
+        if limit is not None and size > limit:
+            raise ValueError(f"attachment larger than {limit} bytes")
+        out.write(compressor.compress(chunk))
+    out.write(compressor.flush())
+    return size
+
+
+# ------------------- HANDLES -------------------
+class StoredBlob:
+    """
+    Compressed bytes in a message store, e.g. an attachment. ``load()``
+    fetches the metadata and data (from the store, possibly together with
+    others); ``chunks()`` then decompresses them piecewise, afresh on every
+    pass, so a resend never needs the whole thing in memory.
+    """
+
+    __slots__ = ("key", "filename", "content_type", "size", "codec", "_store", "_source", "_batch")
+
+    def __init__(self, store, key, filename=None, content_type=None, size=None, codec=None):
+        self._store = store
+        self.key = key
+        self.filename = filename
+        self.content_type = content_type
+        self.size = size
+        self.codec = codec
+        self._source = None  # () -> binary file object over the compressed bytes
+        self._batch = None   # set while a batched fetch that includes us is running
+
+    def load(self):
+        if self._source is None:
+            self._store._load(self)
+        if self._source is _MISSING:
+            raise MessageNotFound(f"{type(self).__name__} {self.key} is not stored")
+        return self
+
+    def chunks(self, chunk_size=CHUNK_SIZE):
+        self.load()
+        with self._source() as reader:
+            yield from _decompressed(self.codec, reader, chunk_size)
+
+
+class MessageBody(StoredBlob):
+    """One capsule's stored message body; ``key`` is the capsule id."""
+
+    __slots__ = ()
+
+    @property
+    def is_html(self):
+        return self.load().content_type == "text/html"
+
+    def text_chunks(self, chunk_size=CHUNK_SIZE):
+        decoder = codecs.getincrementaldecoder("utf-8")("replace")
+        for chunk in self.chunks(chunk_size):
+            text = decoder.decode(chunk)
+            if text:
+                yield text
+        text = decoder.decode(b"", final=True)
+        if text:
+            yield text
+
+    def read(self):
+        return "".join(self.text_chunks())
+
+
+# ------------------- TABLE STORE -------------------
+class TableMessageStore:
+    """Bodies and attachments in two tables next to ``capsules``, through the storage backend's client."""
+
+    MESSAGES = "capsule_messages"
+    ATTACHMENTS = "capsule_attachments"
+
+    def __init__(self, client, codec="zlib", fetch_batch=FETCH_BATCH, fetch_bytes=FETCH_BATCH_BYTES):
+        _compressor(codec)  # unknown codec / missing zstandard: fail now, not on the first write
+        self.client = client
+        self.codec = codec
+        self.fetch_batch = fetch_batch
+        self.fetch_bytes = fetch_bytes
+        # Bodies handed out but not loaded yet, oldest first (an ordered set).
+        self._queued = {}
+        self._lock = threading.Lock()
+
+    def _encode(self, chunks, limit=None):
+        out = io.BytesIO()
+        size = _pack(self.codec, chunks, out, limit)
+        return size, base64.b64encode(out.getvalue()).decode("ascii")
+
+    def put_many(self, messages):
+        """Store ``(capsule_id, text)`` pairs with one multi-row insert."""
+        rows = []
+        for capsule_id, text in messages:
+            size, data = self._encode(_source_chunks(text or ""))
+            rows.append({"capsule_id": capsule_id, "codec": self.codec, "content_type": content_type_of(text),
+                         "size": size, "data": data})
+        if rows:
+            self.client.table(self.MESSAGES).insert(rows).execute()
+
+    def put_attachment(self, capsule_id, filename, content_type, source):
+        size, data = self._encode(_source_chunks(source), MAX_ATTACHMENT_BYTES)
+        self.client.table(self.ATTACHMENTS).insert({
+            "capsule_id": capsule_id, "filename": filename, "content_type": content_type or "application/octet-stream",
+            "codec": self.codec, "size": size, "data": data,
+        }).execute()
+
+    def body(self, capsule_id):
+        """Handle on a capsule's body; nothing is fetched until it is loaded."""
+        body = MessageBody(self, capsule_id)
+        with self._lock:
+            self._queued[body] = None
+            if len(self._queued) > QUEUE_LIMIT:
+                del self._queued[next(iter(self._queued))]  # it will fetch on its own
+        return body
+
+    def attachments(self, capsule_id):
+        rows = self.client.table(self.ATTACHMENTS).select("id,filename,content_type,size,codec") \
+            .eq("capsule_id", capsule_id).order("id").execute().data
+        return [StoredBlob(self, row["id"], row["filename"], row["content_type"], row["size"], row["codec"])
+                for row in rows]
+
+    def delete(self, capsule_ids):
+        ids = list(capsule_ids)
+        if ids:
+            self.client.table(self.MESSAGES).delete().in_("capsule_id", ids).execute()
+            self.client.table(self.ATTACHMENTS).delete().in_("capsule_id", ids).execute()
+
+    def _load(self, blob):
+        if not isinstance(blob, MessageBody):
+            rows = self.client.table(self.ATTACHMENTS).select("data").eq("id", blob.key).execute().data
+            blob._source = _reader(rows[0]["data"]) if rows else _MISSING
+            return
+        with self._lock:
+            if blob._source is not None:
+                return
+            running = blob._batch
+            if running is None:
+                self._queued.pop(blob, None)
+                batch = [blob]
+                while self._queued and len(batch) < self.fetch_batch:
+                    other = next(iter(self._queued))
+                    del self._queued[other]
+                    batch.append(other)
+                running = threading.Event()
+                for body in batch:
+                    body._batch = running
+            else:
+                batch = None
+        if batch is None:
+            # Another sender's query is fetching ours too.
+            running.wait()
+            if blob._source is None:
+                self._load(blob)  # that query failed; try on our own
+            return
+        try:
+            self._fetch(batch)
+        finally:
+            for body in batch:
+                body._batch = None
+            running.set()
+
+    def _fetch(self, batch):
+        """
+        Load ``batch[0]`` and as many of the rest as fit in ``fetch_bytes``:
+        one query for everyone's metadata, one for the data that fits. The
+        others go back in the queue, to come along with the next load.
+        """
+        rows = self.client.table(self.MESSAGES).select("capsule_id,codec,content_type,size") \
+            .in_("capsule_id", [body.key for body in batch]).execute().data
+        found = {row["capsule_id"]: row for row in rows}
+        wanted, budget = {}, self.fetch_bytes
+        for body in batch:
+            row = found.get(body.key)
+            if row is None:
+                body._source = _MISSING
+                continue
+            body.content_type, body.size, body.codec = row["content_type"], row["size"], row["codec"]
+            if not wanted or body.size <= budget:
+                wanted[body.key] = body
+                budget -= body.size
+        if not wanted:
+            return
+        rows = self.client.table(self.MESSAGES).select("capsule_id,data") \
+            .in_("capsule_id", list(wanted)).execute().data
+        for row in rows:
+            wanted.pop(row["capsule_id"])._source = _reader(row["data"])
+        for body in wanted.values():
+            body._source = _MISSING  # deleted in between
+        left = [body for body in batch if body._source is None]
+        if left:
+            with self._lock:
+                self._queued = dict.fromkeys(left) | self._queued
+
+
+class _Base64Reader(io.RawIOBase):
+    """
+    Binary file object over base64 text, decoded one slice per ``read``, so
+    a body is never held decoded in full next to its fetched text.
+    """
+
+    def __init__(self, text):
+        self._text = text
+        self._pos = 0
+
+    def readable(self):
+        return True
+
+    def read(self, size=-1):
+        # Every 4 characters decode to 3 bytes; slices stay on that boundary.
+        step = len(self._text) if size is None or size < 0 else max(1, size // 3) * 4
+        piece = self._text[self._pos:self._pos + step]
+        self._pos += len(piece)
+        return base64.b64decode(piece)
+
+
+def _reader(data):
+    return partial(_Base64Reader, data)
+
+
+# ------------------- FILE STORE -------------------
+class FileMessageStore:
+    """
+    One file per body (``<root>/<shard>/<id>.msg``) and per attachment
+    (``<root>/<shard>/<id>.files/``): a JSON header line with the metadata,
+    then the compressed bytes. Writes go to a temporary file and are renamed
+    into place, so readers never see half a body.
+    """
+
+    def __init__(self, root=DEFAULT_PATH, codec="zlib"):
+        _compressor(codec)
+        self.root = root
+        self.codec = codec
+
+    def _dir(self, capsule_id):
+        return os.path.join(self.root, str(capsule_id)[-2:].zfill(2))
+
+    def _body_path(self, capsule_id):
+        return os.path.join(self._dir(capsule_id), f"{capsule_id}.msg")
+
+    def _files_dir(self, capsule_id):
+        return os.path.join(self._dir(capsule_id), f"{capsule_id}.files")
+
+    def _write(self, path, meta, chunks, limit=None):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp, "wb") as f:
+                f.write(json.dumps(meta).encode("utf-8") + b"\n")
+                _pack(self.codec, chunks, f, limit)
+            os.replace(tmp, path)
+        except BaseException:
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+            raise
+
+    def put_many(self, messages):
+        for capsule_id, text in messages:
+            self._write(self._body_path(capsule_id), {"codec": self.codec, "content_type": content_type_of(text)},
+                        _source_chunks(text or ""))
+
+    def put_attachment(self, capsule_id, filename, content_type, source):
+        meta = {"codec": self.codec, "filename": filename, "content_type": content_type or "application/octet-stream"}
+        name = f"{time.time_ns():020d}-{os.getpid()}"
+        self._write(os.path.join(self._files_dir(capsule_id), name), meta, _source_chunks(source),
+                    MAX_ATTACHMENT_BYTES)
+
+    def body(self, capsule_id):
+        return MessageBody(self, self._body_path(capsule_id))
+
+    def attachments(self, capsule_id):
+        directory = self._files_dir(capsule_id)
+        try:
+            names = sorted(n for n in os.listdir(directory) if not n.endswith(".tmp"))
+        except FileNotFoundError:
+            return []
+        return [StoredBlob(self, os.path.join(directory, name)) for name in names]
+
+    def delete(self, capsule_ids):
+        for capsule_id in capsule_ids:
+            try:
+                os.remove(self._body_path(capsule_id))
+            except FileNotFoundError:
+                pass
+            shutil.rmtree(self._files_dir(capsule_id), ignore_errors=True)
+
+    def _load(self, blob):
+        try:
+            with open(blob.key, "rb") as f:
+                header = f.readline()
+        except FileNotFoundError:
+            blob._source = _MISSING
+            return
+        meta = json.loads(header)
+        blob.codec, blob.content_type = meta["codec"], meta["content_type"]
+        blob.filename = meta.get("filename", blob.filename)
+        offset = len(header)
+        blob._source = partial(_open_at, blob.key, offset)
+
+
+def _open_at(path, offset):
+    f = open(path, "rb")
+    f.seek(offset)
+    return f
+
+
+def message_store_from_env(client):
+    """Message store configured by MESSAGE_STORE (table or files), MESSAGE_STORE_PATH and MESSAGE_CODEC."""
+    kind = os.getenv("MESSAGE_STORE", "table").lower()
+    codec = os.getenv("MESSAGE_CODEC", "zlib").lower()
+    if kind == "table":
+        return TableMessageStore(client, codec)
+    if kind == "files":
+        return FileMessageStore(os.getenv("MESSAGE_STORE_PATH", DEFAULT_PATH), codec)
+    raise ValueError(f"Unknown MESSAGE_STORE {kind!r}; expected table or files")
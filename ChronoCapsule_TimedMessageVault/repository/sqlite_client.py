@@ -0,0 +1,510 @@
+# repository/sqlite_client.py
+"""
+SQLite storage backend: a local database that speaks the part of the
+supabase-py query builder the repositories use, so CapsuleRepository and
+UserRepository run unchanged on a single node, at the edge, in tests or in
+the benchmarks:
+
+    STORAGE_BACKEND=sqlite SQLITE_PATH=vault.db python send_capsules.py
+
+or explicitly:
+
+    client = create_client("vault.db")
+    CapsuleRepository(None, None, client=client)
+
+Filters (eq/neq/gt/gte/lt/lte/is_/in_/or_/filter), order, limit, range,
+insert, upsert, update and delete are translated to parameterised SQL, which
+sqlite3 keeps compiled in its statement cache; update/insert return the
+affected rows like PostgREST's ``return=representation``. Multi-row
+inserts go out as batched multi-VALUES statements in one transaction.
+Every ``execute()`` counts as one round-trip in ``client.requests``.
+
+File databases run in WAL mode, so readers never block the writer and
+several worker processes can share one file. Timestamps are normalised to
+UTC ISO strings so they compare correctly as text (and use the
+(is_delivered, scheduled_time) index), and an UPDATE's WHERE clause is
+evaluated atomically, which is what the lease protocol relies on in
+Postgres as well.
+
+Triggers append every capsule insert, update and delete to a
+``capsule_changes`` log, which ``changes_since`` tails for
+repository.change_feed -- the local stand-in for Supabase Realtime.
+
+Message bodies and attachments live in ``capsule_messages`` and
+``capsule_attachments`` (repository.message_store), keyed by capsule id but
+without a foreign key: they stay put when a delivered capsule moves to
+``capsules_archive`` (repository.capsule_archive).
+"""
+import re
+import sqlite3
+import threading
+from datetime import datetime, timezone
+
+SCHEMA = """
+create table if not exists users (
+    id integer primary key autoincrement,
+    name text,
+    email text
+);
+create table if not exists capsules (
+    id integer primary key autoincrement,
+    title text,
+    message text,
+    creator_id integer,
+    recipient_email text,
+    scheduled_time text,
+    is_delivered boolean not null default 0,
+    status text not null default 'pending',
+    lease_owner text,
+    lease_expires_at text,
+    attempts integer not null default 0,
+    next_attempt_at text,
+    last_error text,
+    preview text,
+    attachment_count integer not null default 0,
+    delivered_at text
+);
+create index if not exists capsules_due_idx on capsules (is_delivered, scheduled_time, id);
+create index if not exists users_email_idx on users (email);
+
+-- Change log for repository.change_feed: one row per committed capsule
+-- change, in commit order (SQLite has a single writer), tailed by seq.
+create table if not exists capsule_changes (
+    seq integer primary key autoincrement,
+    capsule_id integer not null,
+    op text not null
+);
+create trigger if not exists capsules_notify_insert after insert on capsules begin
+    insert into capsule_changes (capsule_id, op) values (new.id, 'INSERT');
+end;
+create trigger if not exists capsules_notify_update after update on capsules begin
+    insert into capsule_changes (capsule_id, op) values (new.id, 'UPDATE');
+end;
+create trigger if not exists capsules_notify_delete after delete on capsules begin
+    insert into capsule_changes (capsule_id, op) values (old.id, 'DELETE');
+end;
+
+-- Compressed, base64-encoded bodies and attachments (repository.message_store).
+create table if not exists capsule_messages (
+    capsule_id integer primary key,
+    codec text not null,
+    content_type text not null,
+    size integer not null,
+    data text not null
+);
+create table if not exists capsule_attachments (
+    id integer primary key autoincrement,
+    capsule_id integer not null,
+    filename text not null,
+    content_type text not null,
+    codec text not null,
+    size integer not null,
+    data text not null
+);
+create index if not exists capsule_attachments_capsule_idx on capsule_attachments (capsule_id, id);
+
+-- Delivered capsules past the retention window (repository.capsule_archive).
+create table if not exists capsules_archive (
+    id integer primary key,
+    title text,
+    message text,
+    preview text,
+    creator_id integer,
+    recipient_email text,
+    scheduled_time text,
+    delivered_at text,
+    attempts integer not null default 0,
+    attachment_count integer not null default 0,
+    archived_at text
+);
+create index if not exists capsules_archive_list_idx on capsules_archive (scheduled_time, id);
+"""
+# Indexes on migrated columns, created once the migrations have run.
+INDEXES = """
+create index if not exists capsules_delivered_idx on capsules (is_delivered, delivered_at, id);
+"""
+# Bound parameters per INSERT statement; SQLite before 3.32 allows 999.
+MAX_VARIABLES = 999
+STATEMENT_CACHE_SIZE = 256
+
+# Added after the first release; databases created before get them on open.
+MIGRATIONS = {
+    "capsules": [
+        ("attempts", "integer not null default 0"),
+        ("next_attempt_at", "text"),
+        ("last_error", "text"),
+        ("preview", "text"),
+        ("attachment_count", "integer not null default 0"),
+        ("delivered_at", "text"),
+    ],
+}
+# Run once, right after the column was added to an existing database.
+BACKFILLS = {
+    ("capsules", "preview"): "UPDATE capsules SET preview = message_preview(message) WHERE message IS NOT NULL",
+    # Delivered before delivery times were recorded: the schedule is the closest we have.
+    ("capsules", "delivered_at"): "UPDATE capsules SET delivered_at = scheduled_time WHERE is_delivered",
+}
+
+TIMESTAMP_COLUMNS = {"scheduled_time", "lease_expires_at", "next_attempt_at", "delivered_at", "archived_at"}
+BOOLEAN_COLUMNS = {"is_delivered"}
+OPERATORS = {"eq": "=", "neq": "!=", "gt": ">", "gte": ">=", "lt": "<", "lte": "<="}
+_IDENT = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+
+
+def _ident(name):
+    if not _IDENT.match(name):
+        raise ValueError(f"invalid column name: {name!r}")
+    return name
+
+
+def _to_db(column, value):
+    if column in TIMESTAMP_COLUMNS and value is not None:
+        if isinstance(value, str):
+            value = datetime.fromisoformat(value)
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=timezone.utc)
+        return value.astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%f+00:00")
+    if isinstance(value, bool):
+        return int(value)
+    return value
+
+
+def _from_db(row):
+    out = dict(row)
+    for column in BOOLEAN_COLUMNS.intersection(out):
+        if out[column] is not None:
+            out[column] = bool(out[column])
+    return out
+
+
+def _split_top_level(expr):
+    parts, depth, quoted, current = [], 0, False, ""
+    for ch in expr:
+        if ch == '"':
+            quoted = not quoted
+        elif not quoted and ch == "(":
+            depth += 1
+        elif not quoted and ch == ")":
+            depth -= 1
+        elif not quoted and ch == "," and depth == 0:
+            parts.append(current)
+            current = ""
+            continue
+        current += ch
+    parts.append(current)
+    return [p.strip() for p in parts if p.strip()]
+
+
+def _unquote(value):
+    if len(value) >= 2 and value[0] == value[-1] == '"':
+        return value[1:-1]
+    return value
+
+
+class APIResponse:
+    def __init__(self, data, count=None):
+        self.data = data
+        self.count = count
+
+
+class QueryBuilder:
+    def __init__(self, client, table):
+        self.client = client
+        self.table = _ident(table)
+        self.action = "select"
+        self.columns = "*"
+        self.payload = None
+        self.on_conflict = None
+        self.count_mode = None
+        self.where = []
+        self.params = []
+        self.orders = []
+        self.by_id = False
+        self._limit = None
+        self._offset = None
+
+    # ------------------- ACTIONS -------------------
+    def select(self, columns="*", count=None):
+        self.action = "select"
+        self.columns = ",".join(_ident(c.strip()) for c in columns.split(",")) if columns != "*" else "*"
+        self.count_mode = count
+        return self
+
+    def insert(self, rows):
+        self.action = "insert"
+        self.payload = rows if isinstance(rows, list) else [rows]
+        return self
+
+    def upsert(self, rows, on_conflict="id", ignore_duplicates=False):
+        """INSERT ... ON CONFLICT: update the existing row, or keep it with ``ignore_duplicates``."""
+        self.insert(rows)
+        self.on_conflict = (_ident(on_conflict), ignore_duplicates)
+        return self
+
+    def update(self, values):
+        self.action = "update"
+        self.payload = values
+        return self
+
+    def delete(self):
+        self.action = "delete"
+        return self
+
+    # ------------------- FILTERS -------------------
+    def _condition(self, column, op, value):
+        column = _ident(column)
+        if op == "is":
+            keyword = {"null": "NULL", "true": "1", "false": "0"}[str(value).lower()]
+            return f"{column} IS {keyword}", []
+        if op == "in":
+            if isinstance(value, str):
+                value = [_unquote(v) for v in _split_top_level(value.strip("()"))]
+            if not value:
+                return "0", []
+            marks = ",".join("?" for _ in value)
+            return f"{column} IN ({marks})", [_to_db(column, v) for v in value]
+        return f"{column} {OPERATORS[op]} ?", [_to_db(column, value)]
+
+    def _add(self, sql, params):
+        self.where.append(sql)
+        self.params.extend(params)
+        return self
+
+    def eq(self, column, value):
+        self.by_id = self.by_id or column == "id"
+        return self._add(*self._condition(column, "eq", value))
+
+    def neq(self, column, value):
+        return self._add(*self._condition(column, "neq", value))
+
+    def gt(self, column, value):
+        return self._add(*self._condition(column, "gt", value))
+
+    def gte(self, column, value):
+        return self._add(*self._condition(column, "gte", value))
+
+    def lt(self, column, value):
+        return self._add(*self._condition(column, "lt", value))
+
+    def lte(self, column, value):
+        return self._add(*self._condition(column, "lte", value))
+
+    def is_(self, column, value):
+        return self._add(*self._condition(column, "is", value))
+
+    def in_(self, column, values):
+        self.by_id = self.by_id or column == "id"
+        return self._add(*self._condition(column, "in", list(values)))
+
+    def filter(self, column, op, value):
+        return self._add(*self._condition(column, op, value))
+
+    def _logic(self, expr, joiner):
+        clauses, params = [], []
+        for part in _split_top_level(expr):
+            if part.startswith(("and(", "or(")):
+                inner_joiner = " AND " if part.startswith("and(") else " OR "
+                sql, p = self._logic(part[part.index("(") + 1:-1], inner_joiner)
+            else:
+                column, op, value = part.split(".", 2)
+                value = _unquote(value)
+                if op == "eq" and column in BOOLEAN_COLUMNS:
+                    value = value == "true"
+                sql, p = self._condition(column, op, value)
+            clauses.append(f"({sql})")
+            params.extend(p)
+        return joiner.join(clauses), params
+
+    def or_(self, expr):
+        sql, params = self._logic(expr, " OR ")
+        return self._add(f"({sql})", params)
+
+    # ------------------- MODIFIERS -------------------
+    def order(self, column, desc=False):
+        self.orders.append(f"{_ident(column)} {'DESC' if desc else 'ASC'}")
+        return self
+
+    def limit(self, count):
+        self._limit = count
+        return self
+
+    def range(self, start, end):
+        self._offset = start
+        self._limit = end - start + 1
+        return self
+
+    # ------------------- EXECUTION -------------------
+    def _conflict_sql(self, columns):
+        if self.on_conflict is None:
+            return ""
+        target, ignore = self.on_conflict
+        updates = ", ".join(f"{c} = excluded.{c}" for c in columns if c != target)
+        if ignore or not updates:
+            return f" ON CONFLICT ({target}) DO NOTHING"
+        return f" ON CONFLICT ({target}) DO UPDATE SET {updates}"
+
+    def _target_sql(self):
+        # Rows picked by id -- every table's INTEGER PRIMARY KEY -- are looked
+        # up by rowid. Left to itself the planner may instead walk an index
+        # on a two-valued column (is_delivered) when statistics are missing
+        # or stale, i.e. visit every pending row to update a hundred.
+        return f"{self.table} NOT INDEXED" if self.by_id else self.table
+
+    def _where_sql(self):
+        return f" WHERE {' AND '.join(self.where)}" if self.where else ""
+
+    def _select_sql(self):
+        sql = f"SELECT {self.columns} FROM {self.table}{self._where_sql()}"
+        if self.orders:
+            sql += " ORDER BY " + ", ".join(self.orders)
+        if self._limit is not None:
+            sql += f" LIMIT {int(self._limit)}"
+            if self._offset:
+                sql += f" OFFSET {int(self._offset)}"
+        return sql
+
+    def execute(self):
+        return self.client._execute(self)
+
+
+class SQLiteClient:
+    def __init__(self, path=":memory:"):
+        self.path = path
+        self.conn = sqlite3.connect(path, check_same_thread=False, timeout=30, isolation_level=None,
+                                    cached_statements=STATEMENT_CACHE_SIZE)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA busy_timeout = 30000")
+        if path != ":memory:":
+            self.conn.execute("PRAGMA journal_mode = WAL")
+            # Durable across application crashes; only an OS crash can lose
+            # the last commits, which the delivery journal covers.
+            self.conn.execute("PRAGMA synchronous = NORMAL")
+        self.conn.executescript(SCHEMA)
+        self._migrate()
+        self.conn.executescript(INDEXES)
+        self._analyze()
+        self.lock = threading.Lock()
+        self.requests = 0
+
+    def _migrate(self):
+        for table, columns in MIGRATIONS.items():
+            existing = {row["name"] for row in self.conn.execute(f"PRAGMA table_info({table})")}
+            for name, definition in columns:
+                if name not in existing:
+                    self.conn.execute(f"ALTER TABLE {table} ADD COLUMN {name} {definition}")
+                    backfill = BACKFILLS.get((table, name))
+                    if backfill:
+                        from repository.message_store import message_preview
+
+                        self.conn.create_function("message_preview", 1, message_preview, deterministic=True)
+                        self.conn.execute(backfill)
+
+    def _analyze(self):
+        # A database without planner statistics for capsules (new, or filled
+        # by a process that never closed cleanly) gets them now; sampled, so
+        # this stays quick on a large file. PRAGMA optimize on close keeps
+        # them current from then on.
+        analysed = self.conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'sqlite_stat1'").fetchone()
+        if analysed and self.conn.execute("SELECT 1 FROM sqlite_stat1 WHERE tbl = 'capsules'").fetchone():
+            return
+        self.conn.execute("PRAGMA analysis_limit = 1000")
+        self.conn.execute("ANALYZE")
+
+    def close(self):
+        with self.lock:
+            self.conn.execute("PRAGMA optimize")
+            self.conn.close()
+
+    def table(self, name):
+        return QueryBuilder(self, name)
+
+    # ------------------- CHANGE LOG -------------------
+    def last_change(self):
+        """Sequence number of the latest capsule change (0 if none)."""
+        with self.lock:
+            return self.conn.execute("SELECT COALESCE(MAX(seq), 0) FROM capsule_changes").fetchone()[0]
+
+    def changes_since(self, seq, columns="*", limit=500):
+        """
+        Capsule changes committed after ``seq``, oldest first, as
+        ``(seq, op, row)`` with the row's current ``columns`` -- by any
+        connection or process sharing the file. Deleted capsules come back
+        as op DELETE with just their id.
+        """
+        if columns == "*":
+            selected = "c.*"
+        else:
+            selected = ",".join(f"c.{_ident(c.strip())}" for c in columns.split(","))
+        sql = (f"SELECT ch.seq AS _seq, ch.op AS _op, ch.capsule_id AS _capsule_id, {selected} "
+               f"FROM capsule_changes ch LEFT JOIN capsules c ON c.id = ch.capsule_id "
+               f"WHERE ch.seq > ? ORDER BY ch.seq LIMIT {int(limit)}")
+        with self.lock:
+            rows = self.conn.execute(sql, (seq,)).fetchall()
+        changes = []
+        for r in rows:
+            row = _from_db(r)
+            seq, op, capsule_id = row.pop("_seq"), row.pop("_op"), row.pop("_capsule_id")
+            if row.get("id") is None:
+                changes.append((seq, "DELETE", {"id": capsule_id}))
+            else:
+                changes.append((seq, op, row))
+        return changes
+
+    def prune_changes(self, keep):
+        """Drop all but the latest ``keep`` change log rows."""
+        with self.lock:
+            self.conn.execute("DELETE FROM capsule_changes WHERE seq <= "
+                              "(SELECT COALESCE(MAX(seq), 0) FROM capsule_changes) - ?", (keep,))
+
+    def _execute(self, query):
+        with self.lock:
+            self.requests += 1
+            cur = self.conn.cursor()
+            if query.action == "select":
+                rows = [_from_db(r) for r in cur.execute(query._select_sql(), query.params)]
+                count = None
+                if query.count_mode:
+                    count = cur.execute(f"SELECT COUNT(*) FROM {query.table}{query._where_sql()}",
+                                        query.params).fetchone()[0]
+                return APIResponse(rows, count)
+
+            if query.action == "insert":
+                if not query.payload:
+                    return APIResponse([])
+                columns = [_ident(c) for c in query.payload[0]]
+                placeholders = f"({','.join('?' for _ in columns)})"
+                batch = max(1, MAX_VARIABLES // len(columns))
+                cur.execute("BEGIN")
+                try:
+                    rows = []
+                    for start in range(0, len(query.payload), batch):
+                        chunk = query.payload[start:start + batch]
+                        sql = (f"INSERT INTO {query.table} ({','.join(columns)}) "
+                               f"VALUES {','.join([placeholders] * len(chunk))}{query._conflict_sql(columns)} "
+                               f"RETURNING *")
+                        params = [_to_db(c, row.get(c)) for row in chunk for c in columns]
+                        returned = [_from_db(r) for r in cur.execute(sql, params)]
+                        # RETURNING order is unspecified; rowids follow VALUES order.
+                        if returned and "id" in returned[0]:
+                            returned.sort(key=lambda r: r["id"])
+                        rows.extend(returned)
+                    cur.execute("COMMIT")
+                except Exception:
+                    cur.execute("ROLLBACK")
+                    raise
+                return APIResponse(rows)
+
+            if query.action == "update":
+                columns = [_ident(c) for c in query.payload]
+                assignments = ", ".join(f"{c} = ?" for c in columns)
+                sql = f"UPDATE {query._target_sql()} SET {assignments}{query._where_sql()} RETURNING *"
+                params = [_to_db(c, query.payload[c]) for c in columns] + query.params
+                return APIResponse([_from_db(r) for r in cur.execute(sql, params)])
+
+            sql = f"DELETE FROM {query._target_sql()}{query._where_sql()} RETURNING *"
+            return APIResponse([_from_db(r) for r in cur.execute(sql, query.params)])
+
+
+def create_client(path=":memory:"):
+    return SQLiteClient(path)
@@ -1,9 +1,17 @@
-from supabase import create_client, Client
 from model.user import User
+from repository.client_factory import get_client
 
 class UserRepository:
-    def __init__(self, url, key):
-        self.supabase: Client = create_client(url, key)
+    def __init__(self, url, key, client=None):
+        self._url = url
+        self._key = key
+        self._client = client
+
+    @property
+    def supabase(self):
+        if self._client is None:
+            self._client = get_client(self._url, self._key)
+        return self._client
 
     def save(self, user: User):
         self.supabase.table("users").insert({
@@ -19,6 +27,13 @@ class UserRepository:
             return User(u["id"], u["name"], u["email"])
         return None
 
+    def find_by_email(self, email):
+        data = self.supabase.table("users").select("*").eq("email", email).execute()
+        if data.data:
+            u = data.data[0]
+            return User(u["id"], u["name"], u["email"])
+        return None
+
     def find_all(self):
         data = self.supabase.table("users").select("*").execute()
         users = []
@@ -1,9 +1,19 @@
+import argparse
 import os
-from supabase import create_client
-from datetime import datetime, timezone
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
+import signal
+import threading
+from datetime import datetime, timezone, timedelta
+from service.smtp_pool import pool_from_env
+from service.delivery_engine import engine_from_env
+from repository.capsule_repository import CapsuleRepository, new_worker_id
+from repository.user_repository import UserRepository
+from repository.cached_user_repository import CachedUserRepository
+from repository.client_factory import storage_backend
+from repository.delivery_journal import DeliveryJournal, BatchAcknowledger
+from service.metrics import DeliveryMetrics, profiling
+from service.email_templates import stream_capsule, stream_digest
+from service.retry_queue import RetryQueue, PermanentDeliveryError
+from service.user_service import UserService
 
 # --- Load environment variables ---
 SUPABASE_URL = os.getenv("SUPABASE_URL")
@@ -11,64 +21,172 @@ SUPABASE_KEY = os.getenv("SUPABASE_KEY")
 EMAIL_ADDRESS = os.getenv("EMAIL_ADDRESS")
 EMAIL_PASSWORD = os.getenv("EMAIL_PASSWORD")
 
-if not all([SUPABASE_URL, SUPABASE_KEY, EMAIL_ADDRESS, EMAIL_PASSWORD]):
+if storage_backend() == "supabase" and not all([SUPABASE_URL, SUPABASE_KEY]) \
+        or not all([EMAIL_ADDRESS, EMAIL_PASSWORD]):
     print("❌ Error: Missing environment variables. Please set SUPABASE_URL, SUPABASE_KEY, EMAIL_ADDRESS, EMAIL_PASSWORD.")
     exit(1)
 
-# --- Initialize Supabase client ---
-supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
+# --- Repository on the configured backend (client is created on first query) ---
+capsule_repo = CapsuleRepository(SUPABASE_URL, SUPABASE_KEY)
+# Resolves capsules created without a recipient to their creator, as main.py's worker does.
+user_service = UserService(CachedUserRepository(UserRepository(SUPABASE_URL, SUPABASE_KEY)))
 
-# --- Email sending function ---
-def send_email(to_email, subject, body):
-    """Send an email using Gmail SMTP"""
-    msg = MIMEMultipart()
-    msg['From'] = EMAIL_ADDRESS
-    msg['To'] = to_email
-    msg['Subject'] = subject
-    msg.attach(MIMEText(body, 'plain'))
-
-    try:
-        with smtplib.SMTP_SSL('smtp.gmail.com', 465) as server:
-            server.login(EMAIL_ADDRESS, EMAIL_PASSWORD)
-            server.send_message(msg)
-        print(f"✅ Email sent to {to_email}")
-        return True
-    except Exception as e:
-        print(f"❌ Failed to send email to {to_email}: {e}")
-        return False
+# Set on SIGTERM/SIGINT: engines stop taking new capsules and the daemon exits.
+shutdown = threading.Event()
 
 # --- Capsule delivery logic ---
-def main():
+def deliver_claimed(capsules, pool, repo=None, on_retry=(), users=None):
+    """
+    Deliver already-claimed capsules over the pool and acknowledge them in
+    bulk; failed ones go to the retry queue (``on_retry`` hooks are called
+    with each capsule that will be retried).
+    """
+    repo = repo or capsule_repo
+    metrics = DeliveryMetrics()
+    pool.metrics = metrics
+    retries = RetryQueue(repo, metrics=metrics, on_retry=on_retry)
+    with BatchAcknowledger(repo, DeliveryJournal(), metrics=metrics) as acks:
+        # Sent before a crash but never marked delivered: don't email again.
+        recovered = acks.recover()
+        stream = (c for c in metrics.timed_iter("fetch", capsules) if c.id not in recovered)
+        summary = deliver(stream, pool, acks, metrics, retries, repo, users)
+
+    if summary["sent"] or summary["failed"]:
+        stats = pool.stats()
+        print(f"📈 Delivered {summary['sent']} capsule(s), {summary['failed']} failed "
+              f"({retries.retried} to retry, {retries.dead_lettered} dead-lettered), "
+              f"{summary['skipped']} skipped in {summary['seconds']}s ({summary['capsules_per_second']} capsules/s).")
+        print(f"📈 SMTP: {stats['messages_per_second']} msg/s over {stats['connects']} connection(s).")
+        metrics.report()
+    return summary
+
+def run_once(pool, repo=None):
+    """One cron-style pass: claim and deliver everything that is due now."""
+    repo = repo or capsule_repo
     now_utc = datetime.now(timezone.utc)
     now_ist = now_utc + timedelta(hours=5, minutes=30)
 
     print(f"Checking for capsules to send at (IST): {now_ist}")
 
-    # Convert IST back to UTC for comparison with stored UTC time
-    now_iso = now_ist.astimezone(timezone.utc).isoformat()
-
-    response = supabase.table("capsules").select("*").filter("is_delivered", "eq", False).filter("scheduled_time", "lte", now_iso).execute()
-    capsules = response.data
-
-    if not capsules:
+    # Claimed a batch at a time, so overlapping runs never send the same capsule.
+    summary = deliver_claimed(repo.iter_claimed(new_worker_id(), now_utc), pool, repo)
+    if not summary["sent"] and not summary["failed"]:
         print("No capsules to send.")
-        return
+    return summary
 
-    for capsule in capsules:
-        recipient = capsule.get("recipient_email")
-        if not recipient:
-            print(f"Skipping capsule {capsule['id']}: No recipient email.")
-            continue
-
-        title = capsule.get("title", "No Subject")
-        message = capsule.get("message", "")
+def main():
+    with pool_from_env() as pool:
+        run_once(pool)
+
+def run_daemon(health_port, refresh_seconds):
+    """
+    Long-running mode: the Supabase client, SMTP pool and scheduler heap stay
+    warm between deliveries, and the change feed keeps the heap current so a
+    capsule created for "in two minutes" goes out on time without polling.
+    SIGTERM/SIGINT drain in-flight sends and exit, SIGHUP re-reads the due
+    window from the database.
+    """
+    # Only the daemon needs these; one-shot cron runs skip importing them.
+    from service.scheduler import CapsuleScheduler
+    from service.health_server import HealthServer
+    from repository.change_feed import change_feed_from_env
+
+    pool = pool_from_env()
+    worker_id = new_worker_id()
+    state = {"worker_id": worker_id, "last_run": None}
+
+    def deliver_due(due):
+        claimed = capsule_repo.claim([c.id for c in due], worker_id, datetime.now(timezone.utc))
+        # Retried capsules go straight back on the heap at their backoff time.
+        state["last_run"] = deliver_claimed(claimed, pool, on_retry=(scheduler.add,))
+
+    # Without --refresh the scheduler reads SCHEDULER_LOOKAHEAD itself, like every other entry point.
+    scheduler = CapsuleScheduler(capsule_repo, deliver_due,
+                                 lookahead=timedelta(seconds=refresh_seconds) if refresh_seconds else None)
+    # New and rescheduled capsules reach the heap as they commit, from any process.
+    feed = change_feed_from_env(scheduler.apply_change, scheduler.reconcile, scheduler.feed_lost,
+                                SUPABASE_URL, SUPABASE_KEY)
+    health = HealthServer(
+        health_port,
+        alive=scheduler.is_alive,
+        ready=lambda: scheduler.last_refresh is not None,
+        status=lambda: {**state, "scheduled": len(scheduler), "last_refresh": scheduler.last_refresh,
+                        "change_feed": scheduler.live, "changes": scheduler.changes,
+                        "smtp": pool.stats()},
+    )
+
+    signal.signal(signal.SIGINT, lambda signum, frame: shutdown.set())
+    signal.signal(signal.SIGHUP, lambda signum, frame: scheduler.reload())
+
+    health.start()
+    scheduler.start()
+    if feed is not None:
+        feed.start()
+    print(f"⏳ Delivery daemon {worker_id} running; health on :{health_port}/healthz")
+    try:
+        while not shutdown.wait(1):
+            pass
+    finally:
+        print("🛑 Shutting down: draining in-flight deliveries.")
+        if feed is not None:
+            feed.stop()
+        scheduler.stop()
+        health.stop()
+        pool.close()
+
+def deliver(capsules, pool, acks, metrics, retries, repo=None, users=None):
+    repo = repo or capsule_repo
+    users = users or user_service
+
+    def recipient(capsule):
+        address = users.recipient_of(capsule)
+        if not address:
+            raise PermanentDeliveryError("no recipient email")
+        return address
+
+    def render(capsule):
+        # Runs on the feeding thread, ahead of the SMTP workers; the body
+        # itself is read from the message store as the email is sent.
+        return stream_capsule(EMAIL_ADDRESS, recipient(capsule), capsule.title,
+                              repo.message_body(capsule), repo.message_attachments(capsule))
+
+    def digest(capsules):
+        # Only ever called with capsules for one (known) recipient.
+        return stream_digest(EMAIL_ADDRESS, recipient(capsules[0]),
+                             [(c.title, repo.message_body(c), repo.message_attachments(c)) for c in capsules])
+
+    def send(capsule, email):
+        # Errors propagate to the engine, which hands them to the retry queue.
+        pool.send_rendered(email)
+        print(f"✅ Email sent to {email.recipient}")
+        return True
 
-        sent = send_email(recipient, f"ChronoCapsule: {title}", message)
+    def acknowledge(capsule):
+        # Journal first: nothing after this may get a sent capsule emailed again.
+        acks.add(capsule.id)
+        try:
+            metrics.observe_lag(capsule.scheduled_time)
+        except Exception as e:
+            print(f"⚠️ Could not record delivery lag of capsule {capsule.id}: {e}")
 
-        if sent:
-            supabase.table("capsules").update({"is_delivered": True}).eq("id", capsule["id"]).execute()
-            print(f"✅ Marked capsule {capsule['id']} as delivered.")
+    # Shares the shutdown flag: a SIGTERM lets in-flight sends finish instead of dying mid-batch.
+    engine = engine_from_env(send, acknowledge, lambda c: c.recipient_email, metrics, shutdown, render,
+                             retries.fail, render_digest=digest)
+    return engine.run(capsules)
 
 if __name__ == "__main__":
-    main()
-
+    parser = argparse.ArgumentParser(description="Send due ChronoCapsule emails.")
+    parser.add_argument("--daemon", action="store_true",
+                        help="keep running and deliver each capsule as it falls due (default: one pass, for cron)")
+    parser.add_argument("--health-port", type=int, default=int(os.getenv("HEALTH_PORT", "8080")))
+    parser.add_argument("--refresh", type=int,
+                        help="seconds between reloads of the due window in daemon mode "
+                             "(default: SCHEDULER_LOOKAHEAD, else 600)")
+    args = parser.parse_args()
+
+    signal.signal(signal.SIGTERM, lambda signum, frame: shutdown.set())
+    with profiling():
+        if args.daemon:
+            run_daemon(args.health_port, args.refresh)
+        else:
+            main()
@@ -0,0 +1,54 @@
+# service/archiver.py
+import os
+import time
+from datetime import datetime, timedelta, timezone
+
+from repository.capsule_repository import ARCHIVE_BATCH_SIZE
+
+
+class ArchiveReport:
+    def __init__(self, cutoff):
+        self.cutoff = cutoff
+        self.archived = 0
+        self.batches = 0
+        self.seconds = 0.0
+
+
+class Archiver:
+    """
+    Moves capsules delivered more than ``retention`` ago out of the hot
+    ``capsules`` table, ``batch_size`` rows per step with ``pause`` seconds
+    between steps, so a large backlog drains without holding locks or
+    starving the delivery workers that share the database.
+    """
+
+    def __init__(self, repository, retention=timedelta(days=30), batch_size=ARCHIVE_BATCH_SIZE, pause=0.0):
+        self.repository = repository
+        self.retention = retention
+        self.batch_size = batch_size
+        self.pause = pause
+
+    def run(self, now=None, max_batches=None):
+        """Archive until nothing is left past the window (or ``max_batches`` steps); returns an ArchiveReport."""
+        report = ArchiveReport((now or datetime.now(timezone.utc)) - self.retention)
+        started = time.perf_counter()
+        while max_batches is None or report.batches < max_batches:
+            moved = self.repository.archive_delivered(report.cutoff, self.batch_size)
+            if moved:
+                report.batches += 1
+                report.archived += moved
+            if moved < self.batch_size:
+                break
+            if self.pause:
+                time.sleep(self.pause)
+        report.seconds = time.perf_counter() - started
+        return report
+
+
+def archiver_from_env(repository):
+    return Archiver(
+        repository,
+        retention=timedelta(days=float(os.getenv("ARCHIVE_RETENTION_DAYS", "30"))),
+        batch_size=int(os.getenv("ARCHIVE_BATCH_SIZE", str(ARCHIVE_BATCH_SIZE))),
+        pause=float(os.getenv("ARCHIVE_PAUSE_SECONDS", "0")),
+    )
@@ -0,0 +1,92 @@
+# service/bulk_import.py
+import csv
+import json
+import re
+from datetime import datetime, timezone
+from model.capsule import Capsule
+
+EMAIL_RE = re.compile(r"^[^@\s]+@[^@\s]+\.[^@\s]+$")
+MAX_TITLE_LENGTH = 200
+MAX_MESSAGE_BYTES = 256 * 1024
+IMPORT_CHUNK_SIZE = 500
+IMPORT_CONCURRENCY = 4
+
+
+class RowError(ValueError):
+    pass
+
+
+def read_rows(path, fmt=None):
+    """
+    Stream ``(line_number, dict)`` pairs from a CSV (with a header row) or
+    JSONL file without loading it. Unparseable JSON lines are yielded as
+    RowError instances so they can be reported like any other bad row.
+    """
+    fmt = fmt or ("jsonl" if path.endswith((".jsonl", ".ndjson")) else "csv")
+    with open(path, newline="", encoding="utf-8") as f:
+        if fmt == "csv":
+            reader = csv.DictReader(f)
+            for row in reader:
+                # line_num counts physical lines, so quoted newlines stay accurate.
+                yield reader.line_num, row
+            return
+        for line_number, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            try:
+                yield line_number, json.loads(line)
+            except ValueError as e:
+                yield line_number, RowError(f"invalid JSON: {e}")
+
+
+def parse_row(row, now=None):
+    """Validate one import row and turn it into a Capsule, or raise RowError."""
+    if isinstance(row, RowError):
+        raise row
+    if not isinstance(row, dict):
+        raise RowError("expected an object with capsule fields")
+    now = now or datetime.now(timezone.utc)
+
+    title = (row.get("title") or "").strip()
+    message = row.get("message") or ""
+    recipient = (row.get("recipient_email") or "").strip()
+    scheduled = (row.get("scheduled_time") or "").strip()
+
+    if not title or not message or not recipient or not scheduled:
+        raise RowError("title, message, recipient_email and scheduled_time are required")
+    if not EMAIL_RE.match(recipient):
+        raise RowError(f"invalid recipient_email {recipient!r}")
+    if len(title) > MAX_TITLE_LENGTH:
+        raise RowError(f"title longer than {MAX_TITLE_LENGTH} characters")
+    if len(message.encode("utf-8")) > MAX_MESSAGE_BYTES:
+        raise RowError(f"message larger than {MAX_MESSAGE_BYTES} bytes")
+
+    try:
+        scheduled_time = datetime.fromisoformat(scheduled.replace("Z", "+00:00"))
+    except ValueError:
+        raise RowError(f"invalid scheduled_time {scheduled!r}")
+    if scheduled_time.tzinfo is None:
+        scheduled_time = scheduled_time.replace(tzinfo=timezone.utc)
+    if scheduled_time <= now:
+        raise RowError("scheduled_time is not in the future")
+
+    return Capsule(None, title, message, row.get("creator_id") or None, scheduled_time,
+                   recipient_email=recipient)
+
+
+class ImportReport:
+    """Counts for an import, plus the first ``max_errors`` row errors."""
+
+    def __init__(self, max_errors=1000):
+        self.inserted = 0
+        self.failed = 0
+        self.errors = []
+        self.max_errors = max_errors
+
+    def error(self, line_number, message):
+        self.failed += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append((line_number, message))
+
+    def __repr__(self):
+        return f"ImportReport(inserted={self.inserted}, failed={self.failed})"
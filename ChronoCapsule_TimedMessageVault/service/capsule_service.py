@@ -1,26 +1,163 @@
-from datetime import datetime
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from service.delivery_engine import engine_from_env
+from service.metrics import DeliveryMetrics
+from service.email_templates import stream_capsule, stream_digest
+from service.retry_queue import RetryQueue, PermanentDeliveryError
+from service.bulk_import import parse_row, RowError, ImportReport, IMPORT_CHUNK_SIZE, IMPORT_CONCURRENCY
+from repository.delivery_journal import DeliveryJournal, BatchAcknowledger
+from repository.capsule_repository import new_worker_id
 
 class CapsuleService:
-    def __init__(self, capsule_repo, user_service):
+    def __init__(self, capsule_repo, user_service, mailer=None, worker_id=None, journal_path=None):
         self.repository = capsule_repo
         self.user_service = user_service
+        # Optional SMTPPool; without one, delivery only logs the message.
+        self.mailer = mailer
+        # Lease owner name; lets several workers split the due set safely.
+        self.worker_id = worker_id or new_worker_id()
+        # Delivery journal (default: delivery_journal.journal_path()); safe to share between worker processes.
+        self.journal_path = journal_path
+        # Called with each newly created capsule, e.g. CapsuleScheduler.add.
+        self.on_create = []
+        # Called with each capsule put back for a retry, with its new next_attempt_at.
+        self.on_retry = []
+        # The scheduler thread and a manual run must not share the journal at once.
+        self._deliver_lock = threading.Lock()
 
-    def create_capsule(self, capsule):
-        self.repository.save(capsule)
+    def create_capsule(self, capsule, attachments=()):
+        self.repository.save(capsule, attachments)
+        for hook in self.on_create:
+            hook(capsule)
+
+    def create_many(self, rows, chunk_size=IMPORT_CHUNK_SIZE, concurrency=IMPORT_CONCURRENCY, on_error=None):
+        """
+        Validate and insert ``(line_number, row)`` pairs, e.g. from
+        bulk_import.read_rows, as chunked multi-row inserts with at most
+        ``concurrency`` chunks in flight, so memory stays flat for any input
+        size. Bad rows are reported (and passed to ``on_error``) without
+        stopping the import. Returns an ImportReport.
+        """
+        report = ImportReport()
+        lock = threading.Lock()
+        in_flight = threading.BoundedSemaphore(concurrency)
+        now = datetime.now(timezone.utc)
+
+        def fail(line_number, message):
+            with lock:
+                report.error(line_number, message)
+            if on_error is not None:
+                on_error(line_number, message)
+
+        def insert(chunk):
+            try:
+                try:
+                    self.repository.save_many([capsule for _, capsule in chunk])
+                    inserted = chunk
+                except Exception:
+                    # Isolate the offending rows instead of losing the whole chunk.
+                    inserted = []
+                    for line_number, capsule in chunk:
+                        try:
+                            self.repository.save(capsule)
+                            inserted.append((line_number, capsule))
+                        except Exception as e:
+                            fail(line_number, f"insert failed: {e}")
+                with lock:
+                    report.inserted += len(inserted)
+                for _, capsule in inserted:
+                    for hook in self.on_create:
+                        hook(capsule)
+            finally:
+                in_flight.release()
+
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            chunk = []
+            for line_number, row in rows:
+                try:
+                    chunk.append((line_number, parse_row(row, now)))
+                except RowError as e:
+                    fail(line_number, str(e))
+                    continue
+                if len(chunk) >= chunk_size:
+                    in_flight.acquire()
+                    executor.submit(insert, chunk)
+                    chunk = []
+            if chunk:
+                in_flight.acquire()
+                executor.submit(insert, chunk)
+        return report
 
     def deliver_capsules(self):
-        pending = self.repository.find_all_pending()
         now = datetime.now().astimezone()  # timezone-aware
-        delivered_any = False
+        self.deliver(self.repository.iter_claimed(self.worker_id, now))
+
+    def deliver_scheduled(self, capsules):
+        """Claim capsules handed over by the scheduler, then deliver the ones we won."""
+        now = datetime.now().astimezone()
+        self.deliver(self.repository.claim([c.id for c in capsules], self.worker_id, now))
+
+    def deliver(self, capsules):
+        """Send already-claimed capsules and acknowledge the ones that went out."""
+        metrics = DeliveryMetrics()
+        if self.mailer is not None:
+            self.mailer.metrics = metrics
+
+        with self._deliver_lock, BatchAcknowledger(self.repository, DeliveryJournal(self.journal_path),
+                                                   metrics=metrics) as acks:
+            # Sent before a crash but never marked delivered: don't email again.
+            recovered = acks.recover()
+            due = (c for c in metrics.timed_iter("fetch", capsules) if c.id not in recovered)
 
-        for capsule in pending:
-            if now >= capsule.scheduled_time and not capsule.is_delivered:
-                print(f"Delivering to user {capsule.creator_id}: {capsule.message}")
+            def acknowledge(capsule):
                 capsule.mark_delivered()
-                self.repository.update(capsule)
-                delivered_any = True
-        
-        if not pending:
+                acks.add(capsule.id)
+                try:
+                    metrics.observe_lag(capsule.scheduled_time)
+                except Exception as e:
+                    # Metrics only; the capsule is already journaled as sent.
+                    print(f"⚠️ Could not record delivery lag of capsule {capsule.id}: {e}")
+
+            retries = RetryQueue(self.repository, metrics=metrics, on_retry=self.on_retry)
+            engine = engine_from_env(self.send, acknowledge, lambda c: c.recipient_email, metrics,
+                                     render=self.render if self.mailer is not None else None,
+                                     on_failure=retries.fail, render_digest=self.render_digest)
+            summary = engine.run(due)
+
+        if not summary["sent"] and not summary["failed"]:
             print("No pending capsules to deliver.")
-        elif not delivered_any:
-            pass 
+            return
+        print(f"📈 Delivery run: {summary}")
+        if self.mailer is not None:
+            print(f"📈 SMTP pool: {self.mailer.stats()}")
+        metrics.report()
+
+    def render(self, capsule):
+        """Resolve the recipient and build the email; a stored body is only read as it is sent."""
+        return stream_capsule(self.mailer.address, self._recipient(capsule), capsule.title,
+                              self.repository.message_body(capsule), self.repository.message_attachments(capsule))
+
+    def render_digest(self, capsules):
+        """One email for several capsules addressed to the same recipient."""
+        return stream_digest(self.mailer.address, self._recipient(capsules[0]),
+                             [(c.title, self.repository.message_body(c), self.repository.message_attachments(c))
+                              for c in capsules])
+
+    def _recipient(self, capsule):
+        recipient = capsule.recipient_email
+        if not recipient and self.user_service is not None:
+            recipient = self.user_service.recipient_of(capsule)
+        if not recipient:
+            raise PermanentDeliveryError("no recipient email")
+        return recipient
+
+    def send(self, capsule, email=None):
+        if self.mailer is None:
+            print(f"Delivering to user {capsule.creator_id}: {capsule.message}")
+            return True
+
+        # Normally rendered ahead by the engine; direct callers render here.
+        # Errors propagate so the retry queue can classify them.
+        self.mailer.send_rendered(email or self.render(capsule))
+        return True
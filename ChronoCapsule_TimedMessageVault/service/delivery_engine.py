@@ -0,0 +1,252 @@
+# service/delivery_engine.py
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+
+def email_domain(address):
+    if not address or "@" not in address:
+        return ""
+    return address.rsplit("@", 1)[1].lower()
+
+
+class RateLimiter:
+    """
+    Token bucket shared by all workers: at most ``rate`` sends per second,
+    with bursts of up to ``burst``. A rate of 0/None disables limiting.
+    """
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.burst = burst or max(1, int(rate or 1))
+        self._tokens = float(self.burst)
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        if not self.rate:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+                self._last = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class DeliveryEngine:
+    """
+    Delivers capsules on a bounded pool of worker threads.
+
+    Each worker sends one message and then acknowledges its capsules, so
+    SMTP sends and DB updates for different capsules overlap. Sends are additionally
+    capped per recipient domain and by a global rate limit. ``stop()``
+    stops taking new capsules and lets the in-flight ones finish.
+
+    ``send(capsule)`` returns True on success, ``acknowledge(capsule)`` is
+    called only for capsules that were sent, and ``recipient_of(capsule)``
+    returns the recipient address used for the per-domain caps.
+
+    With ``render(capsule)``, each message is prepared on the feeding thread
+    while the workers are busy on the network, and the workers call
+    ``send(capsule, rendered)`` instead. ``render`` returning None skips the
+    capsule.
+
+    ``on_failure(capsule, error)`` is called for every capsule that failed
+    to render or send, with the exception (None if ``send`` returned False),
+    e.g. RetryQueue.fail. That includes capsules a worker could not get to
+    because something around the send failed -- e.g. acknowledging an
+    earlier capsule of a digest -- so none is left leased without a retry
+    record.
+
+    With ``render`` and ``render_digest(capsules)``, a recipient's capsules
+    within ``plan_window`` capsules of each other are merged into one email
+    of up to ``digest_max`` (see service.delivery_planner); every capsule in
+    it is then acknowledged, or failed, together.
+    """
+
+    def __init__(self, send, acknowledge, recipient_of, workers=4, per_domain=2, rate=None, metrics=None,
+                 stop_event=None, render=None, on_failure=None, plan_window=None, render_digest=None,
+                 digest_max=None):
+        self.send = send
+        self.acknowledge = acknowledge
+        self.recipient_of = recipient_of
+        self.render = render
+        self.on_failure = on_failure
+        self.workers = workers
+        self.per_domain = per_domain
+        self.limiter = RateLimiter(rate)
+        self.metrics = metrics
+        self.plan_window = plan_window
+        # Digests need rendered emails to merge into.
+        self.render_digest = render_digest if render is not None else None
+        self.digest_max = digest_max
+
+        self._domains = {}
+        self._lock = threading.Lock()
+        # May be shared with a process-wide shutdown flag set from a signal handler.
+        self._stopping = stop_event or threading.Event()
+        # Bounds queued + running messages so a huge due set is
+        # never turned into futures all at once.
+        self._in_flight = threading.BoundedSemaphore(workers * 2)
+
+        self.sent = 0
+        self.failed = 0
+        self.skipped = 0
+
+    def _domain_slot(self, domain):
+        with self._lock:
+            slot = self._domains.get(domain)
+            if slot is None:
+                slot = self._domains[domain] = threading.BoundedSemaphore(self.per_domain)
+        return slot
+
+    def _count(self, name, n=1):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + n)
+        if self.metrics is not None:
+            self.metrics.inc(name, n)
+
+    def _prepare(self, batch):
+        """Render one message (a capsule or a digest) ahead of the send stage; returns (ok, rendered)."""
+        try:
+            render = self.render if len(batch) == 1 else self.render_digest
+            arg = batch[0] if len(batch) == 1 else batch
+            if self.metrics is not None:
+                with self.metrics.time("render"):
+                    rendered = render(arg)
+            else:
+                rendered = render(arg)
+        except Exception as e:
+            print(f"❌ Failed to render capsule {_ids(batch)}: {e}")
+            for capsule in batch:
+                self._fail(capsule, e)
+            return False, None
+        if rendered is None:
+            self._count("skipped", len(batch))
+            return False, None
+        return True, rendered
+
+    def _fail(self, capsule, error):
+        self._count("failed")
+        if self.on_failure is not None:
+            self.on_failure(capsule, error)
+
+    def _transmit(self, batch, rendered):
+        """Send one message; returns (ok, error)."""
+        self.limiter.acquire()
+        capsule = batch[0]
+        try:
+            return (self.send(capsule) if self.render is None else self.send(capsule, rendered)), None
+        except Exception as e:
+            print(f"❌ Failed to send capsule {_ids(batch)} to {self.recipient_of(capsule)}: {e}")
+            return False, e
+
+    def _settle(self, batch, ok, error, unsettled):
+        """Acknowledge or fail each capsule of ``batch``, taking it off the front of ``unsettled``."""
+        for capsule in batch:
+            if ok:
+                self.acknowledge(capsule)
+                self._count("sent")
+            else:
+                self._fail(capsule, error)
+            unsettled.popleft()
+
+    def _abandon(self, unsettled, error):
+        # The worker broke down with these still claimed; hand each to on_failure.
+        print(f"❌ Delivery worker error, failing {len(unsettled)} capsule(s): {error}")
+        for capsule in unsettled:
+            self._fail(capsule, error)
+
+    def _deliver(self, batch, rendered=None):
+        # In the order they are settled, so whatever is left on an error was never acknowledged.
+        unsettled = deque(batch)
+        try:
+            if self._stopping.is_set():
+                self._count("skipped", len(batch))
+                return
+            with self._domain_slot(email_domain(self.recipient_of(batch[0]))):
+                ok, error = self._transmit(batch, rendered)
+            self._settle(batch, ok, error, unsettled)
+        except Exception as e:
+            self._abandon(unsettled, e)
+        finally:
+            self._in_flight.release()
+
+    def _messages(self, capsules):
+        if self.render_digest is None:
+            return ((capsule,) for capsule in capsules)
+        from service.delivery_planner import DIGEST_MAX, PLAN_WINDOW, plan_digests
+
+        return plan_digests(capsules, self.recipient_of, self.digest_max or DIGEST_MAX,
+                            self.plan_window or PLAN_WINDOW)
+
+    def _feed(self, executor, capsules):
+        for batch in self._messages(capsules):
+            if self._stopping.is_set():
+                break
+            if self.render is None:
+                self._in_flight.acquire()
+                executor.submit(self._deliver, batch)
+                continue
+            ok, rendered = self._prepare(batch)
+            if ok:
+                self._in_flight.acquire()
+                executor.submit(self._deliver, batch, rendered)
+
+    def run(self, capsules):
+        """
+        Deliver every capsule from the iterable and wait for the workers to
+        drain. Returns a summary of the run.
+        """
+        start = time.monotonic()
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="deliver") as executor:
+            self._feed(executor, capsules)
+        elapsed = time.monotonic() - start
+        return {
+            "sent": self.sent,
+            "failed": self.failed,
+            "skipped": self.skipped,
+            "seconds": round(elapsed, 3),
+            "capsules_per_second": round(self.sent / elapsed, 2) if elapsed > 0 else 0.0,
+        }
+
+    def stop(self):
+        """Stop taking new capsules; in-flight sends are allowed to finish."""
+        self._stopping.set()
+
+
+def _ids(batch):
+    return ", ".join(str(capsule.id) for capsule in batch)
+
+
+def engine_from_env(send, acknowledge, recipient_of, metrics=None, stop_event=None, render=None,
+                    on_failure=None, render_digest=None):
+    """
+    Build an engine configured by DELIVERY_WORKERS, DELIVERY_PER_DOMAIN and
+    DELIVERY_RATE (sends per second, 0 = unlimited), plus DELIVERY_DIGEST /
+    DELIVERY_DIGEST_MAX (merge a recipient's capsules into one email) and
+    DELIVERY_PLAN_WINDOW (capsules read ahead to find them).
+    """
+    digest = os.getenv("DELIVERY_DIGEST", "0").lower() in ("1", "true", "yes")
+    return DeliveryEngine(
+        send,
+        acknowledge,
+        recipient_of,
+        workers=int(os.getenv("DELIVERY_WORKERS", "4")),
+        per_domain=int(os.getenv("DELIVERY_PER_DOMAIN", "2")),
+        rate=float(os.getenv("DELIVERY_RATE", "0")),
+        metrics=metrics,
+        stop_event=stop_event,
+        render=render,
+        on_failure=on_failure,
+        plan_window=int(os.getenv("DELIVERY_PLAN_WINDOW", "500")),
+        render_digest=render_digest if digest else None,
+        digest_max=int(os.getenv("DELIVERY_DIGEST_MAX", "20")),
+    )
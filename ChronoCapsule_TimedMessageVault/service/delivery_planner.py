@@ -0,0 +1,28 @@
+# service/delivery_planner.py
+from itertools import islice
+
+PLAN_WINDOW = 500
+DIGEST_MAX = 20
+
+
+def plan_digests(capsules, recipient_of, limit=DIGEST_MAX, window=PLAN_WINDOW):
+    """
+    Split a due stream into messages, reading ``window`` capsules ahead at a
+    time so a huge due set is never held in memory: a recipient's capsules
+    within a window (up to ``limit`` per message) become one digest,
+    everything else stays a message of its own. Recipients keep the due
+    order of their earliest capsule in the window. Capsules without a known
+    recipient are never merged.
+    """
+    capsules = iter(capsules)
+    while True:
+        chunk = list(islice(capsules, window))
+        if not chunk:
+            return
+        by_recipient = {}
+        for position, capsule in enumerate(chunk):
+            recipient = (recipient_of(capsule) or "").lower()
+            by_recipient.setdefault(recipient or position, []).append(capsule)
+        for batch in by_recipient.values():
+            for start in range(0, len(batch), limit):
+                yield batch[start:start + limit]
@@ -0,0 +1,456 @@
+# service/email_templates.py
+import base64
+import html
+import itertools
+import os
+import re
+import threading
+import time
+from functools import partial
+
+DEFAULT_TEMPLATE = os.getenv("EMAIL_TEMPLATE", "capsule")
+SUBJECT_PREFIX = os.getenv("EMAIL_SUBJECT_PREFIX", "ChronoCapsule: ")
+DIGEST_TITLE = os.getenv("EMAIL_DIGEST_TITLE", "{count} messages from the past")
+
+# template id -> (subject, plain text, html, extra headers). Sources use
+# $name / ${name} placeholders: title and body, plus recipient.
+TEMPLATES = {
+    "capsule": (
+        "$title",
+        "$body\n\n--\nSent with ChronoCapsule, a message from the past.\n",
+        '<!DOCTYPE html>\n<html><body style="font-family: Arial, sans-serif;">\n'
+        '<h2 style="color: #6A5ACD;">⏳ $title</h2>\n'
+        "<div>$body</div>\n"
+        '<p style="color: #888; font-size: 12px;">Sent with ChronoCapsule, a message from the past.</p>\n'
+        "</body></html>\n",
+        {"Auto-Submitted": "auto-generated", "X-Mailer": "ChronoCapsule"},
+    ),
+}
+
+_PLACEHOLDER = re.compile(r"\$(?:\{(\w+)\}|(\w+))")
+_TAG = re.compile(r"<[^>]+>")
+_BREAK = re.compile(r"<br\s*/?>|</p>|</div>", re.IGNORECASE)
+_BREAK_TAG = re.compile(r"br\s*/?|/p|/div", re.IGNORECASE)  # _BREAK, without the angle brackets
+_CONTENT_TYPE = re.compile(r"^[\w.+-]+/[\w.+-]+$")
+_BOUNDARY = "===============chronocapsule-alternative=="  # can never occur in base64 output
+_MIXED_BOUNDARY = "===============chronocapsule-mixed=="
+_ALTERNATIVE = f'Content-Type: multipart/alternative; boundary="{_BOUNDARY}"\r\n\r\n'
+_TEXT_PART = (f"--{_BOUNDARY}\r\n"
+              'Content-Type: text/plain; charset="utf-8"\r\n'
+              "Content-Transfer-Encoding: base64\r\n"
+              "\r\n")
+_HTML_PART = (f"--{_BOUNDARY}\r\n"
+              'Content-Type: text/html; charset="utf-8"\r\n'
+              "Content-Transfer-Encoding: base64\r\n"
+              "\r\n")
+_ALTERNATIVE_END = f"--{_BOUNDARY}--\r\n"
+
+
+def _compile(source):
+    """Turn a $name template into a str.format string, parsed once."""
+    out = []
+    pos = 0
+    for match in _PLACEHOLDER.finditer(source):
+        out.append(source[pos:match.start()].replace("{", "{{").replace("}", "}}"))
+        out.append("{" + (match.group(1) or match.group(2)) + "}")
+        pos = match.end()
+    out.append(source[pos:].replace("{", "{{").replace("}", "}}"))
+    return "".join(out)
+
+
+def _header(value):
+    # No CR/LF from user input may reach the header block.
+    value = " ".join(str(value).split())
+    if value.isascii() and len(value) < 900:
+        return value
+    from email.header import Header
+    # Folded lines must end in CRLF like the rest of the message; the
+    # default "\n" would go onto the wire as a bare LF.
+    return Header(value, "utf-8").encode(linesep="\r\n")
+
+
+def _b64(text):
+    return base64.encodebytes(text.encode("utf-8")).decode("ascii").replace("\n", "\r\n")
+
+
+def alternatives(body):
+    """(html, plain) versions of a capsule body, which may be HTML or plain text."""
+    body = body or ""
+    if _TAG.search(body):
+        return body, html.unescape(_TAG.sub("", _BREAK.sub("\n", body))).strip()
+    return html.escape(body).replace("\n", "<br>\n"), body
+
+
+def _segments(compiled):
+    """Split a compiled template at its {body} fields: format strings, with None where the body goes."""
+    from string import Formatter
+
+    segments, current = [], ""
+    for literal, field, _, _ in Formatter().parse(compiled):
+        current += literal.replace("{", "{{").replace("}", "}}")
+        if field == "body":
+            segments += [current, None]
+            current = ""
+        elif field is not None:
+            current += "{" + field + "}"
+    segments.append(current)
+    return segments
+
+
+def _fill(segments, body, **fields):
+    pieces = []
+    for segment in segments:
+        if segment is None:
+            pieces.extend(body)
+        elif segment:
+            pieces.append(segment.format(**fields))
+    return pieces
+
+
+class RenderedEmail:
+    """A fully encoded message, ready for SMTP.sendmail."""
+
+    __slots__ = ("sender", "recipient", "data")
+
+    def __init__(self, sender, recipient, data):
+        self.sender = sender
+        self.recipient = recipient
+        self.data = data
+
+
+class StreamedEmail:
+    """
+    A message whose body parts are encoded while it is being sent, for
+    stored bodies (repository.message_store) and attachments that shouldn't
+    be held in memory whole. ``load()`` fetches what the parts need -- call
+    it before talking to the server, so a missing body fails cleanly --
+    and ``chunks()`` yields the encoded message; it can be iterated again
+    for a resend.
+    """
+
+    __slots__ = ("sender", "recipient", "_head", "_text", "_html", "_bodies", "_attachments", "_files")
+
+    def __init__(self, sender, recipient, head, text, html_part, bodies, attachments):
+        self.sender = sender
+        self.recipient = recipient
+        self._head = head
+        # Pieces of each part: str, or a callable returning str chunks.
+        self._text = text
+        self._html = html_part
+        self._bodies = bodies
+        # Sequences of attachments, or loaders returning one.
+        self._attachments = attachments
+        self._files = None
+
+    def load(self):
+        for body in self._bodies:
+            body.load()
+        if self._files is None:
+            files = []
+            for source in self._attachments:
+                files.extend(source() if callable(source) else source)
+            for attachment in files:
+                attachment.load()
+            self._files = files
+        return self
+
+    def chunks(self):
+        self.load()
+        yield self._head.encode("ascii")
+        if self._files:
+            yield (f'Content-Type: multipart/mixed; boundary="{_MIXED_BOUNDARY}"\r\n\r\n'
+                   f"--{_MIXED_BOUNDARY}\r\n").encode("ascii")
+        yield (_ALTERNATIVE + _TEXT_PART).encode("ascii")
+        yield from _b64_lines(_utf8(self._text))
+        yield _HTML_PART.encode("ascii")
+        yield from _b64_lines(_utf8(self._html))
+        yield _ALTERNATIVE_END.encode("ascii")
+        if self._files:
+            for attachment in self._files:
+                yield f"--{_MIXED_BOUNDARY}\r\n{_attachment_headers(attachment)}\r\n".encode("ascii")
+                yield from _b64_lines(attachment.chunks())
+            yield f"--{_MIXED_BOUNDARY}--\r\n".encode("ascii")
+
+
+class _TextBody:
+    """An in-memory body behind the stored-body interface."""
+
+    __slots__ = ("text", "is_html")
+
+    def __init__(self, text):
+        self.text = text or ""
+        self.is_html = bool(_TAG.search(self.text))
+
+    def load(self):
+        return self
+
+    def text_chunks(self):
+        yield self.text
+
+
+def _utf8(pieces):
+    for piece in pieces:
+        if isinstance(piece, str):
+            if piece:
+                yield piece.encode("utf-8")
+        else:
+            for chunk in piece():
+                yield chunk.encode("utf-8")
+
+
+def _b64_lines(chunks):
+    """The same CRLF-terminated base64 lines as _b64, without joining ``chunks``."""
+    pending = b""
+    for chunk in chunks:
+        if pending:
+            chunk = pending + chunk
+        cut = len(chunk) - len(chunk) % 57
+        if cut:
+            yield base64.encodebytes(memoryview(chunk)[:cut]).replace(b"\n", b"\r\n")
+        pending = chunk[cut:]
+    if pending:
+        yield base64.encodebytes(pending).replace(b"\n", b"\r\n")
+
+
+def _html_chunks(body):
+    """The HTML side of ``alternatives``, chunk by chunk."""
+    if body.is_html:
+        yield from body.text_chunks()
+        return
+    for chunk in body.text_chunks():
+        yield html.escape(chunk).replace("\n", "<br>\n")
+
+
+def _text_chunks(body):
+    """The plain side of ``alternatives``, chunk by chunk."""
+    if body.is_html:
+        yield from _html_to_text(body.text_chunks())
+    else:
+        yield from body.text_chunks()
+
+
+def _html_to_text(chunks):
+    """
+    ``html.unescape(_TAG.sub("", _BREAK.sub("\n", body))).strip()`` over a
+    stream: tags are dropped however long they are (an inline image, say),
+    and only a short prefix of each is kept to recognise line breaks.
+    Identical output for well-formed markup; a stray "<" may differ.
+    """
+    in_tag, head, carry, held, started = False, "", "", "", False
+    for chunk in chunks:
+        out = [carry]
+        pos, end = 0, len(chunk)
+        while pos < end:
+            if in_tag:
+                close = chunk.find(">", pos)
+                stop = end if close < 0 else close
+                if len(head) <= 8:
+                    head += chunk[pos:min(stop, pos + 9)]
+                if close < 0:
+                    break
+                pos, in_tag = close + 1, False
+                if not head:
+                    out.append("<>")  # not a tag
+                elif _BREAK_TAG.fullmatch(head):
+                    out.append("\n")
+                head = ""
+            else:
+                start = chunk.find("<", pos)
+                if start < 0:
+                    out.append(chunk[pos:])
+                    break
+                out.append(chunk[pos:start])
+                pos, in_tag = start + 1, True
+        text = "".join(out)
+        # An entity may continue in the next chunk; "&" never occurs inside one.
+        amp = text.rfind("&")
+        if amp >= 0 and len(text) - amp <= 40:
+            text, carry = text[:amp], text[amp:]
+        else:
+            carry = ""
+        text = html.unescape(text)
+        if not started:
+            text = text.lstrip()
+            started = bool(text)
+        stripped = text.rstrip()
+        if stripped:
+            yield held + stripped
+            held = text[len(stripped):]
+        else:
+            held += text
+    text = html.unescape(carry + ("<" + head if in_tag else ""))
+    text = text.strip() if not started else text.rstrip()
+    if text:
+        yield held + text
+
+
+def _param(name, value):
+    """A MIME parameter; RFC 2231-encoded unless plain ASCII."""
+    value = " ".join(str(value or "attachment").split())
+    if value.isascii() and '"' not in value and "\\" not in value:
+        return f'{name}="{value}"'
+    from email.utils import encode_rfc2231
+    return f"{name}*={encode_rfc2231(value, 'utf-8')}"
+
+
+def _attachment_headers(attachment):
+    content_type = attachment.content_type if _CONTENT_TYPE.match(attachment.content_type or "") \
+        else "application/octet-stream"
+    return (f"Content-Type: {content_type}; {_param('name', attachment.filename)}\r\n"
+            f"Content-Disposition: attachment; {_param('filename', attachment.filename)}\r\n"
+            "Content-Transfer-Encoding: base64\r\n")
+
+
+class EmailTemplate:
+    """
+    A compiled multipart/alternative (plain + HTML) email. Everything that
+    doesn't change between messages -- the MIME skeleton, the static
+    headers, the subject prefix -- is built once here, so ``render`` only
+    substitutes the per-capsule values and base64-encodes the two bodies.
+    """
+
+    def __init__(self, template_id, subject, text, html_source, headers=None, subject_prefix=SUBJECT_PREFIX):
+        self.template_id = template_id
+        self._subject = subject_prefix.replace("{", "{{").replace("}", "}}") + _compile(subject)
+        self._text = _compile(text)
+        self._html = _compile(html_source)
+        self._text_segments = _segments(self._text)
+        self._html_segments = _segments(self._html)
+        static = "".join(f"{name}: {_header(value)}\r\n" for name, value in (headers or {}).items())
+        # Per-message slots in the skeleton are named so they can't clash
+        # with template placeholders.
+        self._head = (
+            "From: {_sender}\r\n"
+            "To: {_recipient}\r\n"
+            "Subject: {_subject}\r\n"
+            "Date: {_date}\r\n"
+            "Message-ID: {_message_id}\r\n"
+            "MIME-Version: 1.0\r\n"
+            + static.replace("{", "{{").replace("}", "}}")
+        )
+        self._skeleton = (
+            self._head
+            + _ALTERNATIVE + _TEXT_PART + "{_text}"
+            + _HTML_PART + "{_html}"
+            + _ALTERNATIVE_END
+        )
+
+    def render(self, sender, recipient, title, body):
+        html_body, text_body = alternatives(body)
+        return self.render_parts(sender, recipient, title, html_body, text_body)
+
+    def render_parts(self, sender, recipient, title, html_body, text_body):
+        """Render with the HTML and plain bodies already prepared."""
+        title = title or "No Subject"
+        text = self._text.format(title=title, body=text_body, recipient=recipient)
+        html_part = self._html.format(title=html.escape(title), body=html_body, recipient=html.escape(recipient))
+        data = self._skeleton.format(
+            _sender=_header(sender),
+            _recipient=_header(recipient),
+            _subject=_header(self._subject.format(title=title, recipient=recipient)),
+            _date=_date_header(),
+            _message_id=_message_id(sender),
+            _text=_b64(text),
+            _html=_b64(html_part),
+        )
+        return RenderedEmail(sender, recipient, data.encode("ascii"))
+
+    def stream(self, sender, recipient, title, body, attachments=()):
+        """
+        Like ``render``, but ``body`` may also be a stored MessageBody, read
+        chunk by chunk as the message is sent, and ``attachments`` (stored
+        blobs, or a loader returning them) go along as a multipart/mixed
+        message. Returns a StreamedEmail.
+        """
+        body = body if hasattr(body, "text_chunks") else _TextBody(body)
+        return self.stream_parts(sender, recipient, title, [partial(_html_chunks, body)],
+                                 [partial(_text_chunks, body)], [body], [attachments])
+
+    def stream_parts(self, sender, recipient, title, html_pieces, text_pieces, bodies, attachments=()):
+        """``render_parts`` for bodies given as pieces: strings or callables returning string chunks."""
+        title = title or "No Subject"
+        head = self._head.format(
+            _sender=_header(sender),
+            _recipient=_header(recipient),
+            _subject=_header(self._subject.format(title=title, recipient=recipient)),
+            _date=_date_header(),
+            _message_id=_message_id(sender),
+        )
+        text = _fill(self._text_segments, text_pieces, title=title, recipient=recipient)
+        html_part = _fill(self._html_segments, html_pieces, title=html.escape(title), recipient=html.escape(recipient))
+        return StreamedEmail(sender, recipient, head, text, html_part, bodies, attachments)
+
+
+# ------------------- PER-MESSAGE HEADERS -------------------
+_date_cache = (0, "")
+_message_ids = itertools.count()
+
+
+def _date_header():
+    # formatdate is comparatively slow and only changes once a second.
+    global _date_cache
+    now = int(time.time())
+    if _date_cache[0] != now:
+        from email.utils import formatdate
+        _date_cache = (now, formatdate(now, usegmt=True))
+    return _date_cache[1]
+
+
+def _message_id(sender):
+    domain = sender.rsplit("@", 1)[-1] if sender and "@" in sender else "chronocapsule.local"
+    return f"<{time.time_ns()}.{os.getpid()}.{next(_message_ids)}@{domain}>"
+
+
+# ------------------- CACHE -------------------
+_compiled = {}
+_lock = threading.Lock()
+
+
+def get_template(template_id=None):
+    """Compiled template for ``template_id`` (default EMAIL_TEMPLATE), built once per process."""
+    template_id = template_id or DEFAULT_TEMPLATE
+    template = _compiled.get(template_id)
+    if template is None:
+        with _lock:
+            template = _compiled.get(template_id)
+            if template is None:
+                subject, text, html_source, headers = TEMPLATES[template_id]
+                template = _compiled[template_id] = EmailTemplate(template_id, subject, text, html_source, headers)
+    return template
+
+
+def register_template(template_id, subject, text, html_source, headers=None):
+    """Add or replace a template; the next ``get_template`` recompiles it."""
+    with _lock:
+        TEMPLATES[template_id] = (subject, text, html_source, headers or {})
+        _compiled.pop(template_id, None)
+
+
+def render_capsule(sender, recipient, title, body, template_id=None):
+    return get_template(template_id).render(sender, recipient, title, body)
+
+
+def stream_capsule(sender, recipient, title, body, attachments=(), template_id=None):
+    return get_template(template_id).stream(sender, recipient, title, body, attachments)
+
+
+def stream_digest(sender, recipient, capsules, template_id=None):
+    """
+    One email carrying several capsules for the same recipient, each under
+    its own title, streamed like ``stream_capsule``. ``capsules`` are
+    (title, body, attachments) triples.
+    """
+    html_pieces, text_pieces, bodies, attachments = [], [], [], []
+    for title, body, files in capsules:
+        body = body if hasattr(body, "text_chunks") else _TextBody(body)
+        title = title or "No Subject"
+        if bodies:
+            html_pieces.append("\n<hr>\n")
+            text_pieces.append("\n\n")
+        html_pieces += [f"<h3>{html.escape(title)}</h3>\n<div>", partial(_html_chunks, body), "</div>"]
+        text_pieces += [f"{title}\n{'-' * len(title)}\n", partial(_text_chunks, body)]
+        bodies.append(body)
+        attachments.append(files)
+    return get_template(template_id).stream_parts(
+        sender, recipient, DIGEST_TITLE.format(count=len(bodies)), html_pieces, text_pieces, bodies, attachments,
+    )
@@ -0,0 +1,51 @@
+# service/health_server.py
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class HealthServer(ThreadingHTTPServer):
+    """
+    Tiny HTTP endpoint for a long-running worker:
+
+        GET /healthz  200 while the process and its scheduler are alive
+        GET /readyz   200 once ``ready()`` returns True, 503 before that
+
+    Both return ``status()`` as JSON so the body doubles as a status page.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, port, alive, ready, status, host="0.0.0.0"):
+        super().__init__((host, port), _Handler)
+        self.alive = alive
+        self.ready = ready
+        self.status = status
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, name="health-server", daemon=True).start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path == "/healthz":
+            ok = self.server.alive()
+        elif self.path == "/readyz":
+            ok = self.server.alive() and self.server.ready()
+        else:
+            self.send_error(404)
+            return
+        body = json.dumps({"ok": ok, **self.server.status()}, default=str).encode()
+        self.send_response(200 if ok else 503)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # probes every few seconds would drown the delivery log
@@ -0,0 +1,193 @@
+# service/metrics.py
+import bisect
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+STAGES = ("fetch", "render", "body", "connect", "login", "send", "acknowledge")
+COUNTERS = ("sent", "failed", "skipped", "retried", "dead_lettered")
+STAGE_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+LAG_BUCKETS = (0.5, 1.0, 5.0, 15.0, 30.0, 60.0, 120.0, 300.0, 900.0, 3600.0)
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # last slot is +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the q-th observation."""
+        if not self.count:
+            return 0.0
+        target = q * self.count
+        seen = 0
+        for bound, n in zip(self.buckets + (self.max,), self.counts):
+            seen += n
+            if seen >= target:
+                return min(bound, self.max)
+        return self.max
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 4),
+            "mean": round(self.sum / self.count, 4) if self.count else 0.0,
+            "p50": round(self.quantile(0.5), 4),
+            "p99": round(self.quantile(0.99), 4),
+            "max": round(self.max, 4),
+        }
+
+
+class DeliveryMetrics:
+    """
+    Per-run instrumentation for the delivery pipeline: a latency histogram
+    per stage (fetch, render, body, connect, login, send, acknowledge), sent /
+    failed / skipped / retried / dead_lettered counters and a histogram of delivery lag, i.e. actual
+    send time minus scheduled_time. Thread-safe.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started = time.monotonic()
+        self.counters = {name: 0 for name in COUNTERS}
+        self.stages = {name: Histogram(STAGE_BUCKETS) for name in STAGES}
+        self.lag = Histogram(LAG_BUCKETS)
+
+    @contextmanager
+    def time(self, stage):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start)
+
+    def observe(self, stage, seconds):
+        with self._lock:
+            self.stages[stage].observe(seconds)
+
+    def timed_iter(self, stage, iterable):
+        """Yield from ``iterable``, timing how long each item took to arrive."""
+        iterator = iter(iterable)
+        while True:
+            with self.time(stage):
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+            yield item
+
+    def inc(self, counter, amount=1):
+        with self._lock:
+            self.counters[counter] += amount
+
+    def observe_lag(self, scheduled_time, sent_at=None):
+        sent_at = sent_at or datetime.now(timezone.utc)
+        with self._lock:
+            self.lag.observe(max(0.0, (sent_at - scheduled_time).total_seconds()))
+
+    # ------------------- EXPORT -------------------
+    def summary(self):
+        with self._lock:
+            return {
+                "elapsed_seconds": round(time.monotonic() - self.started, 3),
+                "counters": dict(self.counters),
+                "stages": {name: h.summary() for name, h in self.stages.items() if h.count},
+                "delivery_lag_seconds": self.lag.summary(),
+            }
+
+    def to_prometheus(self):
+        lines = []
+        with self._lock:
+            for name, value in self.counters.items():
+                lines.append(f"# TYPE chronocapsule_capsules_{name}_total counter")
+                lines.append(f"chronocapsule_capsules_{name}_total {value}")
+
+            lines.append("# TYPE chronocapsule_stage_seconds histogram")
+            for stage, h in self.stages.items():
+                lines.extend(_histogram_lines("chronocapsule_stage_seconds", h, f'stage="{stage}",'))
+
+            lines.append("# TYPE chronocapsule_delivery_lag_seconds histogram")
+            lines.extend(_histogram_lines("chronocapsule_delivery_lag_seconds", self.lag, ""))
+        return "\n".join(lines) + "\n"
+
+    def report(self):
+        """
+        Print the JSON summary and, if METRICS_PROM_FILE is set, write the
+        Prometheus text exposition there (e.g. for node_exporter's textfile
+        collector).
+        """
+        print(f"📊 Delivery metrics: {json.dumps(self.summary())}")
+        path = os.getenv("METRICS_PROM_FILE")
+        if path:
+            tmp = path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                f.write(self.to_prometheus())
+            os.replace(tmp, path)
+
+
+def _histogram_lines(name, h, labels):
+    lines = []
+    cumulative = 0
+    for bound, n in zip(h.buckets, h.counts):
+        cumulative += n
+        lines.append(f'{name}_bucket{{{labels}le="{bound}"}} {cumulative}')
+    lines.append(f'{name}_bucket{{{labels}le="+Inf"}} {h.count}')
+    label_set = f"{{{labels.rstrip(',')}}}" if labels else ""
+    lines.append(f"{name}_sum{label_set} {h.sum}")
+    lines.append(f"{name}_count{label_set} {h.count}")
+    return lines
+
+
+@contextmanager
+def profiling():
+    """
+    Profile the enclosed block when DELIVERY_PROFILE is "cprofile" or
+    "pyinstrument"; the report goes to DELIVERY_PROFILE_OUT (default
+    delivery.prof / delivery-profile.html). Does nothing otherwise.
+    """
+    mode = os.getenv("DELIVERY_PROFILE", "").lower()
+    if mode == "cprofile":
+        import cProfile
+        import pstats
+        out = os.getenv("DELIVERY_PROFILE_OUT", "delivery.prof")
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            profiler.dump_stats(out)
+            pstats.Stats(profiler).sort_stats("cumulative").print_stats(20)
+            print(f"🔬 cProfile stats written to {out}")
+    elif mode == "pyinstrument":
+        try:
+            from pyinstrument import Profiler
+        except ImportError:
+            print("⚠️ DELIVERY_PROFILE=pyinstrument but pyinstrument is not installed; not profiling.")
+            yield
+            return
+        out = os.getenv("DELIVERY_PROFILE_OUT", "delivery-profile.html")
+        profiler = Profiler()
+        profiler.start()
+        try:
+            yield
+        finally:
+            profiler.stop()
+            with open(out, "w", encoding="utf-8") as f:
+                f.write(profiler.output_html())
+            print(profiler.output_text())
+            print(f"🔬 pyinstrument report written to {out}")
+    else:
+        yield
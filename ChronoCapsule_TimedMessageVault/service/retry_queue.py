@@ -0,0 +1,102 @@
+# service/retry_queue.py
+import os
+import random
+import threading
+from datetime import datetime, timedelta, timezone
+
+
+class PermanentDeliveryError(Exception):
+    """A capsule that can never be delivered as it stands, e.g. no recipient."""
+
+
+def is_permanent(error):
+    """
+    Classify a send failure. 5xx replies about the recipient or the message
+    are permanent; 4xx replies, dropped connections, timeouts and anything
+    unrecognised are transient. Authentication and sender rejections are
+    our configuration, not the capsule's, so they are retried too.
+    """
+    import smtplib  # kept off the import path of entry points that never send
+
+    if isinstance(error, PermanentDeliveryError):
+        return True
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return all(code >= 500 for code, _ in error.recipients.values())
+    if isinstance(error, (smtplib.SMTPAuthenticationError, smtplib.SMTPSenderRefused)):
+        return False
+    if isinstance(error, smtplib.SMTPResponseException):
+        return error.smtp_code >= 500
+    return False
+
+
+class RetryPolicy:
+    """
+    Jittered exponential backoff: attempt n waits base * 2**(n-1), capped at
+    ``cap``, scaled by a random factor in [0.5, 1] so capsules that failed
+    together don't retry together. ``max_attempts`` sends in total.
+    """
+
+    def __init__(self, base=60.0, cap=6 * 3600.0, max_attempts=8, rng=None):
+        self.base = base
+        self.cap = cap
+        self.max_attempts = max_attempts
+        self.rng = rng or random.Random()
+
+    def delay(self, attempts):
+        ceiling = min(self.cap, self.base * 2 ** (attempts - 1))
+        return ceiling * self.rng.uniform(0.5, 1.0)
+
+
+def policy_from_env():
+    return RetryPolicy(
+        base=float(os.getenv("RETRY_BASE_SECONDS", "60")),
+        cap=float(os.getenv("RETRY_MAX_SECONDS", str(6 * 3600))),
+        max_attempts=int(os.getenv("RETRY_MAX_ATTEMPTS", "8")),
+    )
+
+
+class RetryQueue:
+    """
+    Records failed sends: a transient failure releases the capsule with
+    ``next_attempt_at`` pushed out by the backoff, so due queries leave it
+    alone until then; a permanent one, or the last allowed attempt, moves
+    it to the dead-letter state.
+    """
+
+    def __init__(self, repository, policy=None, metrics=None, on_retry=()):
+        self.repository = repository
+        self.policy = policy or policy_from_env()
+        self.metrics = metrics
+        # Called with the capsule after its next_attempt_at moved, e.g. CapsuleScheduler.add.
+        self.on_retry = on_retry
+        self._lock = threading.Lock()
+        self.retried = 0
+        self.dead_lettered = 0
+
+    def fail(self, capsule, error=None):
+        attempts = (capsule.attempts or 0) + 1
+        reason = str(error) if error is not None else "send failed"
+        try:
+            if is_permanent(error) or attempts >= self.policy.max_attempts:
+                self.repository.dead_letter(capsule.id, attempts, reason)
+                self._count("dead_lettered")
+                print(f"☠️ Capsule {capsule.id} dead-lettered after {attempts} attempt(s): {reason}")
+            else:
+                delay = self.policy.delay(attempts)
+                next_attempt = datetime.now(timezone.utc) + timedelta(seconds=delay)
+                self.repository.schedule_retry(capsule.id, attempts, next_attempt, reason)
+                self._count("retried")
+                print(f"🔁 Capsule {capsule.id} failed (attempt {attempts}), retrying in {delay:.0f}s: {reason}")
+                capsule.attempts = attempts
+                capsule.next_attempt_at = next_attempt
+                for hook in self.on_retry:
+                    hook(capsule)
+        except Exception as e:
+            # The lease still expires, so the capsule is retried either way.
+            print(f"❌ Could not record failure of capsule {capsule.id}: {e}")
+
+    def _count(self, name):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+        if self.metrics is not None:
+            self.metrics.inc(name)
@@ -0,0 +1,217 @@
+# service/scheduler.py
+import heapq
+import itertools
+import os
+import threading
+from datetime import datetime, timedelta, timezone
+
+# Look-ahead window, which is also how often the window is re-read.
+LOOKAHEAD_SECONDS = 600
+
+
+class CapsuleScheduler:
+    """
+    Keeps capsules due within a look-ahead window in an in-memory min-heap
+    keyed on due time (scheduled_time, or next_attempt_at while a capsule is
+    backing off or leased) and sleeps exactly until the next deadline.
+
+    The database is read only when the window is refreshed (once per
+    ``lookahead``), so an idle vault costs one query per window instead of
+    one per minute. Capsules created through CapsuleService reach the heap
+    immediately via ``add``; ones created by other processes are picked up
+    on the next refresh.
+
+    With a change feed attached (``apply_change``, ``reconcile`` and
+    ``feed_lost`` as its callbacks, see repository.change_feed), the heap is
+    kept current incrementally instead: inserts, reschedules, claims and
+    deliveries from any process land in it as they commit, and moving the
+    window forward only reads the capsules entering it. ``reconcile``
+    re-reads the whole window once per (re)subscription to catch up on
+    whatever changed while the feed was away.
+
+    ``deliver(capsules)`` is called from the scheduler thread with every
+    capsule whose time has come.
+    """
+
+    def __init__(self, repository, deliver, lookahead=None):
+        self.repository = repository
+        self.deliver = deliver
+        self.lookahead = lookahead or timedelta(seconds=int(os.getenv("SCHEDULER_LOOKAHEAD", str(LOOKAHEAD_SECONDS))))
+
+        self._heap = []
+        self._scheduled = {}
+        # id -> timestamp of its live heap entry; any other entry for the id
+        # is stale (the capsule was rescheduled or dropped) and skipped.
+        self._due = {}
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._stopping = False
+        self._window_end = None
+        self._thread = None
+        # Changes that arrive while a refresh query runs, replayed after it.
+        self._pending = None
+        # Set when a refresh failed: the next one must re-read the whole window.
+        self._reload_all = True
+        self.live = False
+        self.last_refresh = None
+        self.changes = 0
+
+    # ------------------- HEAP -------------------
+    def add(self, capsule):
+        """Schedule a capsule if it falls inside the current window."""
+        with self._cond:
+            if capsule.is_delivered or capsule.id is None or capsule.id in self._scheduled:
+                return
+            if self._pending is not None:
+                self._pending.append((capsule.id, capsule))
+            self._place(capsule)
+
+    def _place(self, capsule):
+        # Caller holds self._cond.
+        due = capsule.due_time
+        if self._window_end is not None and due > self._window_end:
+            self._drop(capsule.id)  # moved out; the refresh that covers it will load it
+            return
+        ts = due.timestamp()
+        self._scheduled[capsule.id] = capsule
+        if self._due.get(capsule.id) == ts:
+            return
+        self._due[capsule.id] = ts
+        heapq.heappush(self._heap, (ts, next(self._seq), capsule.id))
+        if len(self._heap) > 2 * len(self._due) + 1024:
+            self._heap = [entry for entry in self._heap if self._due.get(entry[2]) == entry[0]]
+            heapq.heapify(self._heap)
+        self._cond.notify()
+
+    def _drop(self, capsule_id):
+        self._scheduled.pop(capsule_id, None)
+        self._due.pop(capsule_id, None)
+
+    def apply_change(self, op, row):
+        """Bring the heap up to date with one committed row change from the change feed."""
+        gone = op == "DELETE" or row.get("is_delivered") or row.get("status") == "dead"
+        capsule = None if gone else self.repository.capsule_from_row(row)
+        with self._cond:
+            self.changes += 1
+            if self._pending is not None:
+                self._pending.append((row["id"], capsule))
+            self._apply(row["id"], capsule)
+
+    def _apply(self, capsule_id, capsule):
+        if capsule is None:
+            self._drop(capsule_id)
+        else:
+            self._place(capsule)
+
+    def refresh(self):
+        """
+        Load everything due before the end of the next window. While the
+        change feed is live, only the slice the window gains is read.
+        """
+        window_end = datetime.now(timezone.utc) + self.lookahead
+        with self._cond:
+            start = None if self._reload_all or not self.live else self._window_end
+            self._pending = []
+        try:
+            if start is not None:
+                loaded = list(self.repository.iter_entering(start, window_end))
+            else:
+                loaded = list(self.repository.iter_due(window_end))
+            with self._cond:
+                self._window_end = window_end
+                self.last_refresh = datetime.now(timezone.utc)
+                self._reload_all = False
+                if start is None:
+                    # Full reload: whatever the heap held may be stale.
+                    self._heap, self._scheduled, self._due = [], {}, {}
+                for capsule in loaded:
+                    if capsule.id not in self._scheduled:
+                        self._place(capsule)
+                # Feed changes seen during the query are newer than its result.
+                for capsule_id, capsule in self._pending:
+                    self._apply(capsule_id, capsule)
+                self._cond.notify()
+        finally:
+            with self._cond:
+                self._pending = None
+
+    def _pop_due(self, now):
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            ts, _, capsule_id = heapq.heappop(self._heap)
+            if self._due.get(capsule_id) != ts:
+                continue  # stale entry
+            del self._due[capsule_id]
+            due.append(self._scheduled.pop(capsule_id))
+        return due
+
+    # ------------------- CHANGE FEED -------------------
+    def reconcile(self):
+        """The change feed (re)subscribed: re-read the window once, then trust the feed."""
+        with self._cond:
+            self.live = True
+            self._reload_all = True
+            self._window_end = None
+            self._cond.notify()
+
+    def feed_lost(self):
+        """The change feed dropped: fall back to full window reloads until it is back."""
+        with self._cond:
+            self.live = False
+
+    # ------------------- LOOP -------------------
+    def run(self):
+        while True:
+            with self._cond:
+                if self._stopping:
+                    return
+                needs_refresh = self._window_end is None or datetime.now(timezone.utc) >= self._window_end
+            if needs_refresh:
+                try:
+                    self.refresh()
+                except Exception as e:
+                    print(f"❌ Scheduler refresh failed: {e}")
+                    with self._cond:
+                        self._reload_all = True
+                        self._window_end = datetime.now(timezone.utc) + timedelta(seconds=30)
+
+            with self._cond:
+                now = datetime.now(timezone.utc).timestamp()
+                due = self._pop_due(now)
+                if not due:
+                    if self._window_end is None:
+                        continue  # reconcile() asked for a reload
+                    deadline = self._window_end.timestamp()
+                    if self._heap:
+                        deadline = min(deadline, self._heap[0][0])
+                    self._cond.wait(max(0.0, deadline - now))
+                    continue
+
+            try:
+                self.deliver(due)
+            except Exception as e:
+                print(f"❌ Scheduled delivery failed: {e}")
+
+    def start(self):
+        self._thread = threading.Thread(target=self.run, name="capsule-scheduler", daemon=True)
+        self._thread.start()
+        return self
+
+    def reload(self):
+        """Drop the current window so the next loop iteration re-reads the DB."""
+        with self._cond:
+            self._window_end = None
+            self._cond.notify()
+
+    def is_alive(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def stop(self):
+        with self._cond:
+            self._stopping = True
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join()
+
+    def __len__(self):
+        return len(self._scheduled)
@@ -0,0 +1,270 @@
+# service/smtp_pool.py
+import os
+import threading
+import time
+from contextlib import nullcontext
+from queue import LifoQueue, Empty
+
+# Bytes handed to the socket at a time when streaming a message.
+WRITE_SIZE = 64 * 1024
+
+
+def _is_connection_error(exc):
+    """
+    True when the SMTP session itself is unusable (dropped socket or a 421
+    "service not available") and the message should go out on a fresh one.
+    """
+    import smtplib
+
+    if isinstance(exc, smtplib.SMTPServerDisconnected):
+        return True
+    if isinstance(exc, smtplib.SMTPResponseException):
+        return exc.smtp_code == 421
+    if isinstance(exc, smtplib.SMTPException):
+        return False
+    return isinstance(exc, OSError)
+
+
+def _reset(server, code):
+    # What SMTP.sendmail does after a refusal: 421 ends the session.
+    try:
+        if code == 421:
+            server.close()
+        else:
+            server.rset()
+    except Exception:
+        server.close()
+
+
+def _send_streamed(server, email):
+    """
+    SMTP.sendmail for a service.email_templates.StreamedEmail: the DATA
+    section is written as the message is encoded, WRITE_SIZE bytes at a
+    time, instead of being joined into one string first.
+    """
+    import smtplib
+
+    server.ehlo_or_helo_if_needed()
+    code, reply = server.mail(email.sender)
+    if code != 250:
+        _reset(server, code)
+        raise smtplib.SMTPSenderRefused(code, reply, email.sender)
+    code, reply = server.rcpt(email.recipient)
+    if code not in (250, 251):
+        _reset(server, code)
+        raise smtplib.SMTPRecipientsRefused({email.recipient: (code, reply)})
+    server.putcmd("data")
+    code, reply = server.getreply()
+    if code != 354:
+        _reset(server, code)
+        raise smtplib.SMTPDataError(code, reply)
+
+    buffer, line_start = bytearray(), True
+    try:
+        for chunk in email.chunks():
+            if not chunk:
+                continue
+            # Dot-stuffing, as sendmail does.
+            if line_start and chunk[:1] == b".":
+                buffer += b"."
+            buffer += chunk.replace(b"\n.", b"\n..")
+            line_start = chunk.endswith(b"\n")
+            if len(buffer) >= WRITE_SIZE:
+                server.send(buffer)
+                buffer.clear()
+    except Exception:
+        # Half a message is on the wire; this session can't be reused.
+        server.close()
+        raise
+    if not line_start:
+        buffer += b"\r\n"
+    buffer += b".\r\n"
+    server.send(buffer)
+    code, reply = server.getreply()
+    if code != 250:
+        _reset(server, code)
+        raise smtplib.SMTPDataError(code, reply)
+
+
+class _Connection:
+    def __init__(self, server):
+        self.server = server
+        self.sent = 0
+
+    @property
+    def closed(self):
+        return getattr(self.server, "sock", True) is None
+
+    def close(self):
+        try:
+            self.server.quit()
+        except Exception:
+            try:
+                self.server.close()
+            except Exception:
+                pass
+
+
+class SMTPPool:
+    """
+    Keeps a small number of authenticated SMTP connections open for a whole
+    delivery run and sends many messages over each of them.
+
+    Connections are opened lazily, handed out one sender at a time and
+    replaced when the server drops them or answers 421.
+    """
+
+    def __init__(self, address, password, host="smtp.gmail.com", port=465,
+                 use_ssl=True, size=2, max_messages=100, timeout=30, metrics=None):
+        self.address = address
+        self.password = password
+        self.host = host
+        self.port = port
+        self.use_ssl = use_ssl
+        self.size = size
+        self.max_messages = max_messages
+        self.timeout = timeout
+        # Optional DeliveryMetrics; set per run to time connect/login/send.
+        self.metrics = metrics
+
+        self._idle = LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+        self._started = time.monotonic()
+        self.sent = 0
+        self.failed = 0
+        self.connects = 0
+        self.reconnects = 0
+
+    # ------------------- CONNECTIONS -------------------
+    def _connect(self):
+        import smtplib  # deferred until the first send, not paid at import time
+
+        smtp_cls = smtplib.SMTP_SSL if self.use_ssl else smtplib.SMTP
+        with self._timed("connect"):
+            server = smtp_cls(self.host, self.port, timeout=self.timeout)
+        try:
+            if self.password:
+                with self._timed("login"):
+                    server.login(self.address, self.password)
+        except Exception:
+            server.close()
+            raise
+        with self._lock:
+            self.connects += 1
+        return _Connection(server)
+
+    def _checkout(self):
+        try:
+            return self._idle.get_nowait()
+        except Empty:
+            return self._connect()
+
+    def _checkin(self, conn):
+        # Providers cap messages per session; retire the connection before
+        # the server does it for us mid-message. A session abandoned in the
+        # middle of a streamed message is already closed.
+        if conn.sent >= self.max_messages or conn.closed:
+            conn.close()
+        else:
+            self._idle.put(conn)
+
+    # ------------------- SENDING -------------------
+    def send_rendered(self, email):
+        """
+        Send a service.email_templates.RenderedEmail as-is, or stream a
+        StreamedEmail; no MIME work here. A streamed email's stored parts are
+        fetched before a connection is taken, so a missing body never
+        leaves a session half-way through DATA.
+        """
+        if hasattr(email, "chunks"):
+            with self._timed("body"):
+                email.load()
+            self._send(lambda server: _send_streamed(server, email))
+            return
+        self._send(lambda server: server.sendmail(email.sender, [email.recipient], email.data))
+
+    def _send(self, transmit):
+        for attempt in range(2):
+            with self._slots:
+                try:
+                    conn = self._checkout()
+                except Exception:
+                    self._record(failed=True)
+                    raise
+                try:
+                    with self._timed("send"):
+                        transmit(conn.server)
+                except Exception as e:
+                    if _is_connection_error(e):
+                        conn.close()
+                        if attempt == 0:
+                            with self._lock:
+                                self.reconnects += 1
+                            continue
+                    else:
+                        self._checkin(conn)
+                    self._record(failed=True)
+                    raise
+                conn.sent += 1
+                self._checkin(conn)
+                self._record(failed=False)
+                return
+
+    def _timed(self, stage):
+        return self.metrics.time(stage) if self.metrics is not None else nullcontext()
+
+    def _record(self, failed):
+        with self._lock:
+            if failed:
+                self.failed += 1
+            else:
+                self.sent += 1
+
+    # ------------------- STATS / LIFECYCLE -------------------
+    def rate(self):
+        """Messages sent per second since the pool was created."""
+        elapsed = time.monotonic() - self._started
+        return self.sent / elapsed if elapsed > 0 else 0.0
+
+    def stats(self):
+        return {
+            "sent": self.sent,
+            "failed": self.failed,
+            "connects": self.connects,
+            "reconnects": self.reconnects,
+            "messages_per_second": round(self.rate(), 2),
+        }
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except Empty:
+                break
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def pool_from_env(size=None):
+    """
+    Build a pool from EMAIL_ADDRESS / EMAIL_PASSWORD and the optional
+    SMTP_HOST, SMTP_PORT, SMTP_USE_SSL and SMTP_POOL_SIZE overrides.
+    Returns None when no sender credentials are configured.
+    """
+    address = os.getenv("EMAIL_ADDRESS")
+    password = os.getenv("EMAIL_PASSWORD")
+    if not address:
+        return None
+    return SMTPPool(
+        address,
+        password,
+        host=os.getenv("SMTP_HOST", "smtp.gmail.com"),
+        port=int(os.getenv("SMTP_PORT", "465")),
+        use_ssl=os.getenv("SMTP_USE_SSL", "1") not in ("0", "false", "False"),
+        size=size or int(os.getenv("SMTP_POOL_SIZE", "2")),
+    )
@@ -8,5 +8,21 @@ class UserService:
     def get_user(self, user_id):
         return self.repository.find_by_id(user_id)
 
+    def get_user_by_email(self, email):
+        return self.repository.find_by_email(email)
+
     def get_all_users(self):
         return self.repository.find_all()
+
+    def recipient_of(self, capsule):
+        """
+        Address a capsule is delivered to: its recipient_email, else its
+        creator's (capsules created from the CLI only carry creator_id).
+        None when neither is known.
+        """
+        if capsule.recipient_email:
+            return capsule.recipient_email
+        if capsule.creator_id is None:
+            return None
+        user = self.get_user(capsule.creator_id)
+        return user.email if user else None
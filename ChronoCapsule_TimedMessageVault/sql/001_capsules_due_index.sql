@@ -0,0 +1,5 @@
+-- Serves CapsuleRepository.find_due: undelivered capsules ordered by
+-- (scheduled_time, id), which is also the keyset pagination key.
+create index if not exists capsules_due_idx
+    on capsules (scheduled_time, id)
+    where is_delivered = false;
@@ -0,0 +1,7 @@
+-- Lease columns for CapsuleRepository.claim: a worker owns a capsule from
+-- the moment it claims it until it is delivered or the lease expires.
+alter table capsules add column if not exists status text not null default 'pending';
+alter table capsules add column if not exists lease_owner text;
+alter table capsules add column if not exists lease_expires_at timestamptz;
+
+update capsules set status = 'delivered' where is_delivered = true;
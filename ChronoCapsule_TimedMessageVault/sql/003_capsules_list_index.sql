@@ -0,0 +1,4 @@
+-- Serves CapsuleRepository.find_page: status filter plus a scheduled_time
+-- range, newest first.
+create index if not exists capsules_list_idx
+    on capsules (is_delivered, scheduled_time desc, id desc);
@@ -0,0 +1,11 @@
+-- Retry bookkeeping for failed sends (service/retry_queue.py). A capsule
+-- is eligible for claiming once next_attempt_at has passed: a claim pushes
+-- it to the lease expiry, a transient failure to now + backoff. Capsules
+-- that failed permanently, or too often, are parked with status 'dead'.
+alter table capsules add column if not exists attempts integer not null default 0;
+alter table capsules add column if not exists next_attempt_at timestamptz;
+alter table capsules add column if not exists last_error text;
+
+-- Capsules leased before this migration stay reserved until their lease ends.
+update capsules set next_attempt_at = lease_expires_at
+    where lease_expires_at is not null and is_delivered = false;
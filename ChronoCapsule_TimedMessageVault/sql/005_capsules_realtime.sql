@@ -0,0 +1,7 @@
+-- Publish capsule changes to Supabase Realtime for repository/change_feed.py:
+-- delivery workers subscribe to inserts/updates/deletes and keep their
+-- in-memory due window current instead of re-reading it.
+alter publication supabase_realtime add table capsules;
+
+-- DELETE events only carry the primary key by default, which is all the
+-- feed needs; updates carry the full new row.
@@ -0,0 +1,39 @@
+-- Message bodies and attachments move out of the capsules table
+-- (repository/message_store.py): compressed, base64-encoded, read only
+-- when a capsule is sent. List views read the short preview instead.
+create table if not exists capsule_messages (
+    capsule_id bigint primary key references capsules (id) on delete cascade,
+    codec text not null,
+    content_type text not null,
+    size integer not null,
+    data text not null
+);
+
+create table if not exists capsule_attachments (
+    id bigint generated by default as identity primary key,
+    capsule_id bigint not null references capsules (id) on delete cascade,
+    filename text not null,
+    content_type text not null,
+    codec text not null,
+    size integer not null,
+    data text not null
+);
+create index if not exists capsule_attachments_capsule_idx
+    on capsule_attachments (capsule_id, id);
+
+alter table capsules add column if not exists preview text;
+alter table capsules add column if not exists attachment_count integer not null default 0;
+
+-- Existing bodies move over uncompressed ('identity'); the preview is the
+-- tag-stripped start of the old body.
+insert into capsule_messages (capsule_id, codec, content_type, size, data)
+    select id, 'identity',
+           case when message ~ '<[^>]+>' then 'text/html' else 'text/plain' end,
+           octet_length(message), encode(convert_to(message, 'UTF8'), 'base64')
+    from capsules where message is not null
+    on conflict (capsule_id) do nothing;
+
+update capsules
+    set preview = left(btrim(regexp_replace(regexp_replace(message, '<[^>]+>', ' ', 'g'), '\s+', ' ', 'g')), 200),
+        message = null
+    where message is not null;
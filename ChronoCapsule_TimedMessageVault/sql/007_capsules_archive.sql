@@ -0,0 +1,37 @@
+-- Delivered capsules past the retention window move from capsules to
+-- capsules_archive (archive_capsules.py, repository/capsule_archive.py),
+-- so the due scan, lease claims and list views stay on a small hot table.
+alter table capsules add column if not exists delivered_at timestamptz;
+
+-- Delivered before delivery times were recorded: the schedule is the
+-- closest we have.
+update capsules set delivered_at = scheduled_time
+    where is_delivered = true and delivered_at is null;
+
+-- Serves CapsuleRepository.archive_delivered: oldest deliveries first.
+create index if not exists capsules_delivered_idx
+    on capsules (delivered_at, id)
+    where is_delivered = true;
+
+create table if not exists capsules_archive (
+    id bigint primary key,
+    title text,
+    message text,
+    preview text,
+    creator_id bigint,
+    recipient_email text,
+    scheduled_time timestamptz,
+    delivered_at timestamptz,
+    attempts integer not null default 0,
+    attachment_count integer not null default 0,
+    archived_at timestamptz not null default now()
+);
+
+-- Serves CapsuleRepository.find_archived_page, newest first.
+create index if not exists capsules_archive_list_idx
+    on capsules_archive (scheduled_time desc, id desc);
+
+-- Bodies and attachments outlive the hot row: an archived capsule keeps
+-- them under the same id, so they can no longer reference capsules.
+alter table capsule_messages drop constraint if exists capsule_messages_capsule_id_fkey;
+alter table capsule_attachments drop constraint if exists capsule_attachments_capsule_id_fkey;
@@ -0,0 +1,52 @@
+# tests/conftest.py
+"""
+Tests run against the SQLite stand-in (repository/sqlite_client.py), so they
+need neither Supabase nor an SMTP server:
+
+    python -m pytest -q
+"""
+import os
+import sys
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from model.capsule import Capsule  # noqa: E402
+from repository.capsule_repository import CapsuleRepository  # noqa: E402
+from repository.sqlite_client import create_client  # noqa: E402
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    """A vault file several clients (one per simulated worker) can open."""
+    return str(tmp_path / "vault.db")
+
+
+@pytest.fixture
+def client(db_path):
+    client = create_client(db_path)
+    yield client
+    client.close()
+
+
+@pytest.fixture
+def repo(client):
+    return CapsuleRepository(None, None, client=client)
+
+
+@pytest.fixture
+def now():
+    return datetime.now(timezone.utc).replace(microsecond=0)
+
+
+@pytest.fixture
+def make_capsules(repo, now):
+    """``make_capsules(n, due_in=...)``: save ``n`` capsules and return them."""
+    def make(count, due_in=timedelta(minutes=-1), recipient="friend@example.com"):
+        capsules = [Capsule(None, f"Capsule {i}", f"message {i}", 1, now + due_in, recipient_email=recipient)
+                    for i in range(count)]
+        repo.save_many(capsules)
+        return capsules
+    return make
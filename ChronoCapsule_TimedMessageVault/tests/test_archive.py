@@ -0,0 +1,66 @@
+# tests/test_archive.py
+from datetime import timedelta
+
+import pytest
+
+from repository.capsule_archive import ARCHIVE_COLUMNS, FileCapsuleArchive, TableCapsuleArchive
+from repository.capsule_repository import CapsuleRepository
+from service.archiver import Archiver
+
+
+@pytest.fixture(params=["table", "files"])
+def archived_repo(request, client, tmp_path):
+    archive = TableCapsuleArchive(client) if request.param == "table" else FileCapsuleArchive(str(tmp_path / "archive"))
+    return CapsuleRepository(None, None, client=client, archive=archive)
+
+
+def _hot_ids(client):
+    return {row[0] for row in client.conn.execute("SELECT id FROM capsules").fetchall()}
+
+
+def test_only_capsules_delivered_before_the_cutoff_move(archived_repo, client, make_capsules, now):
+    delivered = make_capsules(3)
+    pending, = make_capsules(1, due_in=timedelta(days=1))
+    archived_repo.mark_delivered_many([c.id for c in delivered])
+
+    assert archived_repo.archive_delivered(now - timedelta(days=1)) == 0
+    assert archived_repo.archive_delivered(now + timedelta(days=1)) == 3
+
+    assert _hot_ids(client) == {pending.id}
+    rows, total = archived_repo.find_archived_page()
+    assert total == 3
+    assert {row["id"] for row in rows} == {c.id for c in delivered}
+    assert all(row["is_delivered"] for row in rows)
+
+
+def test_archived_capsule_keeps_its_body(archived_repo, make_capsules, now):
+    capsule, = make_capsules(1)
+    archived_repo.mark_delivered_many([capsule.id])
+    archived_repo.archive_delivered(now + timedelta(days=1))
+
+    archived = archived_repo.find_archived(capsule.id)
+    assert archived.is_delivered
+    assert archived.title == capsule.title
+    assert archived.message == capsule.message
+    assert archived_repo.find_archived(capsule.id + 1000) is None
+
+
+def test_rearchiving_a_batch_after_a_crash_is_harmless(archived_repo, make_capsules, now):
+    capsules = make_capsules(2)
+    archived_repo.mark_delivered_many([c.id for c in capsules])
+    # A run that copied the rows but died before deleting them.
+    rows = archived_repo.supabase.table("capsules").select(ARCHIVE_COLUMNS).execute().data
+    archived_repo.archive.put_many(rows, now)
+
+    assert archived_repo.archive_delivered(now + timedelta(days=1)) == 2
+    assert archived_repo.find_archived_page()[1] == 2
+
+
+def test_archiver_drains_the_backlog_in_batches(repo, client, make_capsules, now):
+    capsules = make_capsules(5)
+    repo.mark_delivered_many([c.id for c in capsules])
+
+    report = Archiver(repo, retention=timedelta(days=30), batch_size=2).run(now + timedelta(days=31))
+
+    assert (report.archived, report.batches) == (5, 3)
+    assert _hot_ids(client) == set()
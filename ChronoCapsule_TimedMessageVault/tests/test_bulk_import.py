@@ -0,0 +1,87 @@
+# tests/test_bulk_import.py
+import threading
+from datetime import timedelta
+
+from service.bulk_import import read_rows
+from service.capsule_service import CapsuleService
+
+
+class FakeCapsuleRepository:
+    """Fails a multi-row insert that contains a poisoned title, like a constraint violation would."""
+
+    def __init__(self, poison="poison"):
+        self.poison = poison
+        self.saved = []
+        self.batches = 0
+        self._lock = threading.Lock()
+        self._ids = iter(range(1, 10 ** 6))
+
+    def _insert(self, capsules):
+        with self._lock:
+            for capsule in capsules:
+                capsule.id = next(self._ids)
+                self.saved.append(capsule)
+
+    def save_many(self, capsules):
+        self.batches += 1
+        if any(c.title == self.poison for c in capsules):
+            raise RuntimeError("violates check constraint")
+        self._insert(capsules)
+
+    def save(self, capsule, attachments=()):
+        if capsule.title == self.poison:
+            raise RuntimeError("violates check constraint")
+        self._insert([capsule])
+
+
+def _row(now, title="Hello", **fields):
+    row = {"title": title, "message": "from the past", "recipient_email": "friend@example.com",
+           "scheduled_time": (now + timedelta(days=1)).isoformat()}
+    row.update(fields)
+    return row
+
+
+def test_bad_rows_are_reported_and_the_rest_inserted(now):
+    repo = FakeCapsuleRepository()
+    rows = [
+        (2, _row(now)),
+        (3, _row(now, recipient_email="not-an-address")),
+        (4, _row(now, scheduled_time=(now - timedelta(days=1)).isoformat())),
+        (5, _row(now, title="")),
+        (6, _row(now, scheduled_time="next tuesday")),
+        (7, _row(now, title="Bye")),
+    ]
+    errors = []
+
+    report = CapsuleService(repo, None).create_many(rows, on_error=lambda line, message: errors.append(line))
+
+    assert (report.inserted, report.failed) == (2, 4)
+    assert sorted(line for line, _ in report.errors) == sorted(errors) == [3, 4, 5, 6]
+    assert sorted(c.title for c in repo.saved) == ["Bye", "Hello"]
+
+
+def test_a_failed_chunk_falls_back_to_row_by_row_inserts(now):
+    repo = FakeCapsuleRepository()
+    rows = [(line, _row(now, title="poison" if line == 5 else f"Capsule {line}")) for line in range(2, 12)]
+    created = []
+    service = CapsuleService(repo, None)
+    service.on_create.append(created.append)
+
+    report = service.create_many(rows, chunk_size=4, concurrency=2)
+
+    assert (report.inserted, report.failed) == (9, 1)
+    assert report.errors == [(5, "insert failed: violates check constraint")]
+    assert repo.batches == 3
+    assert len(created) == 9 and all(c.id is not None for c in created)
+
+
+def test_read_rows_reports_broken_json_lines(tmp_path):
+    path = tmp_path / "capsules.jsonl"
+    path.write_text('{"title": "Hello"}\n\nnot json\n', encoding="utf-8")
+
+    rows = list(read_rows(str(path)))
+
+    assert [line for line, _ in rows] == [1, 3]
+    report = CapsuleService(FakeCapsuleRepository(), None).create_many(rows)
+    assert report.failed == 2
+    assert report.errors[1][1].startswith("invalid JSON")
@@ -0,0 +1,69 @@
+# tests/test_capsule_model.py
+import re
+from datetime import datetime, timezone
+
+import pytest
+
+from model import capsule as capsule_model
+from model.capsule import Capsule
+
+ROW = {"id": 7, "title": "Hi", "scheduled_time": "2030-01-01T00:00:00+00:00"}
+
+
+def test_body_loads_lazily_when_not_selected():
+    loads = []
+    capsule = Capsule.from_row(ROW, lambda capsule_id: loads.append(capsule_id) or "stored body")
+
+    assert not capsule.message_loaded
+    assert capsule.message == "stored body"
+    assert capsule.message == "stored body"
+    assert loads == [7]
+
+
+def test_null_message_column_loads_lazily():
+    # select("*") and realtime rows after sql/006: the column is there, but NULL.
+    capsule = Capsule.from_row(dict(ROW, message=None), lambda capsule_id: "stored body")
+
+    assert not capsule.message_loaded
+    assert capsule.message == "stored body"
+
+
+def test_inline_message_is_used_as_is():
+    capsule = Capsule.from_row(dict(ROW, message="legacy body"), lambda capsule_id: "stored body")
+
+    assert capsule.message_loaded
+    assert capsule.message == "legacy body"
+
+
+def test_select_star_row_reads_body_from_the_store(repo, make_capsules):
+    capsule, = make_capsules(1)
+    row, = repo.supabase.table("capsules").select("*").eq("id", capsule.id).execute().data
+
+    assert row["message"] is None
+    assert repo.capsule_from_row(row).message == "message 0"
+
+
+class Py310Datetime(datetime):
+    """datetime whose fromisoformat is as strict as Python 3.10's, which the workflows run."""
+
+    @classmethod
+    def fromisoformat(cls, value):
+        if value.endswith("Z") or re.search(r"[+-]\d\d$", value) \
+                or re.search(r"\.(\d{1,2}|\d{4,5}|\d{7,})(?!\d)", value):
+            raise ValueError(f"Invalid isoformat string: {value!r}")
+        return datetime.fromisoformat(value)
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("2030-01-01T00:00:00.12345+00:00", datetime(2030, 1, 1, 0, 0, 0, 123450, timezone.utc)),
+    ("2030-01-01T00:00:00Z", datetime(2030, 1, 1, tzinfo=timezone.utc)),
+    ("2030-01-01T00:00:00.5Z", datetime(2030, 1, 1, 0, 0, 0, 500000, timezone.utc)),
+    ("2030-01-01T05:30:00.123+05:30", datetime(2030, 1, 1, 0, 0, 0, 123000, timezone.utc)),
+    ("2030-01-01 00:00:00+00", datetime(2030, 1, 1, tzinfo=timezone.utc)),
+])
+def test_postgrest_timestamps_parse_on_python_310(monkeypatch, value, expected):
+    monkeypatch.setattr(capsule_model, "datetime", Py310Datetime)
+    capsule = Capsule.from_row(dict(ROW, scheduled_time=value, next_attempt_at=value))
+
+    assert capsule.scheduled_time == expected
+    assert capsule.due_time == expected
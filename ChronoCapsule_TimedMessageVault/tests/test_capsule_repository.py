@@ -0,0 +1,75 @@
+# tests/test_capsule_repository.py
+from datetime import timedelta
+
+from model.capsule import Capsule
+
+
+def _save(repo, now, minutes):
+    """One capsule per entry of ``minutes`` (relative to ``now``); equal entries share a scheduled_time."""
+    capsules = [Capsule(None, f"Capsule {i}", "hello", 1, now + timedelta(minutes=m), recipient_email="a@example.com")
+                for i, m in enumerate(minutes)]
+    repo.save_many(capsules)
+    return capsules
+
+
+def test_find_due_pages_through_ties_in_order(repo, now):
+    # Pages of 3 split the runs of equal scheduled_time.
+    capsules = _save(repo, now, [-5, -3, -3, -3, -3, -1, -1, 10])
+
+    pages, cursor = [], None
+    while True:
+        page, cursor = repo.find_due(now, limit=3, cursor=cursor)
+        pages.append([c.id for c in page])
+        if cursor is None:
+            break
+
+    expected = sorted(capsules[:7], key=lambda c: (c.scheduled_time, c.id))
+    assert [capsule_id for page in pages for capsule_id in page] == [c.id for c in expected]
+    assert [len(page) for page in pages] == [3, 3, 1]
+
+
+def test_iter_due_stays_correct_while_rows_are_delivered(repo, now):
+    capsules = _save(repo, now, [-4, -4, -3, -2, -2, -1])
+    seen = []
+    for capsule in repo.iter_due(now, page_size=2):
+        seen.append(capsule.id)
+        # Acknowledged as it goes, which shrinks what the next page's query sees.
+        repo.mark_delivered_many([capsule.id])
+
+    assert seen == [c.id for c in capsules]
+
+
+def test_find_due_skips_dead_letters(repo, now):
+    live, dead = _save(repo, now, [-2, -1])
+    repo.dead_letter(dead.id, 5, "mailbox unavailable")
+
+    assert [c.id for c in repo.iter_due(now)] == [live.id]
+
+
+def test_find_page_filters_and_pages_in_the_database(repo, now):
+    capsules = _save(repo, now, [-3, -2, -1, 1, 2, 3, 4])
+    repo.mark_delivered_many([c.id for c in capsules[:3]])
+
+    rows, total = repo.find_page("Pending", page=0, page_size=3)
+    assert total == 4
+    assert [row["id"] for row in rows] == [c.id for c in reversed(capsules[4:])]
+    rows, _ = repo.find_page("Pending", page=1, page_size=3)
+    assert [row["id"] for row in rows] == [capsules[3].id]
+
+    rows, total = repo.find_page("Delivered")
+    assert total == 3 and all(row["is_delivered"] for row in rows)
+
+    rows, total = repo.find_page("All", start=now - timedelta(minutes=2), end=now + timedelta(minutes=2))
+    assert [row["id"] for row in rows] == [capsules[3].id, capsules[2].id, capsules[1].id]
+    assert total == 3
+    # List views get the preview, not the body.
+    assert rows[0]["preview"] == "hello" and "message" not in rows[0]
+
+
+def test_dead_letters_are_not_pending(repo, now):
+    pending, dead = _save(repo, now, [1, 2])
+    repo.dead_letter(dead.id, 5, "mailbox unavailable")
+
+    rows, total = repo.find_page("Pending")
+    assert [row["id"] for row in rows] == [pending.id] and total == 1
+    assert repo.find_page("All")[1] == 2
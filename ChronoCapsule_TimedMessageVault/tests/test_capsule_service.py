@@ -0,0 +1,49 @@
+# tests/test_capsule_service.py
+from model.capsule import Capsule
+from model.user import User
+from repository.user_repository import UserRepository
+from service.capsule_service import CapsuleService
+from service.user_service import UserService
+
+
+class RecordingMailer:
+    address = "vault@example.com"
+
+    def __init__(self):
+        self.metrics = None
+        self.recipients = []
+
+    def send_rendered(self, email):
+        email.load()
+        self.recipients.append(email.recipient)
+
+    def stats(self):
+        return {}
+
+
+def _statuses(client):
+    return dict(client.conn.execute("SELECT id, status FROM capsules").fetchall())
+
+
+def test_delivers_without_a_user_service_when_the_recipient_is_known(repo, client, now, tmp_path):
+    capsule = Capsule(None, "Hi", "hello", None, now, recipient_email="friend@example.com")
+    repo.save(capsule)
+    mailer = RecordingMailer()
+
+    CapsuleService(repo, None, mailer, journal_path=str(tmp_path / "journal.log")).deliver_capsules()
+
+    assert mailer.recipients == ["friend@example.com"]
+    assert _statuses(client) == {capsule.id: "delivered"}
+
+
+def test_creator_only_capsule_goes_to_the_creator(repo, client, now, tmp_path):
+    users = UserService(UserRepository(None, None, client=client))
+    users.create_user(User(None, "Ada", "ada@example.com"))
+    capsule = Capsule(None, "Hi", "hello", users.get_user_by_email("ada@example.com").id, now)
+    repo.save(capsule)
+    mailer = RecordingMailer()
+
+    CapsuleService(repo, users, mailer, journal_path=str(tmp_path / "journal.log")).deliver_capsules()
+
+    assert mailer.recipients == ["ada@example.com"]
+    assert _statuses(client) == {capsule.id: "delivered"}
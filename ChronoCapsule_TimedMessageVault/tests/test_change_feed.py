@@ -0,0 +1,103 @@
+# tests/test_change_feed.py
+from datetime import timedelta
+
+from repository.change_feed import SQLiteChangeFeed
+from service.scheduler import CapsuleScheduler
+
+
+def _live(repo, client):
+    """A scheduler kept current by a SQLite change feed that the test polls by hand."""
+    scheduler = CapsuleScheduler(repo, lambda due: None, timedelta(minutes=10))
+    feed = SQLiteChangeFeed(client, scheduler.apply_change, scheduler.reconcile, scheduler.feed_lost)
+    feed._subscribe()
+    scheduler.refresh()
+    return scheduler, feed
+
+
+def _due(scheduler, capsule_id):
+    capsule = scheduler._scheduled.get(capsule_id)
+    return capsule.due_time if capsule is not None else None
+
+
+def test_feed_adds_capsules_created_by_other_processes(repo, client, make_capsules, now):
+    scheduler, feed = _live(repo, client)
+    capsule, = make_capsules(1, due_in=timedelta(minutes=5))
+    make_capsules(1, due_in=timedelta(hours=1))  # beyond the window
+
+    assert feed.poll() == 2
+    assert len(scheduler) == 1
+    assert _due(scheduler, capsule.id) == now + timedelta(minutes=5)
+
+
+def test_claimed_capsule_moves_to_its_lease_expiry(repo, client, make_capsules, now):
+    capsule, = make_capsules(1)
+    scheduler, feed = _live(repo, client)
+    assert _due(scheduler, capsule.id) == capsule.scheduled_time
+
+    repo.claim([capsule.id], "worker-b", now, lease_seconds=120)
+    feed.poll()
+
+    # Another worker holds it; it only comes due again if that lease runs out.
+    assert _due(scheduler, capsule.id) == now + timedelta(seconds=120)
+    assert scheduler._pop_due(now.timestamp()) == []
+    assert [c.id for c in scheduler._pop_due((now + timedelta(seconds=120)).timestamp())] == [capsule.id]
+
+
+def test_delivered_and_dead_capsules_leave_the_heap(repo, client, make_capsules):
+    delivered, dead = make_capsules(2)
+    scheduler, feed = _live(repo, client)
+    assert len(scheduler) == 2
+
+    repo.mark_delivered_many([delivered.id])
+    repo.dead_letter(dead.id, 5, "mailbox unavailable")
+    feed.poll()
+
+    assert len(scheduler) == 0
+
+
+def test_reconcile_rereads_the_window_then_trusts_the_feed():
+    class Repository:
+        def __init__(self):
+            self.reads = []
+
+        def iter_due(self, until):
+            self.reads.append("due")
+            return []
+
+        def iter_entering(self, after, until):
+            self.reads.append("entering")
+            return []
+
+    repo = Repository()
+    scheduler = CapsuleScheduler(repo, lambda due: None, timedelta(minutes=10))
+    scheduler.refresh()
+    scheduler.refresh()
+    # Without a feed every refresh re-reads the whole window.
+    assert repo.reads == ["due", "due"]
+
+    scheduler.reconcile()
+    assert scheduler.live
+    scheduler.refresh()
+    scheduler.refresh()
+    assert repo.reads[2:] == ["due", "entering"]
+
+    scheduler.feed_lost()
+    assert not scheduler.live
+    scheduler.refresh()
+    assert repo.reads[4:] == ["due"]
+
+
+def test_changes_during_a_refresh_win_over_its_result(repo, client, make_capsules):
+    capsule, = make_capsules(1)
+    scheduler = CapsuleScheduler(repo, lambda due: None, timedelta(minutes=10))
+    iter_due = repo.iter_due
+
+    def racing_iter_due(until):
+        # Delivered elsewhere after the query read the row, before it returned.
+        rows = list(iter_due(until))
+        scheduler.apply_change("UPDATE", {"id": capsule.id, "is_delivered": True})
+        return rows
+
+    repo.iter_due = racing_iter_due
+    scheduler.refresh()
+    assert len(scheduler) == 0
@@ -0,0 +1,78 @@
+# tests/test_client_factory.py
+import threading
+
+import pytest
+
+from repository import client_factory
+from repository.capsule_repository import CapsuleRepository
+from repository.client_factory import get_client
+
+
+@pytest.fixture
+def built(monkeypatch):
+    """Fake supabase/sqlite backends; returns the ``(backend, url, key)`` of every client they build."""
+    built = []
+    lock = threading.Lock()
+
+    def factory(backend):
+        def build(url, key):
+            with lock:
+                built.append((backend, url, key))
+            return object()
+        return build
+
+    monkeypatch.setattr(client_factory, "_clients", {})
+    monkeypatch.setattr(client_factory, "BACKENDS", {"supabase": factory("supabase"), "sqlite": factory("sqlite")})
+    monkeypatch.delenv("SQLITE_PATH", raising=False)
+    return built
+
+
+def test_one_client_per_process_and_credentials(monkeypatch, built):
+    monkeypatch.setenv("STORAGE_BACKEND", "supabase")
+
+    first = get_client("https://a.supabase.co", "key")
+    assert get_client("https://a.supabase.co", "key") is first
+    assert get_client("https://b.supabase.co", "key") is not first
+    assert built == [("supabase", "https://a.supabase.co", "key"), ("supabase", "https://b.supabase.co", "key")]
+
+
+def test_sqlite_clients_are_keyed_by_path(monkeypatch, built):
+    monkeypatch.setenv("STORAGE_BACKEND", "sqlite")
+    first = get_client()
+    assert get_client("ignored", "ignored") is first
+
+    monkeypatch.setenv("SQLITE_PATH", "other.db")
+    assert get_client() is not first
+    assert len(built) == 2
+
+
+def test_concurrent_first_use_builds_one_client(monkeypatch, built):
+    monkeypatch.setenv("STORAGE_BACKEND", "sqlite")
+    start = threading.Barrier(8)
+    clients = []
+
+    def use():
+        start.wait()
+        clients.append(get_client())
+
+    threads = [threading.Thread(target=use) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert len(built) == 1
+    assert all(c is clients[0] for c in clients)
+
+
+def test_repositories_build_the_client_on_first_query(monkeypatch, built):
+    monkeypatch.setenv("STORAGE_BACKEND", "sqlite")
+    repo = CapsuleRepository(None, None)
+    assert built == []
+    assert repo.supabase is get_client()
+
+
+def test_unknown_backend_is_rejected(monkeypatch, built):
+    monkeypatch.setenv("STORAGE_BACKEND", "mongo")
+    with pytest.raises(ValueError, match="mongo"):
+        get_client()
@@ -0,0 +1,34 @@
+# tests/test_dashboard_controller.py
+from datetime import date, datetime, timezone
+
+import pytest
+
+from controller.dashboard_controller import capsule_cards, ist_day_bounds
+
+pd = pytest.importorskip("pandas")
+from controller.dashboard_controller import capsule_frame  # noqa: E402
+
+
+def test_ist_day_bounds_cover_whole_ist_days():
+    start, end = ist_day_bounds(date(2026, 1, 1), date(2026, 1, 2))
+
+    assert start == datetime(2025, 12, 31, 18, 30, tzinfo=timezone.utc)
+    assert end == datetime(2026, 1, 2, 18, 30, tzinfo=timezone.utc)
+    assert ist_day_bounds(None, None) == (None, None)
+
+
+def test_frame_and_cards_render_one_page_of_rows():
+    rows = [
+        {"id": 2, "title": "Later", "preview": "<b>hi</b>", "recipient_email": "a@example.com",
+         "scheduled_time": "2026-01-01T00:00:00+00:00", "is_delivered": False, "attachment_count": 2},
+        {"id": 1, "title": "Sooner", "preview": None, "recipient_email": "b@example.com",
+         "scheduled_time": None, "is_delivered": True, "attachment_count": None},
+    ]
+
+    df = capsule_frame(rows)
+    assert list(df["scheduled_ist"]) == ["2026-01-01 05:30", "N/A"]
+    assert list(df["attachment_count"]) == [2, 0]
+
+    later, sooner = capsule_cards(df)
+    assert "&lt;b&gt;hi&lt;/b&gt;" in later and "📎 2" in later and "Pending" in later
+    assert "Delivered" in sooner and "📎" not in sooner
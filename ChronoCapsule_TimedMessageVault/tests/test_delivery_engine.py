@@ -0,0 +1,75 @@
+# tests/test_delivery_engine.py
+import pytest
+
+from service.delivery_engine import DeliveryEngine
+from service.delivery_planner import plan_digests
+
+
+class Item:
+    def __init__(self, id, recipient):
+        self.id = id
+        self.recipient_email = recipient
+
+
+def _engine(failures, acknowledge=None, send=None, digest=False):
+    return DeliveryEngine(
+        send=send or (lambda capsule, rendered: True),
+        acknowledge=acknowledge or (lambda capsule: None),
+        recipient_of=lambda capsule: capsule.recipient_email,
+        workers=2,
+        render=lambda capsule: f"email {capsule.id}",
+        on_failure=lambda capsule, error: failures.append((capsule.id, str(error))),
+        render_digest=(lambda capsules: "digest " + ",".join(str(c.id) for c in capsules)) if digest else None,
+        digest_max=3,
+    )
+
+
+def test_digests_merge_a_recipients_capsules_in_due_order():
+    capsules = [Item(0, "ada@a.example"), Item(1, "bob@b.example"), Item(2, "ADA@a.example"), Item(3, None),
+                Item(4, None), Item(5, "ada@a.example"), Item(6, "ada@a.example"), Item(7, "bob@b.example")]
+
+    batches = plan_digests(capsules, lambda c: c.recipient_email, limit=3, window=7)
+
+    assert [[c.id for c in batch] for batch in batches] == [[0, 2, 5], [6], [1], [3], [4], [7]]
+
+
+def test_digest_is_sent_once_and_acknowledges_every_capsule():
+    sent, acked, failures = [], [], []
+    engine = _engine(failures, acknowledge=lambda c: acked.append(c.id),
+                     send=lambda capsule, rendered: sent.append(rendered) or True, digest=True)
+
+    summary = engine.run([Item(i, "ada@a.example") for i in range(4)] + [Item(4, "bob@b.example")])
+
+    assert sorted(sent) == ["digest 0,1,2", "email 3", "email 4"]
+    assert sorted(acked) == [0, 1, 2, 3, 4]
+    assert summary["sent"] == 5 and failures == []
+
+
+def test_failed_digest_fails_every_capsule_in_it():
+    failures = []
+
+    def send(capsule, rendered):
+        raise ConnectionRefusedError("smtp down")
+
+    summary = _engine(failures, send=send, digest=True).run([Item(i, "ada@a.example") for i in range(3)])
+
+    assert summary["failed"] == 3 and summary["sent"] == 0
+    assert sorted(failures) == [(0, "smtp down"), (1, "smtp down"), (2, "smtp down")]
+
+
+@pytest.mark.parametrize("digest", [False, True])
+def test_failed_acknowledgement_fails_the_rest(digest):
+    acked = []
+
+    def acknowledge(capsule):
+        if capsule.id == 1:
+            raise OSError("journal full")
+        acked.append(capsule.id)
+
+    failures = []
+    summary = _engine(failures, acknowledge=acknowledge, digest=digest).run([Item(i, "ada@a.example") for i in range(3)])
+
+    failed = sorted(capsule_id for capsule_id, _ in failures)
+    assert sorted(acked + failed) == [0, 1, 2]
+    assert 1 in failed
+    assert summary["sent"] == len(acked) and summary["failed"] == len(failed)
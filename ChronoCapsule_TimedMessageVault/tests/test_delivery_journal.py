@@ -0,0 +1,96 @@
+# tests/test_delivery_journal.py
+import os
+from datetime import timedelta
+
+from repository.delivery_journal import APP_DIR, BatchAcknowledger, DeliveryJournal, journal_path
+
+
+def _delivered(repo, ids):
+    rows = repo.supabase.table("capsules").select("id,is_delivered").in_("id", list(ids)).execute().data
+    return {row["id"]: row["is_delivered"] for row in rows}
+
+
+def test_sends_are_acknowledged_in_bulk(repo, make_capsules, tmp_path):
+    capsules = make_capsules(5)
+    journal = DeliveryJournal(str(tmp_path / "journal.log"))
+
+    with BatchAcknowledger(repo, journal, batch_size=2, interval=60) as acks:
+        for capsule in capsules:
+            acks.add(capsule.id)
+
+    assert all(_delivered(repo, [c.id for c in capsules]).values())
+    assert DeliveryJournal(str(tmp_path / "journal.log")).unacknowledged() == []
+
+
+def test_replay_acknowledges_sends_from_a_crashed_run(repo, make_capsules, now, tmp_path):
+    path = str(tmp_path / "journal.log")
+    capsules = make_capsules(3)
+    claimed = repo.claim_due("worker-a", now)
+
+    # worker-a emails two capsules, journals them and dies before the bulk update.
+    journal = DeliveryJournal(path)
+    journal.record_sent(claimed[0].id)
+    journal.record_sent(claimed[1].id)
+    journal.close()
+    with open(path, "a", encoding="utf-8") as f:
+        f.write('["sent", ')  # torn last line
+
+    with BatchAcknowledger(repo, DeliveryJournal(path), interval=60) as acks:
+        recovered = acks.recover()
+
+    assert recovered == {claimed[0].id, claimed[1].id}
+    assert _delivered(repo, [c.id for c in capsules]) == {
+        capsules[0].id: True, capsules[1].id: True, capsules[2].id: False}
+    # The unsent one is all that is left once the lease runs out.
+    assert [c.id for c in repo.claim_due("worker-b", now + timedelta(hours=1))] == [capsules[2].id]
+    assert DeliveryJournal(path).unacknowledged() == []
+
+
+def test_failed_acknowledgement_stays_journaled(repo, make_capsules, tmp_path):
+    path = str(tmp_path / "journal.log")
+    capsule, = make_capsules(1)
+
+    class Down:
+        def mark_delivered_many(self, ids):
+            raise ConnectionError("database unreachable")
+
+    with BatchAcknowledger(Down(), DeliveryJournal(path), interval=60) as acks:
+        acks.add(capsule.id)
+
+    assert DeliveryJournal(path).unacknowledged() == [capsule.id]
+    with BatchAcknowledger(repo, DeliveryJournal(path), interval=60) as acks:
+        assert acks.recover() == {capsule.id}
+    assert _delivered(repo, [capsule.id]) == {capsule.id: True}
+
+
+def test_workers_sharing_a_journal_lose_no_entries(tmp_path):
+    path = str(tmp_path / "journal.log")
+    first, second = DeliveryJournal(path), DeliveryJournal(path)  # as two worker processes
+
+    first.record_sent(1)
+    second.record_sent(2)
+    first.record_acked([1])
+    first.compact()  # replaces the file under the second one
+    second.record_sent(3)
+    second.compact()
+    first.record_sent(4)
+
+    assert DeliveryJournal(path).unacknowledged() == [2, 3, 4]
+
+
+def test_journal_location_does_not_depend_on_the_working_directory(monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.delenv("STATE_DIR", raising=False)
+    monkeypatch.delenv("DELIVERY_JOURNAL", raising=False)
+    assert journal_path() == os.path.join(APP_DIR, "delivery_journal.log")
+
+    state = tmp_path / "state"
+    monkeypatch.setenv("STATE_DIR", str(state))
+    assert journal_path() == str(state / "delivery_journal.log")
+    monkeypatch.setenv("DELIVERY_JOURNAL", "worker.log")
+    assert journal_path() == str(state / "worker.log")
+    monkeypatch.setenv("DELIVERY_JOURNAL", str(tmp_path / "elsewhere.log"))
+    assert journal_path() == str(tmp_path / "elsewhere.log")
+
+    DeliveryJournal().record_sent(1)
+    assert (tmp_path / "elsewhere.log").read_text() == '["sent", 1]\n'
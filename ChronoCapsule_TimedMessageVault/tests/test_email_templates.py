@@ -0,0 +1,32 @@
+# tests/test_email_templates.py
+import re
+
+from service.email_templates import render_capsule, stream_capsule
+
+SENDER = "vault@example.com"
+# Long enough to fold, and not ASCII.
+TITLE = "Für dich, in zehn Jahren: " + "erinnerst du dich an den Sommer am See? " * 4
+
+_BARE_LF = re.compile(rb"(?<!\r)\n")
+
+
+def _head(data):
+    return data.split(b"\r\n\r\n", 1)[0]
+
+
+def test_folded_subject_uses_crlf():
+    head = _head(render_capsule(SENDER, "friend@example.com", TITLE, "hello").data)
+    assert b"\r\n =?utf-8?" in head  # folded
+    assert not _BARE_LF.search(head)
+
+
+def test_streamed_head_has_no_bare_lf():
+    email = stream_capsule(SENDER, "friend@example.com", TITLE, "hello\nworld")
+    data = b"".join(email.chunks())
+    assert not _BARE_LF.search(_head(data))
+    assert not _BARE_LF.search(data)
+
+
+def test_header_injection_is_flattened():
+    head = _head(render_capsule(SENDER, "friend@example.com", "hi\r\nBcc: someone@example.com", "x").data)
+    assert b"\r\nBcc:" not in head
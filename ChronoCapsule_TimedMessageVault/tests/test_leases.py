@@ -0,0 +1,79 @@
+# tests/test_leases.py
+import threading
+from datetime import datetime, timedelta
+
+from repository.capsule_repository import CapsuleRepository
+from repository.sqlite_client import create_client
+
+
+def test_claim_leases_due_capsules_once(repo, make_capsules, now):
+    due = make_capsules(3)
+    make_capsules(2, due_in=timedelta(hours=1))
+
+    claimed = repo.claim_due("worker-a", now)
+    assert sorted(c.id for c in claimed) == sorted(c.id for c in due)
+    # Leased: neither the same nor another worker gets them again.
+    assert repo.claim_due("worker-a", now) == []
+    assert repo.claim_due("worker-b", now) == []
+
+
+def test_expired_lease_can_be_claimed_again(repo, make_capsules, now):
+    capsule, = make_capsules(1)
+
+    assert [c.id for c in repo.claim_due("worker-a", now, lease_seconds=60)] == [capsule.id]
+    assert repo.claim_due("worker-b", now + timedelta(seconds=59)) == []
+    # worker-a died without acknowledging; its lease runs out.
+    assert [c.id for c in repo.claim_due("worker-b", now + timedelta(seconds=61))] == [capsule.id]
+    owner = repo.supabase.conn.execute("SELECT lease_owner FROM capsules WHERE id = ?", (capsule.id,)).fetchone()[0]
+    assert owner == "worker-b"
+
+
+def test_delivered_capsules_are_never_claimed(repo, make_capsules, now):
+    capsules = make_capsules(2)
+    repo.claim_due("worker-a", now)
+    repo.mark_delivered_many([capsules[0].id])
+
+    later = now + timedelta(hours=1)  # past the lease
+    assert [c.id for c in repo.claim_due("worker-b", later)] == [capsules[1].id]
+
+
+def test_concurrent_workers_never_claim_the_same_capsule(db_path, make_capsules, now):
+    capsules = make_capsules(600)
+    claimed = {}
+    start = threading.Barrier(6)
+
+    def worker(name):
+        client = create_client(db_path)  # one connection per worker, as separate processes would have
+        repo = CapsuleRepository(None, None, client=client)
+        start.wait()
+        claimed[name] = [c.id for c in repo.iter_claimed(name, now, batch_size=25)]
+        client.close()
+
+    threads = [threading.Thread(target=worker, args=(f"worker-{i}",)) for i in range(6)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    ids = [capsule_id for got in claimed.values() for capsule_id in got]
+    assert len(ids) == len(set(ids))
+    assert set(ids) == {c.id for c in capsules}
+
+
+def test_batches_claimed_late_in_a_run_hold_a_full_lease(repo, make_capsules, now):
+    capsules = make_capsules(4, due_in=timedelta(minutes=-20))
+    started = now - timedelta(minutes=10)  # a run that began well over a lease ago
+    ticks = iter([now, now + timedelta(minutes=4)])
+
+    claimed = repo.iter_claimed("worker-a", started, batch_size=2, clock=lambda: next(ticks))
+    first = [next(claimed).id, next(claimed).id]
+    second = [c.id for c in claimed]
+    assert sorted(first + second) == sorted(c.id for c in capsules)
+    # Another worker starting now finds nothing: the leases run from each claim, not from ``started``.
+    assert repo.claim_due("worker-b", now) == []
+
+    rows = dict(repo.supabase.conn.execute("SELECT id, lease_expires_at FROM capsules").fetchall())
+    assert {datetime.fromisoformat(rows[i]) for i in first} == {now + timedelta(minutes=5)}
+    assert {datetime.fromisoformat(rows[i]) for i in second} == {now + timedelta(minutes=9)}
+    # Only the first batch's lease has run out six minutes in.
+    assert sorted(c.id for c in repo.claim_due("worker-b", now + timedelta(minutes=6))) == sorted(first)
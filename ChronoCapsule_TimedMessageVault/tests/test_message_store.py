@@ -0,0 +1,64 @@
+# tests/test_message_store.py
+import base64
+import os
+
+import pytest
+
+from repository import message_store
+from repository.message_store import CHUNK_SIZE, MessageNotFound, TableMessageStore
+
+base64_decode = base64.b64decode
+
+
+def _store(client, **kwargs):
+    store = TableMessageStore(client, **kwargs)
+    store.put_many([(i, f"<p>{'x' * 1000 * i}</p>") for i in range(1, 6)])
+    return store
+
+
+def test_batched_fetch_stays_within_the_byte_budget(client):
+    store = _store(client, fetch_bytes=3500)
+    bodies = [store.body(i) for i in range(1, 6)]
+
+    bodies[0].load()
+
+    # 1 + 2 KB fit (~3 KB); the 3 KB one would not, the rest wait their turn.
+    assert [body._source is not None for body in bodies] == [True, True, False, False, False]
+    assert [body.size for body in bodies[2:]] == [3007, 4007, 5007]  # metadata came along
+    assert [body.read() for body in bodies] == [f"<p>{'x' * 1000 * i}</p>" for i in range(1, 6)]
+
+
+def test_oversized_body_is_fetched_on_its_own(client):
+    store = _store(client, fetch_bytes=100)
+    bodies = [store.body(i) for i in (5, 1)]
+
+    requests = client.requests
+    assert bodies[0].read().startswith("<p>xxx")
+    assert bodies[1]._source is None
+    assert client.requests - requests == 2  # metadata, then the one body
+
+
+def test_missing_body(client):
+    store = _store(client)
+    with pytest.raises(MessageNotFound):
+        store.body(99).load()
+
+
+@pytest.mark.parametrize("codec", ["zlib", "identity"])
+def test_large_body_is_decoded_a_chunk_at_a_time(client, codec, monkeypatch):
+    text = os.urandom(1024 * 1024).hex()  # 2 MB that barely compresses
+    store = TableMessageStore(client, codec=codec)
+    store.put_many([(1, text)])
+    decoded = []
+
+    def b64decode(data):
+        decoded.append(len(data))
+        return base64_decode(data)
+
+    monkeypatch.setattr(message_store.base64, "b64decode", b64decode)
+    body = store.body(1)
+
+    assert "".join(body.text_chunks()) == text
+    assert body.read() == text  # and again, for a resend
+    assert len(decoded) > 2
+    assert max(decoded) <= CHUNK_SIZE * 4 // 3
@@ -0,0 +1,75 @@
+# tests/test_retry_queue.py
+import random
+import smtplib
+from datetime import timedelta
+
+from service.retry_queue import PermanentDeliveryError, RetryPolicy, RetryQueue
+
+
+def _status(repo, capsule_id):
+    row = repo.supabase.conn.execute(
+        "SELECT status, attempts, next_attempt_at, last_error, lease_owner FROM capsules WHERE id = ?",
+        (capsule_id,)).fetchone()
+    return dict(row)
+
+
+def _queue(repo, max_attempts=3):
+    return RetryQueue(repo, RetryPolicy(base=60, cap=600, max_attempts=max_attempts, rng=random.Random(0)))
+
+
+def test_transient_failure_backs_off(repo, make_capsules, now):
+    capsule, = make_capsules(1)
+    claimed, = repo.claim_due("worker-a", now)
+    retried = []
+    queue = _queue(repo)
+    queue.on_retry = (retried.append,)
+
+    queue.fail(claimed, smtplib.SMTPServerDisconnected("connection lost"))
+
+    row = _status(repo, capsule.id)
+    assert (row["status"], row["attempts"], row["lease_owner"]) == ("retry", 1, None)
+    assert "connection lost" in row["last_error"]
+    assert retried == [claimed] and claimed.next_attempt_at > now
+    # Released, but not claimable before the backoff is over.
+    assert repo.claim_due("worker-b", now) == []
+    assert [c.id for c in repo.claim_due("worker-b", claimed.next_attempt_at)] == [capsule.id]
+
+
+def test_permanent_failure_is_dead_lettered(repo, make_capsules, now):
+    capsule, = make_capsules(1)
+    claimed, = repo.claim_due("worker-a", now)
+    queue = _queue(repo)
+
+    queue.fail(claimed, smtplib.SMTPRecipientsRefused({capsule.recipient_email: (550, b"no such user")}))
+
+    row = _status(repo, capsule.id)
+    assert (row["status"], row["attempts"], row["next_attempt_at"]) == ("dead", 1, None)
+    assert queue.dead_lettered == 1
+    assert repo.claim_due("worker-b", now + timedelta(days=1)) == []
+    assert [r["id"] for r in repo.find_dead()] == [capsule.id]
+
+
+def test_last_attempt_is_dead_lettered(repo, make_capsules, now):
+    capsule, = make_capsules(1)
+    queue = _queue(repo, max_attempts=3)
+    at = now
+    for attempt in range(1, 4):
+        claimed, = repo.claim_due("worker-a", at)
+        assert claimed.attempts == attempt - 1
+        queue.fail(claimed, TimeoutError("timed out"))
+        at = at + timedelta(hours=1)
+
+    assert _status(repo, capsule.id)["status"] == "dead"
+    assert (queue.retried, queue.dead_lettered) == (2, 1)
+
+
+def test_requeue_gives_dead_capsules_fresh_attempts(repo, make_capsules, now):
+    capsule, = make_capsules(1)
+    claimed, = repo.claim_due("worker-a", now)
+    _queue(repo).fail(claimed, PermanentDeliveryError("no recipient email"))
+
+    repo.requeue([capsule.id])
+
+    row = _status(repo, capsule.id)
+    assert (row["status"], row["attempts"], row["last_error"]) == ("pending", 0, None)
+    assert [c.id for c in repo.claim_due("worker-a", now)] == [capsule.id]
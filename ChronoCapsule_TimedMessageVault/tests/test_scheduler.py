@@ -0,0 +1,82 @@
+# tests/test_scheduler.py
+import threading
+from datetime import datetime, timedelta, timezone
+
+from model.capsule import Capsule
+from service.scheduler import CapsuleScheduler
+
+
+class FakeCapsuleRepository:
+    """The reads CapsuleScheduler makes, over an in-memory list."""
+
+    def __init__(self, capsules=()):
+        self.capsules = list(capsules)
+        self.reads = []
+
+    def iter_due(self, until):
+        self.reads.append(("due", until))
+        return [c for c in self.capsules if c.due_time <= until]
+
+    def iter_entering(self, after, until):
+        self.reads.append(("entering", after, until))
+        return [c for c in self.capsules if after < c.due_time <= until]
+
+    def capsule_from_row(self, row):
+        return Capsule.from_row(row)
+
+
+def _capsule(capsule_id, due):
+    return Capsule(capsule_id, f"Capsule {capsule_id}", "hello", None, due, recipient_email="friend@example.com")
+
+
+def _scheduler(repo):
+    return CapsuleScheduler(repo, lambda due: None, timedelta(minutes=10))
+
+
+def _pop(scheduler, at):
+    return [c.id for c in scheduler._pop_due(at.timestamp())]
+
+
+def test_capsules_come_due_in_schedule_order():
+    now = datetime.now(timezone.utc)
+    repo = FakeCapsuleRepository([_capsule(1, now - timedelta(minutes=1)), _capsule(2, now - timedelta(minutes=3)),
+                                  _capsule(3, now + timedelta(minutes=2)), _capsule(4, now - timedelta(minutes=2))])
+    scheduler = _scheduler(repo)
+    scheduler.refresh()
+
+    assert _pop(scheduler, now) == [2, 4, 1]
+    assert _pop(scheduler, now) == []
+    assert _pop(scheduler, now + timedelta(minutes=2)) == [3]
+    assert len(scheduler) == 0
+
+
+def test_refresh_only_loads_the_lookahead_window():
+    now = datetime.now(timezone.utc)
+    repo = FakeCapsuleRepository([_capsule(1, now + timedelta(minutes=5)), _capsule(2, now + timedelta(hours=1))])
+    scheduler = _scheduler(repo)
+    scheduler.refresh()
+    assert len(scheduler) == 1
+
+    # Added beyond the window: left for the refresh that covers it.
+    scheduler.add(_capsule(3, now + timedelta(hours=2)))
+    scheduler.add(_capsule(4, now + timedelta(minutes=1)))
+    assert len(scheduler) == 2
+    assert _pop(scheduler, now + timedelta(minutes=10)) == [4, 1]
+
+
+def test_added_capsule_wakes_the_loop_at_its_deadline():
+    now = datetime.now(timezone.utc)
+    delivered = []
+    done = threading.Event()
+    scheduler = CapsuleScheduler(FakeCapsuleRepository(), lambda due: (delivered.extend(due), done.set()),
+                                 timedelta(minutes=10))
+    scheduler.start()
+    try:
+        while scheduler.last_refresh is None:
+            threading.Event().wait(0.01)
+        scheduler.add(_capsule(1, now + timedelta(milliseconds=200)))
+        assert done.wait(5)
+    finally:
+        scheduler.stop()
+    assert [c.id for c in delivered] == [1]
+    assert datetime.now(timezone.utc) >= now + timedelta(milliseconds=200)
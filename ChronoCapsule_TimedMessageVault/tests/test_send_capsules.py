@@ -0,0 +1,69 @@
+# tests/test_send_capsules.py
+import importlib
+
+import pytest
+
+from model.capsule import Capsule
+from model.user import User
+from repository.user_repository import UserRepository
+from service.user_service import UserService
+
+
+class RecordingPool:
+    """What send_capsules needs of an SMTPPool, keeping the messages instead of sending them."""
+
+    def __init__(self):
+        self.metrics = None
+        self.sent = []
+
+    def send_rendered(self, email):
+        self.sent.append((email.recipient, b"".join(email.chunks())))
+
+    def stats(self):
+        return {"messages_per_second": 0, "connects": 0}
+
+
+@pytest.fixture
+def send_capsules(monkeypatch, db_path, tmp_path):
+    monkeypatch.setenv("STORAGE_BACKEND", "sqlite")
+    monkeypatch.setenv("SQLITE_PATH", db_path)
+    monkeypatch.setenv("EMAIL_ADDRESS", "vault@example.com")
+    monkeypatch.setenv("EMAIL_PASSWORD", "secret")
+    monkeypatch.setenv("DELIVERY_JOURNAL", str(tmp_path / "journal.log"))
+    return importlib.import_module("send_capsules")
+
+
+def test_capsule_without_recipient_goes_to_its_creator(send_capsules, client, repo, now):
+    users = UserService(UserRepository(None, None, client=client))
+    users.create_user(User(None, "Ada", "ada@example.com"))
+    creator = users.get_user_by_email("ada@example.com")
+    capsule = Capsule(None, "From the CLI", "hello, future me", creator.id, now)
+    orphan = Capsule(None, "Nobody's", "lost", None, now)
+    repo.save_many([capsule, orphan])
+
+    pool = RecordingPool()
+    summary = send_capsules.deliver_claimed(repo.claim_due("worker-a", now), pool, repo, users=users)
+
+    assert [recipient for recipient, _ in pool.sent] == ["ada@example.com"]
+    assert b"\r\nTo: ada@example.com\r\n" in pool.sent[0][1]
+    assert (summary["sent"], summary["failed"]) == (1, 1)
+    statuses = dict(client.conn.execute("SELECT id, status FROM capsules").fetchall())
+    assert statuses == {capsule.id: "delivered", orphan.id: "dead"}
+
+
+def test_metrics_error_does_not_unacknowledge_a_sent_capsule(send_capsules, repo, now, monkeypatch):
+    from service.metrics import DeliveryMetrics
+
+    def broken(self, scheduled_time, sent_at=None):
+        raise TypeError("can't subtract offset-naive and offset-aware datetimes")
+
+    monkeypatch.setattr(DeliveryMetrics, "observe_lag", broken)
+    capsule = Capsule(None, "Hello", "from the past", None, now, recipient_email="friend@example.com")
+    repo.save(capsule)
+
+    pool = RecordingPool()
+    summary = send_capsules.deliver_claimed(repo.claim_due("worker-a", now), pool, repo)
+
+    assert len(pool.sent) == 1 and summary["sent"] == 1
+    row = repo.supabase.conn.execute("SELECT is_delivered FROM capsules WHERE id = ?", (capsule.id,)).fetchone()
+    assert row[0] == 1
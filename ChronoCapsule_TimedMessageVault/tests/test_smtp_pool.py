@@ -0,0 +1,95 @@
+# tests/test_smtp_pool.py
+import smtplib
+from collections import namedtuple
+
+import pytest
+
+from service.smtp_pool import SMTPPool
+
+Email = namedtuple("Email", "sender recipient data")
+
+
+class FakeSMTP:
+    """smtplib.SMTP stand-in; like Gmail, answers 421 and hangs up after ``drop_after`` messages."""
+
+    drop_after = None
+    refuse = ()
+    opened = []
+
+    def __init__(self, host, port, timeout=None):
+        self.sock = object()
+        self.messages = []
+        type(self).opened.append(self)
+
+    def login(self, user, password):
+        pass
+
+    def sendmail(self, sender, recipients, data):
+        if self.drop_after is not None and len(self.messages) >= self.drop_after:
+            self.sock = None
+            raise smtplib.SMTPResponseException(421, b"4.7.0 Try again later, closing connection")
+        if recipients[0] in self.refuse:
+            raise smtplib.SMTPRecipientsRefused({recipients[0]: (550, b"5.1.1 No such user")})
+        self.messages.append(recipients[0])
+
+    def quit(self):
+        self.sock = None
+
+    def close(self):
+        self.sock = None
+
+
+@pytest.fixture
+def smtp(monkeypatch):
+    class SMTP(FakeSMTP):
+        opened = []
+
+    monkeypatch.setattr(smtplib, "SMTP", SMTP)
+    return SMTP
+
+
+def _pool(**kwargs):
+    return SMTPPool("vault@example.com", "secret", use_ssl=False, size=1, **kwargs)
+
+
+def _send(pool, recipient):
+    pool.send_rendered(Email("vault@example.com", recipient, "Subject: hi\r\n\r\nhello"))
+
+
+def test_messages_share_one_connection(smtp):
+    with _pool() as pool:
+        for i in range(5):
+            _send(pool, f"user{i}@example.com")
+
+    assert len(smtp.opened) == 1
+    assert pool.stats()["sent"] == 5
+
+
+def test_421_reconnects_and_resends_the_message(smtp):
+    smtp.drop_after = 2
+    with _pool() as pool:
+        for i in range(3):
+            _send(pool, f"user{i}@example.com")
+
+    assert [s.messages for s in smtp.opened] == [["user0@example.com", "user1@example.com"], ["user2@example.com"]]
+    assert (pool.sent, pool.failed, pool.reconnects) == (3, 0, 1)
+
+
+def test_a_refused_recipient_fails_without_dropping_the_connection(smtp):
+    smtp.refuse = ("nobody@example.com",)
+    with _pool() as pool:
+        with pytest.raises(smtplib.SMTPRecipientsRefused):
+            _send(pool, "nobody@example.com")
+        _send(pool, "friend@example.com")
+
+    assert len(smtp.opened) == 1
+    assert (pool.sent, pool.failed, pool.reconnects) == (1, 1, 0)
+
+
+def test_connection_is_retired_after_max_messages(smtp):
+    with _pool(max_messages=2) as pool:
+        for i in range(5):
+            _send(pool, f"user{i}@example.com")
+
+    assert [len(s.messages) for s in smtp.opened] == [2, 2, 1]
+    assert pool.reconnects == 0
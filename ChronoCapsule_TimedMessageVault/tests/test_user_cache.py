@@ -0,0 +1,146 @@
+# tests/test_user_cache.py
+import threading
+import time
+
+import pytest
+
+from model.user import User
+from repository import cached_user_repository
+from repository.cached_user_repository import CachedUserRepository, TTLCache, _MISSING
+
+
+class FakeUserRepository:
+    """Counts backend queries."""
+
+    def __init__(self, users):
+        self.users = list(users)
+        self.queries = 0
+
+    def find_all(self):
+        self.queries += 1
+        return list(self.users)
+
+    def find_by_id(self, user_id):
+        self.queries += 1
+        return next((u for u in self.users if u.id == user_id), None)
+
+    def find_by_email(self, email):
+        self.queries += 1
+        return next((u for u in self.users if u.email.lower() == email.lower()), None)
+
+    def save(self, user):
+        user.id = len(self.users) + 1
+        self.users.append(user)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """A monotonic clock the test moves by hand: ``clock.now += seconds``."""
+    class Clock:
+        now = 1000.0
+
+    monkeypatch.setattr(cached_user_repository.time, "monotonic", lambda: Clock.now)
+    return Clock
+
+
+def test_entries_expire_after_the_ttl(clock):
+    cache = TTLCache(ttl=60)
+    cache.set("a", 1)
+
+    clock.now += 59
+    assert cache.get("a") == 1
+    clock.now += 2
+    assert cache.get("a") is _MISSING
+    assert cache.stats()["size"] == 0
+
+
+def test_least_recently_used_entry_is_evicted(clock):
+    cache = TTLCache(maxsize=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+
+    assert cache.get("b") is _MISSING
+    assert (cache.get("a"), cache.get("c")) == (1, 3)
+    assert cache.stats()["evictions"] == 1
+
+
+def test_directory_is_indexed_and_served_from_memory(clock):
+    backend = FakeUserRepository([User(1, "Ada", "Ada@example.com"), User(2, "Alan", "alan@example.com")])
+    users = CachedUserRepository(backend, ttl=60)
+
+    assert [u.id for u in users.find_all()] == [1, 2]
+    assert users.find_by_id(2).name == "Alan"
+    assert users.find_by_email("ada@EXAMPLE.com").id == 1
+    assert users.find_all()[0].name == "Ada"
+    assert backend.queries == 1
+
+    clock.now += 61
+    users.find_by_id(2)
+    assert backend.queries == 2
+
+
+def test_save_invalidates_the_directory(clock):
+    backend = FakeUserRepository([User(1, "Ada", "ada@example.com")])
+    users = CachedUserRepository(backend, ttl=60)
+    assert users.find_by_email("grace@example.com") is None
+
+    users.save(User(None, "Grace", "grace@example.com"))
+
+    assert users.find_by_email("grace@example.com").id == 2
+    assert len(users.find_all()) == 2
+
+
+def test_concurrent_misses_share_one_query():
+    release = threading.Event()
+
+    class SlowUserRepository(FakeUserRepository):
+        def find_by_id(self, user_id):
+            release.wait(5)
+            return super().find_by_id(user_id)
+
+    backend = SlowUserRepository([User(1, "Ada", "ada@example.com")])
+    users = CachedUserRepository(backend, ttl=60)
+    found = []
+    threads = [threading.Thread(target=lambda: found.append(users.find_by_id(1))) for _ in range(5)]
+    for t in threads:
+        t.start()
+    while users.stats()["coalesced"] < 4:
+        time.sleep(0.001)
+    release.set()
+    for t in threads:
+        t.join()
+
+    assert backend.queries == 1
+    assert [u.name for u in found] == ["Ada"] * 5
+
+
+def test_save_during_a_directory_load_keeps_the_stale_index_out(clock):
+    users = None
+
+    class RacingUserRepository(FakeUserRepository):
+        def find_all(self):
+            listed = super().find_all()
+            # Another session saves a user while this query is in flight.
+            users.save(User(None, "Grace", "grace@example.com"))
+            return listed
+
+    backend = RacingUserRepository([User(1, "Ada", "ada@example.com")])
+    users = CachedUserRepository(backend, ttl=60)
+
+    assert len(users.find_all()) == 1
+    assert users.cache.get(("id", 1)) is _MISSING
+    assert users.cache.get("all") is _MISSING
+    assert len(users.find_all()) == 2
+
+
+def test_zero_ttl_disables_caching(monkeypatch):
+    monkeypatch.setenv("USER_CACHE_TTL", "60")
+    backend = FakeUserRepository([User(1, "Ada", "ada@example.com")])
+    users = CachedUserRepository(backend, ttl=0)
+
+    users.find_by_id(1)
+    users.find_by_id(1)
+
+    assert backend.queries == 2